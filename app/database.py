@@ -1,5 +1,10 @@
 """
 setup database configuration for application usage
+
+Set MONGODB_URI to "memory://" to run against an in-process stand-in for MongoDB
+(mongomock-motor, from requirements-dev.txt) instead of a server, e.g. for the
+benchmarks in benchmarks/ or offline development. Data is lost on exit, and
+server-only features (capped collections, TTL expiry) are not available.
 """
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -9,5 +14,20 @@ load_dotenv()
 
 MONGODB_URI = os.getenv("MONGODB_URI")
 
-client = AsyncIOMotorClient(MONGODB_URI)
+
+def _memory_client():
+    """
+    In-process MongoDB stand-in (app.testing.memory_db), imported only when requested.
+    """
+    try:
+        from app.testing.memory_db import memory_client
+    except ImportError as e:
+        raise RuntimeError("MONGODB_URI=memory:// requires mongomock-motor (pip install -r requirements-dev.txt)") from e
+    return memory_client()
+
+
+if (MONGODB_URI or "").startswith("memory://"):
+    client = _memory_client()
+else:
+    client = AsyncIOMotorClient(MONGODB_URI)
 db = client.ai_summarizer
@@ -1,13 +1,76 @@
 
 import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import summarize, upload, history, visitor, delete_route, chat
+from app.routes import summarize, upload, history, visitor, delete_route, chat, jobs, metrics
+from app.database import db
+from app.services.admission import admission
+from app.services.llm_providers import client_registry, close_llm_clients
+from app.services.metrics import MetricsMiddleware, register_stats
+from app.services.provider_router import provider_router
+from app.services.rate_limiter import rate_limiter
+from app.services.summary_cache import summary_cache
+from app.services.extraction_cache import extraction_cache
+from app.services.near_duplicate import near_duplicate_index
+from app.services.history_search import history_index
+from app.services.session_store import session_store
+from app.services.summary_store import ensure_indexes as ensure_history_indexes, storage_stats
+from app.services.summary_archive import ensure_indexes as ensure_archive_indexes, retention_loop
+from app.services.jobs import job_queue
+from app.services.visitor_stats import unique_windows, visitor_counter
+from app.services.write_behind import write_behind
+from app.services.extractive import extractive_stats
+from app.utils.text_preprocess import preprocess_stats
+from app.utils.file_utils import shutdown_extract_pool
 
 
-app = FastAPI(title="AI Summarizer")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application startup and shutdown hooks.
+    """
+    index_setup = [
+        ("summary cache", summary_cache.ensure_indexes(db)),
+        ("chat session", session_store.ensure_indexes()),
+        ("extraction cache", extraction_cache.ensure_collection(db)),
+        ("job", job_queue.ensure_indexes(db)),
+        ("history", ensure_history_indexes(db)),
+        ("summary archive", ensure_archive_indexes(db)),
+        ("visitor stats", unique_windows.ensure_indexes(db)),
+    ]
+    for name, step in index_setup:
+        try:
+            await step
+        except Exception as e:
+            logging.warning(f"Could not create {name} indexes: {e}")
+    write_behind.start()
+    # Rebuilt in the background; lookups simply miss until they are populated
+    rebuild = asyncio.create_task(near_duplicate_index.rebuild(db))
+    search_rebuild = asyncio.create_task(history_index.rebuild(db))
+    retention = asyncio.create_task(retention_loop(db))
+    visitor_reconcile = asyncio.create_task(visitor_counter.reconcile_loop(db))
+    try:
+        await job_queue.start(db)
+    except Exception as e:
+        logging.error(f"Could not start the job queue: {e}")
+    yield
+    rebuild.cancel()
+    search_rebuild.cancel()
+    retention.cancel()
+    visitor_reconcile.cancel()
+    await job_queue.stop()
+    # After the job workers, so summaries of interrupted jobs are flushed too
+    await write_behind.stop()
+    await close_llm_clients()
+    shutdown_extract_pool()
+
+
+app = FastAPI(title="AI Summarizer", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,6 +79,25 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+
+# Gauges exported on /api/metrics
+for component, stats in [
+    ("admission", admission.stats),
+    ("llm_clients", client_registry.stats),
+    ("provider_router", provider_router.stats),
+    ("rate_limiter", rate_limiter.stats),
+    ("summary_cache", summary_cache.stats),
+    ("extraction_cache", extraction_cache.stats),
+    ("near_duplicate", near_duplicate_index.stats),
+    ("history_search", history_index.stats),
+    ("summary_storage", storage_stats),
+    ("jobs", job_queue.stats),
+    ("write_behind", write_behind.stats),
+    ("preprocess", preprocess_stats),
+    ("extractive", extractive_stats),
+]:
+    register_stats(component, stats)
 
 # Register Routes
 app.include_router(delete_route.router, prefix="/api", tags=["Delete History"])
@@ -24,6 +106,8 @@ app.include_router(upload.router, prefix="/api/upload", tags=["File Upload"])
 app.include_router(history.router, prefix="/api/history", tags=["History"])
 app.include_router(visitor.router, prefix="/api/visitor", tags=["Visitor"])
 app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["Jobs"])
+app.include_router(metrics.router, prefix="/api/metrics", tags=["Metrics"])
 
 
 # Optional: If you want a specific route to serve index.html explicitly
@@ -1,6 +1,9 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from app.schemas.models import ChatRequest
-from app.services.chat_instance import chat_with_ai
+from app.services.chat_instance import chat_with_ai, stream_chat
+from app.services.session_store import session_store
+from app.utils.sse import SSE_HEADERS, sse_event
 
 router = APIRouter()
 
@@ -21,3 +24,47 @@ async def chat_endpoint(data: ChatRequest):
         500: If the LLM call fails.
     """
     return await chat_with_ai(data)
+
+
+@router.post("/stream", summary="Chat with AI and stream the reply")
+async def chat_stream_endpoint(data: ChatRequest, request: Request):
+    """
+    Interact with the AI model and receive the reply incrementally over Server-Sent Events.
+
+    Emits `data: {"delta": "..."}` frames, then `event: done` with the full answer, or
+    `event: error` if the provider fails. The exchange is stored in the visitor's
+    memory only when the reply completes. When the client disconnects, the upstream
+    provider stream is closed so no further tokens are generated.
+
+    Returns:
+        StreamingResponse: `text/event-stream` of reply deltas.
+    """
+    deltas = stream_chat(data)
+
+    async def event_stream():
+        parts = []
+        try:
+            async for delta in deltas:
+                if await request.is_disconnected():
+                    return
+                parts.append(delta)
+                yield sse_event({"delta": delta})
+            yield sse_event({"answer": "".join(parts)}, event="done")
+        except HTTPException as e:
+            yield sse_event({"status_code": e.status_code, "detail": e.detail}, event="error")
+        finally:
+            await deltas.aclose()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.get("/stats", summary="Chat memory statistics")
+async def chat_stats():
+    """
+    Report the state of the chat session store.
+
+    Returns:
+        dict: Backend name, number of sessions and backend-specific counters
+        (bytes held and evictions for the in-memory store).
+    """
+    return await session_store.stats()
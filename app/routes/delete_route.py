@@ -6,6 +6,9 @@ This module defines API endpoints for deleting summarization records.
 Features:
 - DELETE all summaries.
 - DELETE summaries associated with a specific visitor ID.
+- Archived summaries (see app.services.summary_archive) are deleted too.
+- Buffered summary writes (app.services.write_behind) are flushed first, so a record
+  still waiting in the buffer cannot reappear after the deletion.
 
 Dependencies:
 - FastAPI for routing and dependency injection.
@@ -18,6 +21,10 @@ Usage:
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from app.dependencies import get_db
+from app.services.history_search import history_index
+from app.services.near_duplicate import near_duplicate_index
+from app.services.summary_store import ARCHIVE_COLLECTION
+from app.services.write_behind import write_behind
 
 router = APIRouter()
 
@@ -29,8 +36,12 @@ async def delete_all_summaries(db=Depends(get_db)):
     Returns:
         dict: Count of deleted documents.
     """
+    await write_behind.flush()
     result = await db.summaries.delete_many({})
-    return {"deleted_count": result.deleted_count}
+    archived = await db[ARCHIVE_COLLECTION].delete_many({})
+    near_duplicate_index.clear()
+    history_index.clear()
+    return {"deleted_count": result.deleted_count + archived.deleted_count}
 
 
 @router.delete("/summaries/delete-by-visitor")
@@ -44,7 +55,11 @@ async def delete_summaries_by_visitor(visitor_id: str = Query(..., description="
     Returns:
         dict: Count of deleted documents.
     """
+    await write_behind.flush()
     result = await db.summaries.delete_many({"visitor_id": visitor_id})
-    if result.deleted_count == 0:
+    archived = await db[ARCHIVE_COLLECTION].delete_many({"visitor_id": visitor_id})
+    deleted_count = result.deleted_count + archived.deleted_count
+    history_index.drop_visitor(visitor_id)
+    if deleted_count == 0:
         raise HTTPException(status_code=404, detail="No summaries found for the given visitor ID.")
-    return {"deleted_count": result.deleted_count}
+    return {"deleted_count": deleted_count}
@@ -1,26 +1,40 @@
 """
 history_route.py
 
-This module defines an API endpoint to retrieve the history of text summarizations
-stored in the database, optionally filtered by visitor ID.
+This module defines API endpoints to page through the history of text summarizations
+stored in the database, optionally filtered by visitor ID, and to fetch one full record.
 
-It exposes a GET endpoint that returns the most recent summarization records,
-including the input text, generated summary, model and provider used, and timestamp.
+History pages return previews instead of full texts (inputs can be whole PDFs), so
+response sizes do not grow with document size, and are read newest first with a
+keyset cursor over (created_at, _id) served by compound indexes, so each page costs
+the same however large the collection grows.
 
 Features:
 - Supports optional query parameters:
-    - 'limit': number of records to return (default: 10)
+    - 'limit': number of records to return (default: 10, at most HISTORY_MAX_LIMIT)
     - 'visitor_id': only return summaries created by this visitor
+    - 'cursor': the 'next_cursor' of the previous page
 - Results are sorted by creation date in descending order (most recent first).
+- Each record carries 'input_preview'/'summary_preview' and the full lengths
+  'input_length'/'summary_length'.
+- GET /{summary_id} returns the full record, including 'input_text' and 'summary_text'
+  (stored compressed, decompressed here). Archived records have "archived": true and
+  no 'input_text'.
+- GET /search ranks a visitor's summaries against a free-text query (BM25 over
+  summary and input text, see app.services.history_search), paginated with
+  'limit'/'offset'. Results are previews like history records, with a "score".
+- GET /storage reports the text bytes saved by compression in this process.
 - Converts MongoDB ObjectId to string for JSON serialization.
 
 Dependencies:
 - FastAPI for routing and dependency injection.
 - Database dependency injected via Depends(get_db).
+- History queries implemented in app.services.summary_store.
 
 Usage:
 - Send a GET request to the root path ('') with optional query parameters.
-- Receives a JSON response containing an array of summary history records.
+- Receives a JSON response containing an array of summary history records and the
+  cursor of the next page ('next_cursor' is null on the last page).
 
 Example:
 GET /api/history?visitor_id=abc-123&limit=5
@@ -30,45 +44,128 @@ Example response:
     "history": [
         {
             "_id": "605c3b2f8c4a5b6d3a5e9c15",
-            "input_text": "Some input text...",
-            "summary_text": "Generated summary...",
+            "input_preview": "Some input text...",
+            "input_length": 18234,
+            "summary_preview": "Generated summary...",
+            "summary_length": 512,
             "model": "gpt-3.5-turbo",
             "provider": "openai",
             "created_at": "2025-05-17T06:00:00Z"
         }
-    ]
+    ],
+    "next_cursor": "MTc0NzQ2MTYwMDAwMDo2MDVjM2IyZjhjNGE1YjZkM2E1ZTljMTU"
 }
+
+GET /api/history/605c3b2f8c4a5b6d3a5e9c15?visitor_id=abc-123
+GET /api/history/search?visitor_id=abc-123&q=quarterly+revenue&limit=10&offset=0
 """
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from app.dependencies import get_db
+from app.services.history_search import history_index
+from app.services.summary_store import get_summary, history_page, storage_stats, summary_previews
+from app.services.write_behind import write_behind
 
 router = APIRouter()
 
 @router.get("")
 async def get_history(
-    limit: int = 10,
+    limit: int = Query(10, ge=1, description="Maximum number of records to return"),
     visitor_id: str = Query(None, description="Optional visitor ID to filter results"),
+    cursor: str = Query(None, description="'next_cursor' of the previous page"),
     db=Depends(get_db)
 ):
     """
-    Retrieve the most recent summarization history entries, optionally filtered by visitor ID.
+    Retrieve a page of summarization history entries, optionally filtered by visitor ID.
 
     Args:
         limit (int): Maximum number of history records to return (default is 10).
         visitor_id (str, optional): Filter history by visitor ID.
+        cursor (str, optional): Continue after the previous page.
         db: Database dependency injected by FastAPI.
 
     Returns:
-        dict: A dictionary with a "history" key containing a list of summary documents.
+        dict: "history" with a list of summary previews, and "next_cursor".
+
+    Raises:
+        HTTPException: 400 if the cursor is invalid.
+    """
+
+    try:
+        results, next_cursor = await history_page(db, visitor_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"history": results, "next_cursor": next_cursor}
+
+
+@router.get("/search")
+async def search_history(
+    q: str = Query(..., min_length=1, description="Search query"),
+    visitor_id: str = Query(..., description="Visitor whose history is searched"),
+    limit: int = Query(10, ge=1, le=100, description="Maximum number of results to return"),
+    offset: int = Query(0, ge=0, description="Number of results to skip"),
+    db=Depends(get_db)
+):
     """
+    Search a visitor's summarization history, best matches first.
 
-    filter_query = {"visitor_id": visitor_id} if visitor_id else {}
+    Args:
+        q (str): Free-text query.
+        visitor_id (str): Visitor whose history is searched.
+        limit (int): Maximum number of results to return.
+        offset (int): Number of results to skip.
+        db: Database dependency injected by FastAPI.
+
+    Returns:
+        dict: "results" (history previews with a "score"), "total" matches and
+            "next_offset" (null on the last page).
+    """
 
-    cursor = db.summaries.find(filter_query).sort("created_at", -1).limit(limit)
-    results = []
-    async for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        results.append(doc)
+    total, hits = history_index.search(visitor_id, q, limit, offset)
+    summary_ids = [summary_id for summary_id, _ in hits]
+    results = await summary_previews(db, summary_ids)
+    if len(results) < len(summary_ids) and write_behind.pending:
+        # New records are indexed before their buffered insert reaches Mongo
+        await write_behind.flush()
+        results = await summary_previews(db, summary_ids)
+    scores = {str(summary_id): score for summary_id, score in hits}
+    for result in results:
+        result["score"] = round(scores[result["_id"]], 4)
+
+    # Records deleted behind the index's back are dropped from it, unless writes
+    # are still buffered (a failed flush is retried), which may include them
+    found = {result["_id"] for result in results}
+    missing = [summary_id for summary_id in summary_ids if str(summary_id) not in found]
+    if missing and not write_behind.pending:
+        history_index.remove(visitor_id, missing)
+
+    next_offset = offset + limit if offset + limit < total else None
+    return {"results": results, "total": total, "next_offset": next_offset}
+
+
+@router.get("/storage")
+async def get_storage_stats():
+    """
+    Report the text bytes of summaries written by this process, before and after compression.
+    """
+    return storage_stats()
+
+
+@router.get("/{summary_id}")
+async def get_history_entry(
+    summary_id: str,
+    visitor_id: str = Query(None, description="Optional visitor ID the record must belong to"),
+    db=Depends(get_db)
+):
+    """
+    Retrieve one summarization record with its full input and summary texts.
+
+    Raises:
+        HTTPException: 404 if the record does not exist (for this visitor).
+    """
 
-    return {"history": results}
+    doc = await get_summary(db, summary_id, visitor_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Summary not found.")
+    return doc
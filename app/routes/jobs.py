@@ -0,0 +1,116 @@
+"""
+jobs.py
+
+This module defines the API routes for asynchronous summarization jobs.
+
+Large inputs can take longer to summarize than proxies allow an HTTP request to
+stay open. Submitting a job returns immediately with a job id; a background worker
+pool runs the summarization and stores the result with the visitor's summaries.
+
+Dependencies:
+- FastAPI for routing and dependency injection.
+- A database dependency injected via Depends(get_db).
+- The job queue implemented in app.services.jobs.
+
+Usage:
+- POST /api/jobs with a SummarizeRequest body plus optional "priority" (-10 to 10)
+  → 202 with {"job_id", "status": "queued", ...}
+- GET /api/jobs/{job_id} → current job state; "summary" is set once "completed",
+  "error" once "failed"
+- GET /api/jobs/{job_id}/events → Server-Sent Events: `event: status` on every
+  state change, then `event: done` or `event: error` when the job finishes
+- GET /api/jobs/stats → queue length, wait times and worker utilization
+- Job routes require the 'X-Visitor-ID' header; jobs are only visible to the
+  visitor that submitted them.
+"""
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from app.dependencies import get_db
+from app.schemas.models import SummarizeJobRequest
+from app.services.jobs import job_queue
+from app.utils.sse import SSE_HEADERS, sse_event
+
+router = APIRouter()
+
+
+def _require_visitor(visitor_id: str):
+    if not visitor_id:
+        raise HTTPException(status_code=400, detail="Missing X-Visitor-ID header")
+
+
+@router.post("", status_code=202)
+async def submit_job(
+    job: SummarizeJobRequest,
+    db=Depends(get_db),
+    visitor_id: str = Header(None, alias="X-Visitor-ID")
+):
+    """
+    Queue a summarization job and return its id without waiting for the result.
+
+    Args:
+        job (SummarizeJobRequest): Summarization request plus optional priority.
+        db: MongoDB async database session dependency.
+        visitor_id (str): ID from the 'X-Visitor-ID' header to associate with the summary.
+
+    Returns:
+        dict: The queued job ("job_id", "status", ...).
+
+    Raises:
+        HTTPException: If the visitor ID is missing (400), the text is empty (400)
+            or the queue is full (429).
+    """
+    _require_visitor(visitor_id)
+    if not job.text.strip():
+        raise HTTPException(status_code=400, detail="Text must not be empty.")
+    return await job_queue.submit(db, visitor_id, job)
+
+
+@router.get("/stats")
+async def job_stats():
+    """
+    Report the job queue length, queue wait times and worker utilization.
+    """
+    return job_queue.stats()
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, db=Depends(get_db), visitor_id: str = Header(None, alias="X-Visitor-ID")):
+    """
+    Return the current state of a job.
+
+    Raises:
+        HTTPException: If the visitor ID is missing (400) or the job does not exist (404).
+    """
+    _require_visitor(visitor_id)
+    view = await job_queue.get(db, job_id, visitor_id)
+    if view is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return view
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, db=Depends(get_db), visitor_id: str = Header(None, alias="X-Visitor-ID")):
+    """
+    Subscribe to a job's state changes over Server-Sent Events.
+
+    Emits `event: status` frames with the job state on every change, then `event: done`
+    with the summary or `event: error` with the failure, and closes.
+
+    Raises:
+        HTTPException: If the visitor ID is missing (400) or the job does not exist (404).
+    """
+    _require_visitor(visitor_id)
+    if await job_queue.get(db, job_id, visitor_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def event_stream():
+        async for view in job_queue.watch(db, job_id, visitor_id):
+            if view["status"] == "completed":
+                yield sse_event(view, event="done")
+            elif view["status"] == "failed":
+                yield sse_event(view, event="error")
+            else:
+                yield sse_event(view, event="status")
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,32 @@
+"""
+metrics.py
+
+This module exposes application metrics for Prometheus.
+
+Metrics include per-provider/model LLM latency, time to first token, token usage
+and errors, request counts and latency per router, and gauges from the caches,
+queues and indexes (see app.services.metrics).
+
+Dependencies:
+- FastAPI for routing.
+- The metrics registry in app.services.metrics.
+
+Usage:
+- GET /api/metrics → metrics in the Prometheus text exposition format
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.services.metrics import render
+
+router = APIRouter()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Render all metrics of this process in the Prometheus text format.
+    """
+    return PlainTextResponse(render(), media_type=CONTENT_TYPE)
@@ -17,7 +17,25 @@ Dependencies:
 Usage:
 - POST requests to the root path ('') with JSON body conforming to SummarizeRequest schema.
 - Requires 'X-Visitor-ID' header to track visitor-specific summaries.
-- Returns JSON with generated summary text.
+- Optional 'X-Deadline-Ms' header bounds how long the request may queue and run.
+- Records are written behind the response; send 'X-Consistency: strict' to wait
+  until the record is stored (e.g. before reading the history).
+- Returns JSON with generated summary text and whether it was reused from an exact
+  cache hit or a near-duplicate document ("cache": "exact" | "near_duplicate").
+- Set "no_cache": true in the body to bypass both lookups.
+- POST /stream returns the summary as Server-Sent Events while it is generated:
+  `data: {"delta": "..."}` frames, then `event: done` with the full summary, or
+  `event: error` if generation fails mid-stream.
+- POST /batch summarizes many documents sharing one provider configuration and
+  streams one NDJSON line per document as it finishes (per-item errors included),
+  then a final `{"done": true, ...}` line with totals. Results are stored with
+  chunked `insert_many`; an "unsaved" line follows any summary that could not be stored.
+- GET /admission reports per-provider queue depth and wait times.
+- Add "fallbacks": [{"provider", "model", "api_key", ...}] to route to other providers
+  when the first is slow or failing ("routing": "hedged" | "fallback");
+  GET /routing reports hedges, fallbacks and circuit breaker states.
+- Provider rate limits are retried with backoff; if they persist the response is 429
+  with Retry-After. GET /rate-limits reports throttle waits, retries and quota buckets.
 
 Example request body:
 {
@@ -31,19 +49,36 @@ Example request body:
 }
 """
 
-from datetime import datetime, timezone
+import asyncio
+import json
+import logging
+from typing import Set
 from fastapi import APIRouter, Depends, Header, HTTPException
-from app.schemas.models import SummarizeRequest
+from fastapi.responses import StreamingResponse
+from app.schemas.models import BatchSummarizeRequest, SummarizeRequest
 from app.dependencies import get_db
-from app.services.summarize import summarize_with_langchain
+from app.services.summarize import ProviderTrace, summarize_with_langchain, stream_summary
+from app.services.admission import admission, deadline_from_header
+from app.services.provider_router import provider_router
+from app.services.rate_limiter import rate_limiter
+from app.services.batch_summarize import BATCH_MAX_ITEMS, summarize_batch
+from app.services.summary_store import build_summary_record, save_summary
+from app.services.summary_reuse import find_reusable_summary, remember_summary
+from app.services.write_behind import is_strict
+from app.utils.sse import SSE_HEADERS, sse_event
 
 router = APIRouter()
 
+# Keeps persistence tasks of cancelled streams alive until they finish
+_pending_saves: Set[asyncio.Task] = set()
+
 @router.post("")
 async def summarize(
     data: SummarizeRequest,
     db=Depends(get_db),
-    visitor_id: str = Header(None, alias="X-Visitor-ID")
+    visitor_id: str = Header(None, alias="X-Visitor-ID"),
+    deadline_ms: str = Header(None, alias="X-Deadline-Ms"),
+    consistency: str = Header(None, alias="X-Consistency")
 ):
     """
     Endpoint to generate a summary from given text using specified AI provider.
@@ -52,25 +87,220 @@ async def summarize(
         data (SummarizeRequest): The request body containing summarization input and config.
         db: MongoDB async database session dependency.
         visitor_id (str): ID from the 'X-Visitor-ID' header to associate with the summary.
+        deadline_ms (str): Optional time budget in milliseconds from the 'X-Deadline-Ms' header.
+        consistency (str): 'strict' in the 'X-Consistency' header waits until the record is stored.
+
+    Returns:
+        dict: JSON response containing the generated summary text, a `cached` flag and
+            the `cache` tier that served it (None when freshly generated).
+
+    Raises:
+        HTTPException: If the visitor ID is missing, the provider is saturated (429),
+            the deadline expires (503/504) or summarization fails.
+    """
+    if not visitor_id:
+        raise HTTPException(status_code=400, detail="Missing X-Visitor-ID header")
+
+    deadline = deadline_from_header(deadline_ms)
+
+    strict = is_strict(consistency)
+
+    lookup = await find_reusable_summary(db, data)
+    if lookup.summary is not None:
+        await save_summary(db, build_summary_record(visitor_id, data, lookup.summary), strict)
+        return {"summary": lookup.summary, "cached": True, "cache": lookup.source}
+
+    trace = ProviderTrace()
+    summary_text = await summarize_with_langchain(data, deadline, trace)
+    record = build_summary_record(visitor_id, data, summary_text)
+    await save_summary(db, record, strict)
+    if not trace.fallback:
+        await remember_summary(db, data, lookup, summary_text, record["_id"])
+
+    return {"summary": summary_text, "cached": False, "cache": None}
+
+
+@router.post("/stream")
+async def summarize_stream(
+    data: SummarizeRequest,
+    db=Depends(get_db),
+    visitor_id: str = Header(None, alias="X-Visitor-ID"),
+    deadline_ms: str = Header(None, alias="X-Deadline-Ms"),
+    consistency: str = Header(None, alias="X-Consistency")
+):
+    """
+    Endpoint to stream a summary over Server-Sent Events as the provider generates it.
+
+    Errors raised before the first token (missing header, empty text, admission
+    rejection) are returned as regular HTTP errors. Once streaming has started,
+    failures are reported as an `error` event. The assembled summary is stored when
+    the stream completes, fails or is cancelled by the client, with its `status`.
+    Cache hits are sent as a single delta followed by `done` with `"cached": true`.
+
+    Args:
+        data (SummarizeRequest): The request body containing summarization input and config.
+        db: MongoDB async database session dependency.
+        visitor_id (str): ID from the 'X-Visitor-ID' header to associate with the summary.
+        deadline_ms (str): Optional time budget in milliseconds from the 'X-Deadline-Ms' header.
+        consistency (str): 'strict' in the 'X-Consistency' header stores the completed
+            summary before the `done` event is sent.
 
     Returns:
-        dict: JSON response containing the generated summary text.
+        StreamingResponse: `text/event-stream` of summary deltas.
 
     Raises:
-        HTTPException: If the visitor ID is missing or summarization fails.
+        HTTPException: If the visitor ID is missing or the stream cannot be started.
     """
     if not visitor_id:
         raise HTTPException(status_code=400, detail="Missing X-Visitor-ID header")
 
-    summary_text = await summarize_with_langchain(data)
+    deadline = deadline_from_header(deadline_ms)
+
+    strict = is_strict(consistency)
 
-    await db.summaries.insert_one({
-        "visitor_id": visitor_id,
-        "input_text": data.text,
-        "summary_text": summary_text,
-        "model": data.model,
-        "provider": data.provider,
-        "created_at": datetime.now(timezone.utc),
-    })
+    lookup = await find_reusable_summary(db, data)
+    if lookup.summary is not None:
+        await save_summary(db, build_summary_record(visitor_id, data, lookup.summary), strict)
 
-    return {"summary": summary_text}
+        async def cached_stream():
+            yield sse_event({"delta": lookup.summary})
+            yield sse_event({"summary": lookup.summary, "cached": True, "cache": lookup.source}, event="done")
+
+        return StreamingResponse(cached_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    trace = ProviderTrace()
+    deltas = stream_summary(data, deadline, trace)
+
+    # Start generation before responding so setup errors keep their status code
+    try:
+        first = await deltas.__anext__()
+    except StopAsyncIteration:
+        first = ""
+
+    async def event_stream():
+        parts = [first]
+        status = "completed"
+        saved = False
+        try:
+            if first:
+                yield sse_event({"delta": first})
+            async for delta in deltas:
+                parts.append(delta)
+                yield sse_event({"delta": delta})
+            summary_text = "".join(parts)
+            record = build_summary_record(visitor_id, data, summary_text, status="completed")
+            await save_summary(db, record, strict)
+            saved = True
+            if not trace.fallback:
+                await remember_summary(db, data, lookup, summary_text, record["_id"])
+            yield sse_event({"summary": summary_text, "cached": False, "cache": None}, event="done")
+        except (asyncio.CancelledError, GeneratorExit):
+            status = "cancelled"
+            raise
+        except HTTPException as e:
+            status = "failed"
+            yield sse_event({"status_code": e.status_code, "detail": e.detail}, event="error")
+        finally:
+            summary_text = "".join(parts)
+            if summary_text and not saved:
+                record = build_summary_record(visitor_id, data, summary_text, status=status)
+                # Separate task so the record is saved even when the client disconnected
+                task = asyncio.ensure_future(save_summary(db, record))
+                _pending_saves.add(task)
+                task.add_done_callback(_pending_saves.discard)
+                try:
+                    await asyncio.shield(task)
+                except asyncio.CancelledError:
+                    logging.info("Summary stream cancelled; record is saved in the background")
+            await deltas.aclose()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.post("/batch")
+async def summarize_batch_route(
+    batch: BatchSummarizeRequest,
+    db=Depends(get_db),
+    visitor_id: str = Header(None, alias="X-Visitor-ID"),
+    deadline_ms: str = Header(None, alias="X-Deadline-Ms")
+):
+    """
+    Endpoint to summarize many documents with one provider configuration.
+
+    Items are summarized `concurrency` at a time and each result is streamed as an
+    NDJSON line as soon as it finishes, so results arrive in completion order; use
+    "index" (position in `items`) or the echoed "id" to match them up. A failing
+    item produces an error line and does not stop the batch. A summary whose record
+    could not be stored is followed by an "unsaved" line with the same "index" and "id".
+
+    Args:
+        batch (BatchSummarizeRequest): Shared configuration plus the documents.
+        db: MongoDB async database session dependency.
+        visitor_id (str): ID from the 'X-Visitor-ID' header to associate with the summaries.
+        deadline_ms (str): Optional time budget per document in milliseconds from the
+            'X-Deadline-Ms' header.
+
+    Returns:
+        StreamingResponse: `application/x-ndjson` with one line per item, then
+            {"done": true, "total", "succeeded", "failed", "cached", "unsaved"}.
+
+    Raises:
+        HTTPException: If the visitor ID is missing or the batch has more than
+            `BATCH_MAX_ITEMS` items (400).
+    """
+    if not visitor_id:
+        raise HTTPException(status_code=400, detail="Missing X-Visitor-ID header")
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch can hold at most {BATCH_MAX_ITEMS} items.")
+
+    async def lines():
+        totals = {"total": len(batch.items), "succeeded": 0, "failed": 0, "cached": 0, "unsaved": 0}
+        results = summarize_batch(db, visitor_id, batch, deadline_ms)
+        try:
+            async for result in results:
+                if result["status"] == "unsaved":
+                    totals["unsaved"] += 1
+                else:
+                    ok = result["status"] == "ok"
+                    totals["succeeded" if ok else "failed"] += 1
+                    totals["cached"] += ok and result["cached"]
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        finally:
+            await results.aclose()
+        yield json.dumps({"done": True, **totals}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/admission")
+async def admission_stats():
+    """
+    Report admission control state for each provider/model lane.
+
+    Returns:
+        dict: In-flight calls, queue depth, rejections and wait times per lane.
+    """
+    return {"lanes": admission.stats()}
+
+
+@router.get("/routing")
+async def routing_stats():
+    """
+    Report provider routing state: hedges, fallbacks and each provider's circuit breaker.
+
+    Returns:
+        dict: Routing counters and, per provider/model, breaker state, error rate and latency.
+    """
+    return provider_router.stats()
+
+
+@router.get("/rate-limits")
+async def rate_limit_stats():
+    """
+    Report client-side rate limiting: throttle waits, retries and each API key's buckets.
+
+    Returns:
+        dict: Throttle and retry counters, and per provider/key the queued calls,
+        remaining pause and available requests/tokens.
+    """
+    return rate_limiter.stats()
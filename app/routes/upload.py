@@ -7,60 +7,377 @@ Supported file types:
 - Plain text files (.txt)
 - PDF files (.pdf)
 
-The uploaded file is temporarily saved on the server, text is extracted from it,
-and then the temporary file is deleted.
+The request body is streamed rather than buffered: text files are decoded
+incrementally as they arrive, and PDFs are spooled in memory (rolling over to a
+uniquely named temporary file when large) and parsed in the extraction worker pool,
+page ranges in parallel. The temporary storage is released once the text has been
+extracted.
+
+The SHA-256 digest of every upload is computed while it streams in and the
+extracted pages are cached under it, so re-uploading a document skips extraction
+and clients can fetch the text again by digest without re-sending the file.
 
 Features:
 - Validates file content type before processing.
-- Uses utility function `extract_text_from_pdf` for PDF text extraction.
-- Returns the extracted text as JSON.
+- Enforces a maximum upload size while the body is streaming.
+- Limits the number of uploads processed concurrently.
+- Uses utility functions `extract_text_from_pdf` / `iter_pdf_pages` for PDF text extraction.
+- Optional page selection (`pages=1-3,7`) and engine choice (`engine=pymupdf|pypdf2`).
+- Optional token-reducing cleanup of the extracted text (`preprocess=default` or a
+  list of steps such as `preprocess=whitespace,repeated_lines`; see
+  app.utils.text_preprocess). The cache always keeps the raw text.
+- Returns the extracted text as JSON, with the upload size, receive time, content
+  digest and whether the text came from the cache, or streams one NDJSON line per
+  page with `stream=true`.
+- GET /api/upload/{digest} returns the text of a previously uploaded document.
+- GET /api/upload/cache reports extraction cache statistics.
+
+Configuration (environment variables):
+    UPLOAD_MAX_BYTES: Maximum accepted file size in bytes (default 25 MiB).
+    UPLOAD_MAX_CONCURRENCY: Uploads processed at once; others wait (default 8).
+    UPLOAD_SPOOL_MAX_MEMORY: Bytes kept in memory before spooling to disk (default 4 MiB).
+    UPLOAD_TMP_DIR: Directory for spooled uploads (default: system temp dir).
 
 Dependencies:
 - FastAPI for routing and request handling.
-- Utility functions from app.utils.file_utils.
-- Standard libraries os and shutil for file operations.
+- Utility functions from app.utils.file_utils and app.utils.upload_stream.
+- The extraction cache from app.services.extraction_cache.
 
 Usage:
 - Send a POST request with a file under the key "file".
 - Receives a JSON response containing the extracted text.
+- With `?stream=true` the response is `application/x-ndjson`:
+    {"page": 1, "text": "..."}
+    ...
+    {"done": true, "pages": 12, "size": 48213, "upload_ms": 3.1, "digest": "...", "cached": false}
+  With `preprocess`, the JSON response and the final line also carry the
+  preprocessing report under "preprocess".
+  Errors after streaming started are reported as a final {"error": "..."} line.
 """
 
+import asyncio
+import json
+import logging
 import os
-import shutil
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.utils.file_utils import extract_text_from_pdf
+from typing import AsyncIterator, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
+from fastapi.responses import StreamingResponse
+from app.dependencies import get_db
+from app.services.extraction_cache import extraction_cache
+from app.utils.file_utils import PDF_ENGINE, PDF_ENGINES, iter_pdf_pages, parse_page_range
+from app.utils.text_preprocess import TextPreprocessor, parse_steps, preprocess_pages
+from app.utils.upload_stream import ReceivedUpload, receive_upload
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_MAX_CONCURRENCY = int(os.getenv("UPLOAD_MAX_CONCURRENCY", "8"))
+
+SUPPORTED_TYPES = ("text/plain", "application/pdf")
 
 router = APIRouter()
 
-@router.post("")
-async def upload_file(file: UploadFile = File(...)):
+_upload_slots = asyncio.Semaphore(UPLOAD_MAX_CONCURRENCY)
+
+# The body is parsed by hand, so describe the form for the OpenAPI docs
+_UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+PagesIterator = AsyncIterator[Tuple[int, str]]
+
+
+def _release(upload: ReceivedUpload):
+    upload.close()
+    _upload_slots.release()
+
+
+async def _abort(upload: ReceivedUpload, source: Optional[PagesIterator]):
+    if source is not None:
+        await source.aclose()
+    _release(upload)
+
+
+def _ndjson(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def _check_engine(engine: Optional[str]):
+    if engine is not None and engine.lower() not in PDF_ENGINES:
+        raise HTTPException(status_code=400, detail=f"Unsupported PDF engine: {engine}")
+
+
+def _preprocess_steps(spec: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Steps for the `preprocess` query parameter: None when absent, the server's
+    default steps for "default", otherwise the listed steps.
+    """
+    if spec is None:
+        return None
+    try:
+        return parse_steps(None if spec.strip().lower() == "default" else spec)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _from_pages(texts: List[str], selected: List[int]) -> PagesIterator:
+    for index in selected:
+        yield index + 1, texts[index]
+
+
+async def _caching(db, upload: ReceivedUpload, engine: str, extracted: PagesIterator) -> PagesIterator:
+    """
+    Pass extracted pages through and cache the document once every page is done.
+    """
+    texts = []
+    try:
+        async for page, text in extracted:
+            texts.append(text)
+            yield page, text
+    finally:
+        await extracted.aclose()
+    await extraction_cache.put(db, upload.digest, engine, texts, upload.size)
+
+
+async def _page_source(db, upload: ReceivedUpload, pages: Optional[str], engine: Optional[str]) -> Tuple[PagesIterator, bool]:
+    """
+    Pages of the upload, from the extraction cache when the digest is known.
+
+    Returns:
+        tuple: (iterator of (page number, text), whether the text came from the cache)
+    """
+    if upload.content_type == "text/plain":
+        cached = await extraction_cache.get(db, upload.digest, "text") is not None
+        if not cached:
+            # Cached as well so the document can be fetched again by digest
+            await extraction_cache.put(db, upload.digest, "text", [upload.text], upload.size)
+        return _from_pages([upload.text], [0]), cached
+
+    engine = (engine or PDF_ENGINE).lower()
+    texts = await extraction_cache.get(db, upload.digest, engine)
+    if texts is not None:
+        return _from_pages(texts, parse_page_range(pages, len(texts))), True
+
+    extracted = iter_pdf_pages(upload.spool.source(), pages, engine)
+    if pages:
+        # Only whole documents are cached
+        return extracted, False
+    return _caching(db, upload, engine, extracted), False
+
+
+async def _first_page(source: PagesIterator):
+    """
+    Wait for the first page, so errors such as an out-of-range page selection are
+    still reported with an HTTP status.
+    """
+    try:
+        return await source.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def _stream_pages(
+    upload: ReceivedUpload,
+    source: PagesIterator,
+    first,
+    cached: bool,
+    preprocessor: Optional[TextPreprocessor],
+):
+    """
+    NDJSON body of a streamed upload. The upload itself is released by
+    `_UploadStreamResponse`.
+    """
+    count = 0
+    try:
+        if first is not None:
+            count += 1
+            yield _ndjson({"page": first[0], "text": first[1]})
+        async for page, text in source:
+            count += 1
+            yield _ndjson({"page": page, "text": text})
+        done = {
+            "done": True,
+            "pages": count,
+            "size": upload.size,
+            "upload_ms": round(upload.elapsed * 1000, 2),
+            "digest": upload.digest,
+            "cached": cached,
+        }
+        if preprocessor is not None:
+            done["preprocess"] = preprocessor.report()
+        yield _ndjson(done)
+    except Exception as e:
+        logging.error(f"PDF extraction failed: {e}")
+        yield _ndjson({"error": "Failed to extract text from the file."})
+    finally:
+        await source.aclose()
+
+
+class _UploadStreamResponse(StreamingResponse):
+    """
+    NDJSON response of a streamed upload that releases the upload slot and the
+    spooled content however the response ends. Releasing in the body generator
+    alone is not enough: if the client goes away before the generator first runs,
+    its `finally` never executes and the slot would be lost.
+    """
+
+    def __init__(self, content: AsyncIterator[str], upload: ReceivedUpload, source: PagesIterator):
+        super().__init__(content, media_type="application/x-ndjson")
+        self.upload = upload
+        self.source = source
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+            await _abort(self.upload, self.source)
+
+
+@router.post("", openapi_extra=_UPLOAD_REQUEST_BODY)
+async def upload_file(
+    request: Request,
+    pages: Optional[str] = Query(None, description="1-based page selection for PDFs, e.g. 1-3,7,10-"),
+    engine: Optional[str] = Query(None, description="PDF engine: pymupdf or pypdf2"),
+    stream: bool = Query(False, description="Stream one NDJSON line per page"),
+    preprocess: Optional[str] = Query(
+        None, description="Clean the text: 'default' or steps, e.g. whitespace,repeated_lines,hyphenation,boilerplate"
+    ),
+    db=Depends(get_db),
+):
 
     """
     Upload a text or PDF file and extract its textual content.
 
     Args:
-        file (UploadFile): The uploaded file, required. Must be either plain text or PDF.
+        request (Request): Multipart request with the file under the "file" field.
+            Must be either plain text or PDF.
+        pages (str, optional): Pages to extract from a PDF (default: all).
+        engine (str, optional): PDF extraction engine (default `PDF_ENGINE`).
+        stream (bool): Stream the pages as NDJSON instead of returning one JSON object.
+        preprocess (str, optional): Preprocessing steps applied to the extracted text
+            ("default" for the server's `PREPROCESS_STEPS`; default: none).
 
     Raises:
-        HTTPException: If the uploaded file type is not supported.
+        HTTPException: If the uploaded file type is not supported (400), the engine,
+            page selection or preprocessing steps are invalid (400), the body is malformed (400) or the file is
+            larger than `UPLOAD_MAX_BYTES` (413).
 
     Returns:
-        dict: JSON object with the key "text" containing the extracted textual content.
+        dict: JSON object with the key "text" containing the extracted textual content,
+            plus "size" (bytes received), "upload_ms" (time spent receiving), "digest"
+            (SHA-256 of the file), "cached" (extraction was skipped) and, with
+            `preprocess`, "preprocess" (tokens before/after and what each step removed).
+            With `stream=true`, an NDJSON streaming response instead.
     """
+    _check_engine(engine)
+    steps = _preprocess_steps(preprocess)
 
-    if file.content_type not in ["text/plain", "application/pdf"]:
-        raise HTTPException(status_code=400, detail="Only txt and pdf files are supported.")
+    await _upload_slots.acquire()
+    try:
+        upload = await receive_upload(request, "file", UPLOAD_MAX_BYTES, SUPPORTED_TYPES)
+    except BaseException:
+        _upload_slots.release()
+        raise
 
-    temp_path = f"{file.filename}"
-    with open(temp_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    source = None
+    preprocessor = None
+    try:
+        source, cached = await _page_source(db, upload, pages, engine)
+        if steps is not None:
+            # Plain text has no pages to find running headers on; it is cleaned in line blocks
+            preprocessor = TextPreprocessor(steps, paged=upload.content_type != "text/plain")
+            source = preprocess_pages(source, preprocessor)
+        if stream:
+            first = await _first_page(source)
+        else:
+            extracted_text = "\n".join([text async for _, text in source])
+    except ValueError as e:
+        await _abort(upload, source)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        await _abort(upload, source)
+        logging.error(f"PDF extraction failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to extract text from the file.")
+    except BaseException:
+        await _abort(upload, source)
+        raise
 
-    extracted_text = ""
-    if file.content_type == "text/plain":
-        with open(temp_path, "r", encoding="utf-8") as f:
-            extracted_text = f.read()
+    if stream:
+        # The response releases the slot and the upload when it ends
+        body = _stream_pages(upload, source, first, cached, preprocessor)
+        return _UploadStreamResponse(body, upload, source)
+
+    _release(upload)
+    response = {
+        "text": extracted_text,
+        "size": upload.size,
+        "upload_ms": round(upload.elapsed * 1000, 2),
+        "digest": upload.digest,
+        "cached": cached,
+    }
+    if preprocessor is not None:
+        response["preprocess"] = preprocessor.report()
+    return response
+
+
+@router.get("/cache")
+async def extraction_cache_stats():
+    """
+    Extraction cache occupancy and hit/miss counters.
+    """
+    return extraction_cache.stats()
+
+
+@router.get("/{digest}")
+async def get_document(
+    digest: str = Path(..., pattern="^[0-9a-f]{64}$", description="SHA-256 digest returned by the upload"),
+    pages: Optional[str] = Query(None, description="1-based page selection, e.g. 1-3,7,10-"),
+    engine: Optional[str] = Query(None, description="PDF engine the text was extracted with"),
+    db=Depends(get_db),
+):
+    """
+    Return the text of a previously uploaded document by its digest.
+
+    Args:
+        digest (str): Hex SHA-256 digest from the upload response.
+        pages (str, optional): Pages to return (default: all).
+        engine (str, optional): Extraction engine (default: any cached one).
+
+    Raises:
+        HTTPException: 400 for an invalid engine or page selection, 404 if the
+            document is not in the extraction cache.
+
+    Returns:
+        dict: "digest", "engine", "pages" (number of pages returned) and "text".
+    """
+    _check_engine(engine)
+    if engine:
+        engines = [engine.lower()]
     else:
-        extracted_text = await extract_text_from_pdf(temp_path)
+        engines = [PDF_ENGINE] + [e for e in PDF_ENGINES if e != PDF_ENGINE] + ["text"]
+
+    found = await extraction_cache.find(db, digest, engines)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Document not found; upload it again.")
+    engine, texts = found
+    try:
+        selected = parse_page_range(pages, len(texts))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    os.remove(temp_path)
-    return {"text": extracted_text}
+    return {
+        "digest": digest,
+        "engine": engine,
+        "pages": len(selected),
+        "text": "\n".join(texts[i] for i in selected),
+    }
@@ -8,12 +8,23 @@ Features:
 - Updates the visitor's last visited timestamp on repeat visits.
 - Tracks total unique visitors globally.
 - Returns the current count of unique visitors.
+- Visits are written behind the response as one upsert per visitor; repeated visits
+  within a flush interval are coalesced, and the global count is incremented once
+  per flush by the number of newly inserted visitors. Send 'X-Consistency: strict'
+  to wait for the write. A failed increment makes the count be recounted from the
+  visitor collection, which is also done periodically.
+- The unique-visitor count is served from an in-process cache refreshed every
+  few seconds (`VISITOR_COUNT_TTL`), not read from Mongo on every call.
+- Approximate daily and weekly unique visitors from per-day HyperLogLog sketches
+  (see app.services.visitor_stats), without scanning the visitor collection.
 
 Endpoints:
 /visit (POST):
     Registers or updates a visitor using the provided visitor ID header.
 /count (GET):
     Retrieves the total count of unique visitors.
+/stats (GET):
+    Retrieves approximate unique visitors for today and the last 7 days.
 
 Dependencies:
 - MongoDB database accessed via dependency injection (`get_db`).
@@ -22,18 +33,53 @@ Dependencies:
 Usage:
 - Send POST /visit requests with header "X-Visitor-ID" to register or update visits.
 - Query GET /count to get the total unique visitor count.
+- Query GET /stats for {"count", "daily", "weekly"}; "daily" and "weekly" are
+  estimates within a few percent.
 """
 
 from typing import Optional
 from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, Header, HTTPException
+from pymongo import UpdateOne
 from app.dependencies import get_db
+from app.services.visitor_stats import unique_windows, visitor_counter
+from app.services.write_behind import is_strict, write_behind
 
 router = APIRouter()
 
+
+async def _count_new_visitors(db, result):
+    """
+    Add the visitors inserted by a flush of visit upserts to the global count.
+    """
+    if result.upserted_count:
+        try:
+            await db.visitor.update_one(
+                {"_id": "global"},
+                {"$inc": {"count": result.upserted_count}},
+                upsert=True
+            )
+        except Exception:
+            # The visits are stored; recount them instead of losing the increment
+            visitor_counter.mark_drifted()
+            raise
+        visitor_counter.add(result.upserted_count)
+
+
+async def _persist_unique_windows(db, result):
+    """
+    Store the daily unique-visitor sketches along with the visits.
+    """
+    await unique_windows.persist(db)
+
+write_behind.on_flush("visitor", _count_new_visitors)
+write_behind.on_flush("visitor", _persist_unique_windows)
+
+
 @router.post("/visit")
 async def register_visit(
     visitor_id: Optional[str] = Header(None, alias="X-Visitor-ID"),
+    consistency: Optional[str] = Header(None, alias="X-Consistency"),
     db=Depends(get_db)
 ):
     """
@@ -41,38 +87,34 @@ async def register_visit(
 
     Args:
         visitor_id (str, optional): Unique visitor ID from header 'X-Visitor-ID'. Required.
+        consistency (str, optional): 'strict' in the 'X-Consistency' header waits for the write.
         db: Database session dependency.
 
     Raises:
         HTTPException: 400 error if 'X-Visitor-ID' header is missing.
 
     Returns:
-        dict: Status message about visit registration or update.
+        dict: Status message about visit registration or update. Buffered visits
+            report "Visit recorded", since it is not yet known whether the visitor is new.
     """
 
     if not visitor_id:
         raise HTTPException(status_code=400, detail="Missing X-Visitor-ID header")
 
-    existing = await db.visitor.find_one({"_id": visitor_id})
-
-    if existing:
-        # Update last visited timestamp
-        await db.visitor.update_one(
-            {"_id": visitor_id},
-            {"$set": {"visited_at": datetime.now(timezone.utc)
-            }}
-        )
-        return {"message": "Visitor timestamp updated"}
-
-    # New visitor: insert record with timestamp and increment global count
-    await db.visitor.insert_one({"_id": visitor_id, "visited_at": datetime.now(timezone.utc)})
-
-    await db.visitor.update_one(
-        {"_id": "global"},
-        {"$inc": {"count": 1}},
+    # Insert new visitors or update the last visited timestamp in one upsert
+    visit = UpdateOne(
+        {"_id": visitor_id},
+        {"$set": {"visited_at": datetime.now(timezone.utc)}},
         upsert=True
     )
-    return {"message": "Visit registered"}
+    unique_windows.record(visitor_id)
+    result = await write_behind.write(db, "visitor", visit, key=visitor_id, strict=is_strict(consistency))
+
+    if result is None:
+        return {"message": "Visit recorded"}
+    if result.upserted_count:
+        return {"message": "Visit registered"}
+    return {"message": "Visitor timestamp updated"}
 
 
 @router.get("/count")
@@ -85,8 +127,29 @@ async def get_visit_count(db=Depends(get_db)):
         db: Database session dependency.
 
     Returns:
-        dict: JSON object containing the total unique visitor count.
+        dict: JSON object containing the total unique visitor count, at most
+            `VISITOR_COUNT_TTL` seconds old.
+    """
+
+    return {"count": await visitor_counter.get(db)}
+
+
+@router.get("/stats")
+async def get_visitor_stats(db=Depends(get_db)):
+
+    """
+    Get the total unique visitors and approximate unique visitors per time window.
+
+    Args:
+        db: Database session dependency.
+
+    Returns:
+        dict: "count" (all time), "daily" (today, UTC) and "weekly" (last 7 days)
+            unique visitors. The windowed counts are HyperLogLog estimates.
     """
 
-    doc = await db.visitor.find_one({"_id": "global"})
-    return {"count": doc["count"] if doc else 0}
+    return {
+        "count": await visitor_counter.get(db),
+        "daily": await unique_windows.estimate(db, days=1),
+        "weekly": await unique_windows.estimate(db, days=7),
+    }
@@ -9,32 +9,74 @@ Model:
     SummarizeRequest: Request model containing all necessary parameters 
     to invoke a language model from different providers like OpenAI, 
     Azure OpenAI, Anthropic, or Gemini.
+    SummarizeJobRequest: Summarization request queued as a background job.
+    BatchSummarizeRequest: Many documents sharing one provider configuration.
+    ProviderConfig: A fallback provider a request may be routed to.
 
 Usage:
     This schema is used in the POST `/summarize` endpoint to validate
     and extract the request body fields.
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import List, Literal, Optional
 
-class SummarizeRequest(BaseModel):
+class ProviderConfig(BaseModel):
 
     """
-    Schema for summarization request sent to the LLM summarizer endpoint.
+    One provider configuration a request may be routed to.
+
+    Attributes:
+        provider (str): Name of the AI provider (e.g., "openai", "azureopenai", "anthropic", "gemini").
+        model (str): The name or deployment ID of the model to use.
+        api_key (str): The API key used to authenticate with the provider.
+        api_url (str, optional): The base API URL of the LLM provider. Defaults to "".
+        api_version (str, optional): Version identifier for APIs that require it. Defaults to "".
+        temperature (float, optional): Sampling temperature; the request's when omitted.
+    """
+
+    provider: str
+    model: str
+    api_key: str
+    api_url: Optional[str] = ""
+    api_version: Optional[str] = ""
+    temperature: Optional[float] = None
+
+
+class SummarizeConfig(BaseModel):
+
+    """
+    Provider and summarization settings shared by single and batch summarization requests.
 
     Attributes:
-        text (str): The input text to be summarized.
         api_url (str): The base API URL of the LLM provider.
         api_key (str): The API key used to authenticate with the provider.
         model (str): The name or deployment ID of the model to use.
         temperature (float, optional): Sampling temperature (0–1). Defaults to 0.5.
         prompt (str, optional): Optional custom system prompt for context setting.
-        provider (str, optional): Name of the AI provider (e.g., "openai", "azureopenai", "anthropic", "gemini"). Defaults to "gemini".
+        provider (str, optional): Name of the AI provider (e.g., "openai", "azureopenai", "anthropic", "gemini",
+            or "extractive" for an in-process summary of key sentences). Defaults to "gemini".
         api_version (str, optional): Optional version identifier for APIs that require it (e.g., Azure OpenAI). Defaults to "".
+        mode (str, optional): "single" sends the whole text in one call, "map_reduce" summarizes
+            chunks concurrently and combines them, "auto" picks map_reduce above the long-document
+            threshold. Defaults to "auto".
+        chunk_size (int, optional): Maximum tokens per chunk in map_reduce mode. Defaults to 3000.
+        chunk_overlap (int, optional): Tokens shared between consecutive chunks. Defaults to 200.
+        max_concurrency (int, optional): Maximum chunk summaries in flight at once. Defaults to 4.
+        no_cache (bool, optional): Bypass the summary cache and always call the provider. Defaults to False.
+        fallbacks (List[ProviderConfig], optional): Providers to route to, in order, when this one
+            is slow or failing (see app.services.provider_router). Defaults to none.
+        routing (str, optional): "hedged" also sends a duplicate call to the next provider when
+            one is slower than its p95 latency; "fallback" only moves on after a failure.
+            Defaults to "hedged".
+        preprocess (List[str], optional): Token-reducing cleanup applied to the text before it
+            is sent ("whitespace", "repeated_lines", "hyphenation", "boilerplate"; see
+            app.utils.text_preprocess). Defaults to the server's PREPROCESS_STEPS; [] disables it.
+        prepass_tokens (int, optional): Shorten texts longer than this many tokens to about this
+            many by selecting their key sentences in-process (app.services.extractive) before the
+            provider sees them. Defaults to none (the whole text is sent).
     """
 
-    text: str
     api_url: str
     api_key: str
     model: str
@@ -42,6 +84,86 @@ class SummarizeRequest(BaseModel):
     prompt: Optional[str] = None
     provider: Optional[str] = "gemini"
     api_version: Optional[str] = ""
+    mode: Literal["auto", "single", "map_reduce"] = "auto"
+    chunk_size: int = Field(3000, ge=256, le=100_000)
+    chunk_overlap: int = Field(200, ge=0)
+    max_concurrency: int = Field(4, ge=1, le=16)
+    no_cache: bool = False
+    fallbacks: List[ProviderConfig] = Field(default_factory=list, max_length=4)
+    routing: Literal["hedged", "fallback"] = "hedged"
+    preprocess: Optional[List[Literal["whitespace", "repeated_lines", "hyphenation", "boilerplate"]]] = None
+    prepass_tokens: Optional[int] = Field(None, ge=256)
+
+    @model_validator(mode="after")
+    def check_overlap(self):
+        if self.chunk_overlap >= self.chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size.")
+        return self
+
+
+class SummarizeRequest(SummarizeConfig):
+
+    """
+    Schema for summarization request sent to the LLM summarizer endpoint.
+
+    Attributes:
+        text (str): The input text to be summarized.
+        Plus every provider and summarization setting of `SummarizeConfig`.
+    """
+
+    text: str
+
+
+class SummarizeJobRequest(SummarizeRequest):
+
+    """
+    Schema for queuing a summarization job.
+
+    Attributes:
+        priority (int, optional): Jobs with higher priority are started first (-10 to 10). Defaults to 0.
+        Plus every field of `SummarizeRequest`.
+    """
+
+    priority: int = Field(0, ge=-10, le=10)
+
+
+class BatchItem(BaseModel):
+
+    """
+    One document of a batch summarization request.
+
+    Attributes:
+        id (str, optional): Client reference echoed back in the item's result.
+        text (str): The input text to be summarized.
+        prompt (str, optional): Overrides the batch prompt for this document.
+    """
+
+    id: Optional[str] = None
+    text: str
+    prompt: Optional[str] = None
+
+
+class BatchSummarizeRequest(SummarizeConfig):
+
+    """
+    Schema for summarizing many documents with one provider configuration.
+
+    Attributes:
+        items (List[BatchItem]): Documents to summarize.
+        concurrency (int, optional): Documents summarized at once. Defaults to 4.
+        Plus every provider and summarization setting of `SummarizeConfig`, shared by all items.
+    """
+
+    items: List[BatchItem] = Field(..., min_length=1)
+    concurrency: int = Field(4, ge=1, le=16)
+
+    def item_request(self, item: BatchItem) -> SummarizeRequest:
+        """
+        Build the single-document request for one item of the batch.
+        """
+        config = self.model_dump(exclude={"items", "concurrency"})
+        config["prompt"] = item.prompt or self.prompt
+        return SummarizeRequest(**config, text=item.text)
 
 
 class ChatMessage(BaseModel):
@@ -68,6 +190,8 @@ class ChatRequest(BaseModel):
         temperature (float, optional): Sampling temperature (0–1). Defaults to 0.7.
         provider (str, optional): Name of the AI provider (e.g., "openai", "azureopenai", "anthropic", "gemini"). Defaults to "gemini".
         api_version (str, optional): Optional version identifier for APIs that require it (e.g., Azure OpenAI). Defaults to "".
+        fallbacks (List[ProviderConfig], optional): Providers to route to, in order, when this one is slow or failing.
+        routing (str, optional): "hedged" (default) or "fallback", as for summarization.
     """
     message: str = Field(..., description="user inputs to AI.")
     api_url: str = Field(..., description="Base API URL of the LLM provider.")
@@ -77,3 +201,5 @@ class ChatRequest(BaseModel):
     provider: str = Field("gemini", description='AI provider (e.g., "openai", "azureopenai", "anthropic", "gemini").')
     api_version: str = Field("", description="Optional version for some APIs (e.g., Azure).")
     visitor_id: str = Field("", description="Unique ID of user.")
+    fallbacks: List[ProviderConfig] = Field(default_factory=list, max_length=4, description="Fallback providers, in order.")
+    routing: Literal["hedged", "fallback"] = Field("hedged", description='"hedged" or "fallback" routing over the fallbacks.')
@@ -0,0 +1,192 @@
+"""
+Admission Control Module for LLM Provider Calls
+
+This module limits how many LLM calls may run concurrently against a single
+provider/model pair, so a slow or degraded provider cannot pile up unbounded
+work inside the event loop.
+
+Features:
+- Caps in-flight calls per (provider, model) lane
+- Queues a bounded number of waiters; excess requests are rejected with 429
+- Honors a client-supplied deadline (`X-Deadline-Ms` header); requests whose
+  deadline expires while queued are rejected with 503
+- Tracks queue depth, in-flight calls and wait times for observability
+
+Configuration (environment variables):
+    LLM_MAX_IN_FLIGHT: Concurrent calls allowed per lane (default 8).
+    LLM_MAX_QUEUE: Waiters allowed per lane before rejecting (default 32).
+    LLM_DEFAULT_TIMEOUT: Deadline in seconds when the client sends none (default 120).
+
+Usage:
+    deadline = deadline_from_header(request_header_value)
+    async with admission.slot(data.provider, data.model, deadline):
+        response = await llm.ainvoke(messages)
+"""
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException
+
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_DEFAULT_TIMEOUT = float(os.getenv("LLM_DEFAULT_TIMEOUT", "120"))
+
+
+def deadline_from_header(deadline_ms: Optional[str]) -> float:
+    """
+    Convert a client-supplied time budget into an absolute monotonic deadline.
+
+    Args:
+        deadline_ms (str, optional): Remaining time budget in milliseconds,
+            as sent in the `X-Deadline-Ms` header.
+
+    Returns:
+        float: Absolute deadline on the `time.monotonic()` clock.
+
+    Raises:
+        HTTPException: 400 if the header is not a positive number.
+    """
+    if not deadline_ms:
+        return time.monotonic() + LLM_DEFAULT_TIMEOUT
+    try:
+        budget = float(deadline_ms) / 1000
+    except ValueError:
+        raise HTTPException(status_code=400, detail="X-Deadline-Ms must be a number of milliseconds.")
+    if budget <= 0:
+        raise HTTPException(status_code=400, detail="X-Deadline-Ms must be positive.")
+    return time.monotonic() + min(budget, LLM_DEFAULT_TIMEOUT)
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """
+    Seconds left until `deadline`, or None when no deadline applies.
+    """
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class _Lane:
+    """
+    Concurrency lane for a single provider/model pair.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int):
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "avg_wait_ms": round(self.total_wait / self.admitted * 1000, 2) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+        }
+
+
+class AdmissionController:
+    """
+    Per-provider/model admission controller with bounded queues and deadlines.
+
+    Args:
+        max_in_flight (int): Concurrent calls allowed per lane.
+        max_queue (int): Waiters allowed per lane before new requests are rejected.
+    """
+
+    def __init__(self, max_in_flight: int = LLM_MAX_IN_FLIGHT, max_queue: int = LLM_MAX_QUEUE):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self._lanes: Dict[Tuple[str, str], _Lane] = {}
+
+    def _lane(self, provider: str, model: str) -> _Lane:
+        key = ((provider or "").lower(), model or "")
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = _Lane(self.max_in_flight, self.max_queue)
+            self._lanes[key] = lane
+        return lane
+
+    @asynccontextmanager
+    async def slot(self, provider: str, model: str, deadline: Optional[float] = None):
+        """
+        Hold an execution slot for one LLM call.
+
+        Args:
+            provider (str): Provider name the call is routed to.
+            model (str): Model name or deployment ID.
+            deadline (float, optional): Absolute `time.monotonic()` deadline.
+
+        Raises:
+            HTTPException: 429 if the lane queue is full, 503 if the deadline
+                expires before a slot frees up.
+        """
+        lane = self._lane(provider, model)
+
+        if lane.semaphore.locked() and lane.queued >= lane.max_queue:
+            lane.rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many pending requests for {provider}/{model}.",
+                headers={"Retry-After": "1"},
+            )
+
+        timeout = remaining(deadline)
+        if timeout is not None and timeout <= 0:
+            lane.expired += 1
+            raise HTTPException(status_code=503, detail="Request deadline already expired.")
+
+        started = time.monotonic()
+        lane.queued += 1
+        try:
+            # Not wait_for: on a timeout racing the acquire it can drop the acquired permit
+            async with asyncio.timeout(timeout):
+                await lane.semaphore.acquire()
+        except TimeoutError:
+            lane.expired += 1
+            raise HTTPException(
+                status_code=503,
+                detail=f"Deadline expired while waiting for {provider}/{model}.",
+                headers={"Retry-After": "1"},
+            )
+        finally:
+            lane.queued -= 1
+
+        waited = time.monotonic() - started
+        lane.admitted += 1
+        lane.total_wait += waited
+        lane.max_wait = max(lane.max_wait, waited)
+        lane.in_flight += 1
+        try:
+            yield
+        finally:
+            lane.in_flight -= 1
+            lane.semaphore.release()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Snapshot of queue depth, in-flight calls and wait times per lane.
+
+        Returns:
+            dict: Mapping of "provider/model" to lane statistics.
+        """
+        return {f"{provider}/{model}": lane.stats() for (provider, model), lane in self._lanes.items()}
+
+
+# Shared controller used by the summarization service
+admission = AdmissionController()
@@ -0,0 +1,195 @@
+"""
+Batch Summarization Module
+
+This module summarizes many documents that share one provider configuration,
+for bulk jobs that would otherwise call POST /api/summarize once per document.
+
+Features:
+- A fixed pool of `concurrency` workers pulls items from a queue, so a batch of
+  thousands of documents never creates thousands of tasks
+- Provider calls still go through the admission controller of `summarize_with_langchain`
+- Each item is checked against the summary cache and near-duplicate index first
+- Results are yielded as items finish, with per-item errors instead of failing the batch
+- Records are persisted with chunked, unordered `insert_many` instead of one
+  `insert_one` per document; buffered records are flushed even if the client
+  goes away mid-batch
+- Items whose record could not be stored are reported with an "unsaved" line, and
+  only stored summaries are made reusable
+
+Configuration (environment variables):
+    BATCH_MAX_ITEMS: Maximum documents per batch request (default 1000).
+    BATCH_INSERT_CHUNK: Records per `insert_many` call (default 100).
+
+Usage:
+    async for result in summarize_batch(db, visitor_id, batch, deadline_ms):
+        ...
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+from app.schemas.models import BatchSummarizeRequest, SummarizeRequest
+from app.services.admission import deadline_from_header
+from app.services.summarize import ProviderTrace, summarize_with_langchain
+from app.services.summary_reuse import ReuseLookup, find_reusable_summary, remember_summary
+from app.services.history_search import history_index
+from app.services.summary_store import build_summary_record, compress_records
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_INSERT_CHUNK = int(os.getenv("BATCH_INSERT_CHUNK", "100"))
+
+# Keeps final flushes of abandoned batches alive until they finish
+_pending_flushes: Set[asyncio.Task] = set()
+
+
+class _BatchWriter:
+    """
+    Buffers summary records and writes them with chunked `insert_many`.
+    Freshly generated summaries are made reusable once their records are stored.
+    """
+
+    def __init__(self, db, chunk: int = BATCH_INSERT_CHUNK):
+        self.db = db
+        self.chunk = chunk
+        # (record, request, reuse lookup, {"index", "id"} of the batch item)
+        self._pending: List[Tuple[Dict[str, Any], SummarizeRequest, Optional[ReuseLookup], Dict[str, Any]]] = []
+
+    def add(self, record: Dict[str, Any], data: SummarizeRequest, lookup: Optional[ReuseLookup], item: Dict[str, Any]):
+        self._pending.append((record, data, lookup, item))
+
+    @property
+    def full(self) -> bool:
+        return len(self._pending) >= self.chunk
+
+    async def flush(self) -> List[Dict[str, Any]]:
+        """
+        Write the buffered records.
+
+        Returns:
+            list: {"index", "id"} of the items whose record could not be stored.
+        """
+        pending, self._pending = self._pending, []
+        if not pending:
+            return []
+        records = [record for record, _, _, _ in pending]
+        failed: Set[int] = set()
+        try:
+            stored = await compress_records(records)
+            await self.db.summaries.insert_many(stored, ordered=False)
+        except BulkWriteError as e:
+            # Unordered inserts store every record except the ones reported here
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            logging.error(f"Batch summary insert failed for {len(failed)} of {len(records)} records: {e}")
+        except Exception as e:
+            failed = set(range(len(records)))
+            logging.error(f"Batch summary insert failed: {e}")
+        inserted = [entry for position, entry in enumerate(pending) if position not in failed]
+        await history_index.add_records([record for record, _, _, _ in inserted])
+        for record, data, lookup, _ in inserted:
+            if lookup is not None:
+                await remember_summary(self.db, data, lookup, record["summary_text"], record["_id"])
+        return [pending[position][3] for position in sorted(failed)]
+
+
+async def _flush(writer: _BatchWriter) -> List[Dict[str, Any]]:
+    """
+    Flush in a separate task so buffered summaries are stored even when the
+    consumer is cancelled (e.g. the client disconnected).
+
+    Returns:
+        list: "unsaved" result lines for the items whose record could not be stored.
+    """
+    task = asyncio.ensure_future(writer.flush())
+    _pending_flushes.add(task)
+    task.add_done_callback(_pending_flushes.discard)
+    failed = await asyncio.shield(task)
+    return [
+        {**item, "status": "unsaved", "detail": "The summary was generated but could not be stored."}
+        for item in failed
+    ]
+
+
+async def _summarize_item(db, data: SummarizeRequest, deadline_ms: Optional[str]) -> Tuple[Dict[str, Any], Optional[ReuseLookup]]:
+    """
+    Summarize one document.
+
+    Returns:
+        tuple: Result fields of the item, and the reuse lookup when the summary was
+        freshly generated by the request's own provider (None for cache hits and
+        fallback answers, which are not remembered).
+    """
+    lookup = await find_reusable_summary(db, data)
+    if lookup.summary is not None:
+        return {"status": "ok", "summary": lookup.summary, "cached": True, "cache": lookup.source}, None
+
+    # The deadline applies to each document, counted from when it starts
+    trace = ProviderTrace()
+    summary_text = await summarize_with_langchain(data, deadline_from_header(deadline_ms), trace)
+    return {"status": "ok", "summary": summary_text, "cached": False, "cache": None}, None if trace.fallback else lookup
+
+
+async def summarize_batch(
+    db, visitor_id: str, batch: BatchSummarizeRequest, deadline_ms: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Summarize every item of a batch, yielding results in completion order.
+
+    Args:
+        db: MongoDB async database.
+        visitor_id (str): Visitor the summaries belong to.
+        batch (BatchSummarizeRequest): Shared configuration and the documents.
+        deadline_ms (str, optional): Time budget per document in milliseconds.
+
+    Yields:
+        dict: {"index", "id", "status": "ok", "summary", "cached", "cache"} for
+        summarized items, {"index", "id", "status": "error", "status_code", "detail"}
+        for failed ones, and {"index", "id", "status": "unsaved", "detail"} after an
+        "ok" item whose record could not be stored.
+    """
+    queue: "asyncio.Queue[int]" = asyncio.Queue()
+    for index in range(len(batch.items)):
+        queue.put_nowait(index)
+    results: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+    writer = _BatchWriter(db)
+
+    async def worker():
+        while not queue.empty():
+            index = queue.get_nowait()
+            item = batch.items[index]
+            result: Dict[str, Any] = {"index": index, "id": item.id}
+            try:
+                data = batch.item_request(item)
+                fields, lookup = await _summarize_item(db, data, deadline_ms)
+                result.update(fields)
+                writer.add(
+                    build_summary_record(visitor_id, data, fields["summary"]), data, lookup,
+                    {"index": index, "id": item.id},
+                )
+            except HTTPException as e:
+                result.update({"status": "error", "status_code": e.status_code, "detail": e.detail})
+            except Exception as e:
+                logging.error(f"Batch item {index} failed: {e}")
+                result.update({"status": "error", "status_code": 500, "detail": "Failed to summarize the document."})
+            results.put_nowait(result)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(min(batch.concurrency, len(batch.items)))]
+    try:
+        for _ in range(len(batch.items)):
+            yield await results.get()
+            if writer.full:
+                for unsaved in await _flush(writer):
+                    yield unsaved
+        for unsaved in await _flush(writer):
+            yield unsaved
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # Records left here belong to an abandoned batch; failures are only logged
+        try:
+            await _flush(writer)
+        except asyncio.CancelledError:
+            logging.info("Batch cancelled; finished summaries are saved in the background")
@@ -5,65 +5,185 @@ This module enables chatting with AI using LangChain-compatible LLMs
 while preserving conversation history for each visitor.
 
 Features:
-- Stores chat history using `ChatMessageHistory` keyed by `visitor_id`
-- Associates a system prompt based on the visitor’s summary
-- Routes the conversation through the appropriate LLM provider using `llm_provider`
+- Stores chat sessions keyed by `visitor_id` in a pluggable session store
+  (bounded in-memory, or shared Mongo so chat scales across workers)
+- Cuts each turn's prompt to a token budget: recent turns verbatim, older turns
+  folded into a rolling summary, well before the store's message cap would drop them
+- Routes the conversation through the appropriate LLM provider using `llm_client`,
+  hedged and failed over to the request's fallback providers by app.services.provider_router
 - Maintains memory for follow-up questions
+- `stream_chat` yields the reply incrementally; the exchange is only committed to
+  memory once the stream finishes
+- Provider calls are recorded in app.services.metrics and kept within the API key's
+  rate limits (app.services.rate_limiter); replies still rate limited after retries
+  are answered with 429 and Retry-After
 
-Requirements:
-- Summarization must occur first to populate `visitor_summaries`
+Configuration (environment variables):
+    CHAT_CONTEXT_TOKENS: Token budget for conversation history sent per turn (default 3000).
 
 Usage:
     response = await chat_with_ai(data)
+    async for delta in stream_chat(data):
+        ...
 
 Raises:
-    HTTPException if summary is missing or AI call fails
+    HTTPException if the AI call fails
 """
 
-from typing import Dict
+import asyncio
 import logging
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain.schema import HumanMessage, AIMessage, SystemMessage
+import os
+from typing import AsyncIterator, Dict, List, Set
+from langchain.schema import HumanMessage, AIMessage, SystemMessage, BaseMessage
 from fastapi import HTTPException
-from app.schemas.models import ChatRequest
-from app.services.llm_providers import llm_provider
+from app.schemas.models import ChatRequest, ProviderConfig
+from app.services.llm_providers import llm_client, chunk_text
+from app.services.metrics import observe_llm
+from app.services.provider_router import candidates, provider_router
+from app.services.rate_limiter import is_rate_limited, rate_limit_error, rate_limiter
+from app.services.session_store import ChatState, session_store
+from app.utils.tokens import count_tokens, estimate_message_tokens
 
-# Stores chat history for each visitor (to enable contextual memory)
-chat_histories: Dict[str, ChatMessageHistory] = {}
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "3000"))
 
-# Stores pre-generated summaries for each visitor
-visitor_summaries: Dict[str, str] = {}
+SYSTEM_PROMPT = "You are a helpful assistant"
+COMPACT_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Update the summary with the new messages. Keep facts, decisions, names and open "
+    "questions; drop pleasantries. Reply with the updated summary only."
+)
 
+# Keeps background compaction tasks alive until they finish
+_compactions: Set[asyncio.Task] = set()
 
-def get_history(visitor_id: str) -> ChatMessageHistory:
+# Visitors whose session is being compacted by this worker
+_compacting: Set[str] = set()
+
+
+async def get_history(visitor_id: str) -> ChatState:
     """
-    Retrieve or create a chat history object for the visitor.
+    Retrieve the chat session of the visitor from the configured session store.
 
-    If no history exists, a new one is initialized with a system prompt
-    embedding the provided summary for context.
+    The state holds the recent messages kept verbatim and the rolling summary of
+    older turns; the system prompt is added by `build_prompt`.
 
     Args:
         visitor_id (str): Unique identifier for the visitor.
-        summary (str): Summarized content to use as the system context.
 
     Returns:
-        ChatMessageHistory: In-memory conversation history.
+        ChatState: Snapshot of the visitor's conversation (empty for new visitors).
+    """
+    return await session_store.load(visitor_id)
+
+
+def _split_by_budget(messages: List[BaseMessage], budget: int) -> int:
+    """
+    Index of the first message of the longest suffix fitting in `budget` tokens.
+    The latest message is always kept.
+    """
+    used = 0
+    start = len(messages)
+    while start > 0:
+        size = count_tokens(str(messages[start - 1].content))
+        if used + size > budget and start < len(messages):
+            break
+        used += size
+        start -= 1
+    return start
+
+
+def _compaction_cut(messages: List[BaseMessage]) -> int:
+    """
+    Number of leading messages to fold into the rolling summary (0 when none need to be).
+    """
+    if (
+        _split_by_budget(messages, CHAT_CONTEXT_TOKENS) == 0
+        and len(messages) <= session_store.max_messages * 3 // 4
+    ):
+        return 0
+    # Keep half the budget (and half the message cap) verbatim so compaction runs every
+    # few turns, not every turn, and long before appends slice unsummarized messages off
+    return max(
+        _split_by_budget(messages, CHAT_CONTEXT_TOKENS // 2),
+        len(messages) - session_store.max_messages // 2,
+    )
+
+
+def build_prompt(state: ChatState, pending: List[BaseMessage]) -> List[BaseMessage]:
+    """
+    Assemble the messages sent to the model for one turn.
+
+    Args:
+        state (ChatState): The visitor's session.
+        pending (list): Messages of the current turn not yet stored in the session.
+
+    Returns:
+        list: System prompt, rolling summary (if any) and the most recent messages
+        that fit in `CHAT_CONTEXT_TOKENS`.
+    """
+    messages = state.messages + pending
+    start = _split_by_budget(messages, CHAT_CONTEXT_TOKENS)
+
+    prompt: List[BaseMessage] = [SystemMessage(content=SYSTEM_PROMPT)]
+    if state.summary:
+        prompt.append(SystemMessage(content=f"Summary of the earlier conversation:\n{state.summary}"))
+    return prompt + messages[start:]
+
+
+async def _compact(visitor_id: str, config: ProviderConfig):
+    """
+    Fold messages that no longer fit the context budget into the rolling summary.
     """
-    if visitor_id not in chat_histories:
-        history = ChatMessageHistory()
-        history.add_message(SystemMessage(
-            content="You are a helpful assistant"
-        ))
-        chat_histories[visitor_id] = history
-    return chat_histories[visitor_id]
+    try:
+        state = await session_store.load(visitor_id)
+        cut = _compaction_cut(state.messages)
+        if cut == 0:
+            return
+        transcript = "\n".join(
+            f"{'User' if isinstance(m, HumanMessage) else 'Assistant'}: {m.content}" for m in state.messages[:cut]
+        )
+        messages = [
+            SystemMessage(content=COMPACT_PROMPT),
+            HumanMessage(content=f"Current summary:\n{state.summary or '(none)'}\n\nNew messages:\n{transcript}"),
+        ]
+
+        async def call_once():
+            async with observe_llm(config.provider, config.model, "chat_compact") as call:
+                response = await llm.ainvoke(messages)
+                call.usage(response)
+                return response
+
+        async with llm_client(config) as llm:
+            response = await rate_limiter.run(config, estimate_message_tokens(messages), None, call_once)
+        if not await session_store.compact(visitor_id, state, cut, chunk_text(response)):
+            # Another worker compacted the session first; the next turn retries if still needed
+            logging.info(f"Chat compaction of {visitor_id} skipped: session changed concurrently")
+    except Exception as e:
+        logging.warning(f"Chat compaction failed: {e}")
+    finally:
+        _compacting.discard(visitor_id)
+
+
+async def _commit(visitor_id: str, state: ChatState, user_message: HumanMessage, reply: str, config: ProviderConfig):
+    """
+    Store a completed exchange and schedule compaction when history exceeds the budget.
+    """
+    exchange = [user_message, AIMessage(content=reply)]
+    await session_store.append(visitor_id, exchange)
+
+    if _compaction_cut(state.messages + exchange) > 0 and visitor_id not in _compacting:
+        _compacting.add(visitor_id)
+        task = asyncio.ensure_future(_compact(visitor_id, config))
+        _compactions.add(task)
+        task.add_done_callback(_compactions.discard)
 
 
 async def chat_with_ai(data: ChatRequest) -> Dict[str, str]:
     """
     Process a chat request using the specified LLM provider with visitor-specific memory.
 
-    Requires that a summary has already been generated and stored for the visitor.
-    The function maintains context by using a stored message history.
+    The function maintains context by using the stored rolling summary and the
+    most recent messages that fit the context token budget.
 
     Args:
         data (ChatRequest): Chat request containing:
@@ -79,24 +199,108 @@ async def chat_with_ai(data: ChatRequest) -> Dict[str, str]:
     """
     visitor_id = data.visitor_id
 
-    history = get_history(visitor_id)
+    state = await get_history(visitor_id)
+    user_message = HumanMessage(content=data.message)
 
-    # Append user message to history
-    history.add_message(HumanMessage(content=data.message))
+    prompt = build_prompt(state, [user_message])
 
-    try:
-        # Initialize LLM instance based on provider/model config
-        llm = llm_provider(data)
+    async def attempt(config: ProviderConfig) -> str:
+        # Lease the LLM instance for the provider/model config
+        async with llm_client(config) as llm:
+
+            # Send the budgeted conversation context to LLM
+            async def call_once():
+                async with observe_llm(config.provider, config.model, "chat") as call:
+                    response = await llm.ainvoke(prompt)
+                    call.usage(response)
+                    return response
+
+            response = await rate_limiter.run(config, estimate_message_tokens(prompt), None, call_once)
+        return response.content
 
-        # Send entire conversation history to LLM
-        response = await llm.ainvoke(history.messages)
-        reply = response.content
+    try:
+        config, reply = await provider_router.call(candidates(data), attempt, hedge=data.routing == "hedged")
 
-        # Save AI's reply in history
-        history.add_message(AIMessage(content=reply))
+        # Save the exchange in memory
+        await _commit(visitor_id, state, user_message, reply, config)
 
         return {"answer": reply}
 
     except Exception as e:
         logging.error(f"Chat failed: {e}")
+        if is_rate_limited(e) or (isinstance(e, HTTPException) and e.status_code == 429):
+            raise e if isinstance(e, HTTPException) else rate_limit_error(e)
         raise HTTPException(status_code=500, detail="Failed to get response from AI.")
+
+
+async def stream_chat(data: ChatRequest) -> AsyncIterator[str]:
+    """
+    Stream an AI reply for a chat request, yielding text deltas as they arrive.
+
+    The user message and the assembled AI reply are appended to the visitor's
+    history only when the stream finishes. If the consumer stops iterating early
+    (e.g. the client disconnected), closing this generator closes the upstream
+    provider stream and the history is left unchanged.
+
+    Args:
+        data (ChatRequest): Same input as `chat_with_ai`.
+
+    Yields:
+        str: Successive pieces of the AI reply.
+
+    Raises:
+        HTTPException: If the AI call fails.
+    """
+    state = await get_history(data.visitor_id)
+    user_message = HumanMessage(content=data.message)
+    prompt = build_prompt(state, [user_message])
+    parts = []
+    config = None
+
+    deltas = provider_router.stream(
+        candidates(data), lambda config: _stream_one(config, prompt), hedge=data.routing == "hedged"
+    )
+    try:
+        async for config, delta in deltas:
+            parts.append(delta)
+            yield delta
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Chat stream failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get response from AI.")
+    finally:
+        await deltas.aclose()
+
+    if config is None:
+        config = candidates(data)[0]
+    await _commit(data.visitor_id, state, user_message, "".join(parts), config)
+
+
+async def _stream_one(config: ProviderConfig, prompt: List[BaseMessage]) -> AsyncIterator[str]:
+    """
+    Stream one provider's reply to the assembled prompt.
+    """
+    async with llm_client(config) as llm, observe_llm(config.provider, config.model, "chat_stream") as call:
+        stream = None
+        try:
+            stream, chunk = await rate_limiter.open_stream(
+                config, estimate_message_tokens(prompt), None, lambda: llm.astream(prompt)
+            )
+            while chunk is not None:
+                call.usage(chunk)
+                delta = chunk_text(chunk)
+                if delta:
+                    call.first_token()
+                    yield delta
+                chunk = await anext(stream, None)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logging.error(f"Chat stream failed: {e}")
+            if is_rate_limited(e):
+                raise rate_limit_error(e) from e
+            raise HTTPException(status_code=500, detail="Failed to get response from AI.") from e
+        finally:
+            if stream is not None:
+                await stream.aclose()
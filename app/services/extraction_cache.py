@@ -0,0 +1,187 @@
+"""
+Extraction Cache Module
+
+This module caches the text extracted from uploaded files, keyed by the SHA-256
+digest of the file content, so re-uploading a document skips extraction and the
+client can refer to an uploaded document by its digest.
+
+Features:
+- Entries hold the text of every page, so any page selection of a cached
+  document can be served from the cache
+- Keys combine the content digest with the extraction engine ("text" for plain
+  text uploads), since engines produce slightly different text
+- Tier 1: in-process LRU bounded by entry count and total text bytes
+- Tier 2: the `extracted_text` Mongo collection, created as a capped collection
+  so the oldest documents are dropped once the size cap is reached
+- Mongo hits are promoted into the in-process tier
+
+Configuration (environment variables):
+    EXTRACT_CACHE_MAX_ENTRIES: Maximum in-process entries (default 256).
+    EXTRACT_CACHE_MAX_BYTES: Maximum in-process text bytes (default 64 MiB).
+    EXTRACT_CACHE_DB_BYTES: Size cap of the Mongo collection (default 512 MiB).
+
+Usage:
+    pages = await extraction_cache.get(db, digest, "pymupdf")
+    if pages is None:
+        pages = [...]
+        await extraction_cache.put(db, digest, "pymupdf", pages)
+"""
+
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+from pymongo.errors import DuplicateKeyError
+
+EXTRACT_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACT_CACHE_MAX_ENTRIES", "256"))
+EXTRACT_CACHE_MAX_BYTES = int(os.getenv("EXTRACT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+EXTRACT_CACHE_DB_BYTES = int(os.getenv("EXTRACT_CACHE_DB_BYTES", str(512 * 1024 * 1024)))
+
+COLLECTION = "extracted_text"
+
+
+def _size(pages: List[str]) -> int:
+    return sum(len(text.encode("utf-8")) for text in pages)
+
+
+class ExtractionCache:
+    """
+    Two-tier cache of extracted page texts: in-process LRU backed by a capped
+    Mongo collection.
+
+    Args:
+        max_entries (int): Maximum number of in-process entries.
+        max_bytes (int): Maximum total size of in-process text in bytes.
+        db_bytes (int): Size cap of the Mongo collection in bytes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = EXTRACT_CACHE_MAX_ENTRIES,
+        max_bytes: int = EXTRACT_CACHE_MAX_BYTES,
+        db_bytes: int = EXTRACT_CACHE_DB_BYTES,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.db_bytes = db_bytes
+        self._entries: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+
+    async def ensure_collection(self, db):
+        """
+        Create the capped Mongo collection if it does not exist yet.
+        """
+        if COLLECTION not in await db.list_collection_names():
+            await db.create_collection(COLLECTION, capped=True, size=self.db_bytes)
+
+    @staticmethod
+    def key(digest: str, engine: str) -> str:
+        return f"{digest}:{engine}"
+
+    def _remember(self, key: str, pages: List[str]):
+        size = _size(pages)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._entries.pop(key)
+            self._bytes -= self._sizes.pop(key)
+        self._entries[key] = pages
+        self._sizes[key] = size
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            evicted, _ = self._entries.popitem(last=False)
+            self._bytes -= self._sizes.pop(evicted)
+
+    async def get(self, db, digest: str, engine: str) -> Optional[List[str]]:
+        """
+        Look up the extracted pages of a document, checking the in-process tier first.
+
+        Args:
+            db: MongoDB async database.
+            digest (str): Hex SHA-256 digest of the file content.
+            engine (str): Extraction engine, or "text" for plain text uploads.
+
+        Returns:
+            list or None: Text of every page in order, or None on a miss.
+        """
+        key = self.key(digest, engine)
+        pages = self._entries.get(key)
+        if pages is not None:
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            return pages
+
+        try:
+            doc = await db[COLLECTION].find_one({"_id": key}, {"pages": 1})
+        except Exception as e:
+            logging.warning(f"Extraction cache lookup failed: {e}")
+            doc = None
+        if doc is None:
+            self.misses += 1
+            return None
+
+        self.mongo_hits += 1
+        self._remember(key, doc["pages"])
+        return doc["pages"]
+
+    async def find(self, db, digest: str, engines: Iterable[str]) -> Optional[tuple]:
+        """
+        Look up a document under the first engine that has it cached.
+
+        Returns:
+            tuple or None: (engine, pages), or None if the digest is unknown.
+        """
+        for engine in engines:
+            pages = await self.get(db, digest, engine)
+            if pages is not None:
+                return engine, pages
+        return None
+
+    async def put(self, db, digest: str, engine: str, pages: List[str], size: int = 0):
+        """
+        Store the extracted pages of a document in both tiers.
+
+        Args:
+            db: MongoDB async database.
+            digest (str): Hex SHA-256 digest of the file content.
+            engine (str): Extraction engine, or "text" for plain text uploads.
+            pages (list): Text of every page in order.
+            size (int, optional): Size of the original file in bytes.
+        """
+        key = self.key(digest, engine)
+        self._remember(key, pages)
+        try:
+            # The capped collection is insert-only; a concurrent insert of the same key is fine
+            await db[COLLECTION].insert_one({
+                "_id": key,
+                "digest": digest,
+                "engine": engine,
+                "pages": pages,
+                "file_size": size,
+                "created_at": datetime.now(timezone.utc),
+            })
+        except DuplicateKeyError:
+            pass
+        except Exception as e:
+            logging.warning(f"Extraction cache write failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """
+        In-process occupancy and hit/miss counters.
+        """
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "memory_hits": self.memory_hits,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+        }
+
+
+# Shared extraction cache instance
+extraction_cache = ExtractionCache()
@@ -0,0 +1,303 @@
+"""
+Extractive Summarizer Module
+
+This module summarizes text in-process, without a network call, by selecting its
+highest-ranked sentences. It is available as a provider (`provider: "extractive"`)
+for quick gists through the normal summarization and history path, and as a cheap
+first pass that shortens long inputs before they are sent to an LLM provider
+(`prepass_tokens` of SummarizeConfig).
+
+Features:
+- TF-IDF sentence vectors built and ranked with NumPy: the term matrix is kept
+  sparse as (row, column, value) arrays and every product is a `np.bincount`, so the
+  cost is linear in the number of words
+- Two rankings, chosen by the model name:
+  "textrank" (default): PageRank over the cosine-similarity graph of the sentences,
+  iterated as S·v = X(Xᵀv) without ever building the sentence-by-sentence matrix;
+  "tfidf": cosine similarity of each sentence to the document centroid
+- Selected sentences are returned in document order; sentences with the same words
+  are only selected once
+
+Configuration:
+    Per request, as query parameters of `api_url` (e.g. "extractive://?sentences=8"),
+    or globally with environment variables:
+
+    EXTRACTIVE_SENTENCES: Sentences in a summary (default 5).
+    EXTRACTIVE_MIN_WORDS: Sentences with fewer words are never selected (default 5).
+    EXTRACTIVE_DAMPING: TextRank damping factor (default 0.85).
+    EXTRACTIVE_MAX_ITERATIONS: TextRank power iterations at most (default 50).
+
+Usage:
+    {"provider": "extractive", "model": "textrank", "api_key": "-", "api_url": "", "text": "..."}
+    summary = extract_summary(text, sentences=5)
+    shortened = extract_summary(text, max_tokens=4000)
+"""
+
+import asyncio
+import os
+import re
+import time
+from dataclasses import dataclass
+from itertools import chain, count
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import numpy as np
+from langchain.schema import BaseMessage
+from langchain_core.messages import AIMessage, AIMessageChunk
+from app.utils.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+EXTRACTIVE_SENTENCES = int(os.getenv("EXTRACTIVE_SENTENCES", "5"))
+EXTRACTIVE_MIN_WORDS = int(os.getenv("EXTRACTIVE_MIN_WORDS", "5"))
+EXTRACTIVE_DAMPING = float(os.getenv("EXTRACTIVE_DAMPING", "0.85"))
+EXTRACTIVE_MAX_ITERATIONS = int(os.getenv("EXTRACTIVE_MAX_ITERATIONS", "50"))
+
+RANKINGS = ("textrank", "tfidf")
+
+# Inputs longer than this are ranked in a worker thread
+THREAD_MIN_CHARS = 64 * 1024
+# TextRank stops once the scores move less than this in total
+TEXTRANK_TOLERANCE = 1e-6
+
+_PARAGRAPH = re.compile(r"\n\s*\n|\f")
+_SENTENCE_END = re.compile(r"([.!?][\"'\u201d\u2019)\]]?)\s+(?=[\"'\u201c\u2018(\[]?[A-Z0-9])")
+_LINE_BREAK = re.compile(r"\s*\n\s*")
+_WORD = re.compile(r"[^\W\d_]{2,}")
+
+# A period after these does not end a sentence
+ABBREVIATIONS = frozenset("mr mrs ms dr prof st vs etc fig no vol inc ltd co jr sr e.g i.e".split())
+
+STOP_WORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before
+being below between both but by can could did do does doing down during each few for from
+further had has have having he her here hers herself him himself his how however if in into
+is it its itself just may me might more most must my myself no nor not now of off on once
+only or other our ours ourselves out over own same shall she should so some such than that
+the their theirs them themselves then there these they this those through to too under
+until up upon us very was we were what when where which while who whom why will with would
+you your yours yourself yourselves
+""".split())
+
+_totals = {"documents": 0, "sentences": 0, "selected": 0, "seconds": 0.0}
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Split text into sentences. Line breaks inside a paragraph are treated as spaces,
+    so text extracted from PDFs keeps its sentences whole.
+    """
+    sentences: List[str] = []
+    for paragraph in _PARAGRAPH.split(text):
+        # Line breaks are gone after this, so they can mark the sentence ends
+        paragraph = _SENTENCE_END.sub("\\1\n", _LINE_BREAK.sub(" ", paragraph).strip())
+        pending = ""
+        for piece in paragraph.split("\n"):
+            pending = f"{pending} {piece}" if pending else piece
+            last = pending[pending.rfind(" ") + 1:].lstrip("(\"'").lower()
+            if last[-1:] != "." or last[:-1] not in ABBREVIATIONS:
+                sentences.append(pending)
+                pending = ""
+        if pending:
+            sentences.append(pending)
+    return [sentence for sentence in sentences if sentence]
+
+
+def _term_matrix(words: List[List[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """
+    Sparse, L2-normalized TF-IDF matrix of the sentences, given their words.
+
+    Returns:
+        tuple: (rows, cols, values) of the nonzero entries ordered by row, and the
+        number of columns.
+    """
+    n = len(words)
+    counts = np.fromiter(map(len, words), dtype=np.int64, count=n)
+    flat = list(chain.from_iterable(words))
+    # Every word is numbered by its first occurrence; the numbering has gaps, which
+    # only leaves empty columns
+    vocabulary: Dict[str, int] = {}
+    ids = np.fromiter(map(vocabulary.setdefault, flat, count()), dtype=np.int64, count=len(flat))
+    size = max(len(flat), 1)
+    stop = np.zeros(size, dtype=bool)
+    stop[[vocabulary[word] for word in STOP_WORDS.intersection(vocabulary)]] = True
+
+    rows = np.repeat(np.arange(n, dtype=np.int64), counts)
+    keep = ~stop[ids]
+    pairs, frequency = np.unique(rows[keep] * size + ids[keep], return_counts=True)
+    rows, cols = pairs // size, pairs % size
+
+    document_frequency = np.bincount(cols, minlength=size)
+    idf = np.log((1 + n) / (1 + document_frequency)) + 1
+    values = (1 + np.log(frequency)) * idf[cols]
+    norms = np.sqrt(np.bincount(rows, values * values, minlength=n))
+    values = values / norms[rows]
+    return rows, cols, values, size
+
+
+def _textrank(rows: np.ndarray, cols: np.ndarray, values: np.ndarray, size: int, n: int) -> np.ndarray:
+    """
+    PageRank over the cosine-similarity graph of the sentences.
+    """
+    self_similarity = np.bincount(rows, values * values, minlength=n)
+
+    def similarity_times(vector: np.ndarray) -> np.ndarray:
+        # S·v with S = X·Xᵀ minus its diagonal (no self loops)
+        projected = np.bincount(cols, values * vector[rows], minlength=size)
+        return np.bincount(rows, values * projected[cols], minlength=n) - self_similarity * vector
+
+    degree = similarity_times(np.ones(n))
+    connected = degree > 1e-12
+    inverse_degree = np.divide(1.0, degree, out=np.zeros(n), where=connected)
+    scores = np.full(n, 1.0 / n)
+    for _ in range(EXTRACTIVE_MAX_ITERATIONS):
+        updated = (1 - EXTRACTIVE_DAMPING) / n + EXTRACTIVE_DAMPING * similarity_times(scores * inverse_degree)
+        converged = np.abs(updated - scores).sum() < TEXTRANK_TOLERANCE
+        scores = updated
+        if converged:
+            break
+    return scores
+
+
+def _centroid(rows: np.ndarray, cols: np.ndarray, values: np.ndarray, size: int, n: int) -> np.ndarray:
+    """
+    Cosine similarity of every sentence to the sum of all sentence vectors.
+    """
+    centroid = np.bincount(cols, values, minlength=size)
+    norm = np.linalg.norm(centroid) or 1.0
+    return np.bincount(rows, values * centroid[cols], minlength=n) / norm
+
+
+def rank_sentences(sentences: List[str], ranking: str = "textrank") -> Tuple[np.ndarray, List[List[str]]]:
+    """
+    Score every sentence (higher is more central to the text).
+
+    Args:
+        sentences (List[str]): Sentences, as returned by `split_sentences`.
+        ranking (str): "textrank" or "tfidf".
+
+    Returns:
+        tuple: The scores and the (lowercased) words of every sentence.
+
+    Raises:
+        ValueError: If the ranking is unknown.
+    """
+    if ranking not in RANKINGS:
+        raise ValueError(f"Unknown extractive ranking: {ranking}; use {', '.join(RANKINGS)}")
+    words = [_WORD.findall(sentence.lower()) for sentence in sentences]
+    rows, cols, values, size = _term_matrix(words)
+    if ranking == "textrank":
+        return _textrank(rows, cols, values, size, len(sentences)), words
+    return _centroid(rows, cols, values, size, len(sentences)), words
+
+
+def extract_summary(
+    text: str,
+    sentences: int = EXTRACTIVE_SENTENCES,
+    max_tokens: Optional[int] = None,
+    ranking: str = "textrank",
+) -> str:
+    """
+    Select the top-ranked sentences of a text, in document order.
+
+    Args:
+        text (str): Text to summarize.
+        sentences (int): Sentences to select, when `max_tokens` is not given.
+        max_tokens (int, optional): Select sentences until about this many tokens
+            instead; the result is newline-separated, for use as LLM input.
+        ranking (str): "textrank" or "tfidf".
+
+    Returns:
+        str: The selected sentences; with `max_tokens`, the text itself when it
+        already fits.
+
+    Raises:
+        ValueError: If the ranking is unknown.
+    """
+    if max_tokens is not None and estimate_tokens(text) <= max_tokens:
+        return text
+    started = time.perf_counter()
+    candidates = split_sentences(text)
+    if not candidates:
+        return text.strip()
+    scores, words = rank_sentences(candidates, ranking)
+
+    lengths = np.fromiter(map(len, candidates), dtype=np.int64, count=len(candidates))
+    tokens = -(-lengths // CHARS_PER_TOKEN)
+    counts = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+    eligible = counts >= EXTRACTIVE_MIN_WORDS
+    if not eligible.any():
+        eligible = counts > 0
+    # Highest score first; ties keep document order
+    order = np.lexsort((np.arange(len(candidates)), -scores))
+
+    selected: List[int] = []
+    seen = set()
+    used = 0
+    for index in order[eligible[order]].tolist():
+        key = tuple(words[index])
+        if key in seen:
+            continue
+        if max_tokens is not None:
+            if selected and used + tokens[index] > max_tokens:
+                continue
+            used += tokens[index]
+        seen.add(key)
+        selected.append(index)
+        if max_tokens is None and len(selected) >= sentences:
+            break
+    selected.sort()
+
+    _totals["documents"] += 1
+    _totals["sentences"] += len(candidates)
+    _totals["selected"] += len(selected)
+    _totals["seconds"] += time.perf_counter() - started
+    separator = "\n" if max_tokens is not None else " "
+    return separator.join(candidates[index] for index in selected)
+
+
+def extractive_stats() -> Dict[str, float]:
+    """
+    Documents summarized, sentences seen and selected, and time spent ranking.
+    """
+    return {**_totals, "seconds": round(_totals["seconds"], 6)}
+
+
+@dataclass(frozen=True)
+class ExtractiveSettings:
+    sentences: int = EXTRACTIVE_SENTENCES
+
+    def __post_init__(self):
+        if self.sentences < 1:
+            raise ValueError("Extractive provider setting 'sentences' must be at least 1.")
+
+
+class ExtractiveChatModel:
+    """
+    Chat model that summarizes the last message extractively; the system prompt is ignored.
+
+    Args:
+        settings (ExtractiveSettings): Summary length.
+        model (str): Ranking, "textrank" or "tfidf".
+
+    Raises:
+        ValueError: If the ranking is unknown.
+    """
+
+    def __init__(self, settings: ExtractiveSettings, model: str = "textrank"):
+        ranking = (model or "textrank").lower()
+        if ranking not in RANKINGS:
+            raise ValueError(f"Unknown extractive model: {model}; use {', '.join(RANKINGS)}")
+        self.settings = settings
+        self.model = ranking
+
+    async def _summarize(self, messages: List[BaseMessage]) -> str:
+        text = str(messages[-1].content) if messages else ""
+        if len(text) > THREAD_MIN_CHARS:
+            return await asyncio.to_thread(extract_summary, text, self.settings.sentences, None, self.model)
+        return extract_summary(text, self.settings.sentences, None, self.model)
+
+    async def ainvoke(self, messages: List[BaseMessage], **kwargs) -> AIMessage:
+        return AIMessage(content=await self._summarize(messages))
+
+    async def astream(self, messages: List[BaseMessage], **kwargs) -> AsyncIterator[AIMessageChunk]:
+        summary = await self._summarize(messages)
+        for i, word in enumerate(summary.split(" ") if summary else []):
+            yield AIMessageChunk(content=f" {word}" if i else word)
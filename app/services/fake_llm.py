@@ -0,0 +1,142 @@
+"""
+Fake LLM Provider Module
+
+This module provides a stand-in chat model for benchmarks and offline development,
+selected with `provider: "fake"`. It never calls the network: replies are built from
+the request text and delivered after a simulated latency, token by token when
+streamed, and a configurable share of calls fail.
+
+Features:
+- Simulated time to first token and generation speed (tokens per second)
+- Random provider errors, rate limits (429 with Retry-After) and timeouts at
+  configurable rates
+- Usage metadata (prompt/completion tokens) like real providers, so metrics work
+
+The provider is disabled unless ENABLE_FAKE_PROVIDER is set, so it cannot be used
+on a public deployment to fill history with fake summaries or to hold admission
+slots with simulated hangs. The load test (benchmarks/load_test.py) enables it.
+
+Configuration:
+    ENABLE_FAKE_PROVIDER: Accept `provider: "fake"` ("true"/"1"; default disabled).
+
+    Per request, as query parameters of `api_url`, e.g.
+    "fake://?latency_ms=50&tokens_per_second=400&error_rate=0.01", or globally with
+    environment variables (query parameters take precedence):
+
+    FAKE_LLM_LATENCY_MS: Time to the first token in milliseconds (default 300).
+    FAKE_LLM_TOKENS_PER_SECOND: Generation speed after the first token (default 200).
+    FAKE_LLM_REPLY_WORDS: Words per reply (default 60).
+    FAKE_LLM_ERROR_RATE: Share of calls failing with a provider error (default 0).
+    FAKE_LLM_TIMEOUT_RATE: Share of calls that hang until cancelled (default 0).
+    FAKE_LLM_RATE_LIMIT_RATE: Share of calls rejected with a rate limit (default 0).
+    FAKE_LLM_RETRY_AFTER: Retry-After of simulated rate limits in seconds (default 1).
+
+Usage:
+    {"provider": "fake", "model": "fake", "api_key": "-", "api_url": "fake://?latency_ms=100", "text": "..."}
+"""
+
+import asyncio
+import os
+import random
+from dataclasses import dataclass
+from typing import AsyncIterator, List
+from langchain.schema import BaseMessage
+from langchain_core.messages import AIMessage, AIMessageChunk
+from app.utils.tokens import estimate_tokens
+
+ENABLE_FAKE_PROVIDER = os.getenv("ENABLE_FAKE_PROVIDER", "").lower() in ("1", "true", "yes")
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "200"))
+FAKE_LLM_REPLY_WORDS = int(os.getenv("FAKE_LLM_REPLY_WORDS", "60"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_TIMEOUT_RATE = float(os.getenv("FAKE_LLM_TIMEOUT_RATE", "0"))
+FAKE_LLM_RATE_LIMIT_RATE = float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0"))
+FAKE_LLM_RETRY_AFTER = float(os.getenv("FAKE_LLM_RETRY_AFTER", "1"))
+
+
+class FakeProviderError(Exception):
+    """
+    Simulated provider failure (e.g. an upstream 500).
+    """
+
+
+class FakeRateLimitError(FakeProviderError):
+    """
+    Simulated rate limit, shaped like the provider SDKs' errors (429 and Retry-After).
+    """
+
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__("Simulated rate limit")
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class FakeSettings:
+    latency_ms: float = FAKE_LLM_LATENCY_MS
+    tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND
+    reply_words: int = FAKE_LLM_REPLY_WORDS
+    error_rate: float = FAKE_LLM_ERROR_RATE
+    timeout_rate: float = FAKE_LLM_TIMEOUT_RATE
+    rate_limit_rate: float = FAKE_LLM_RATE_LIMIT_RATE
+    retry_after: float = FAKE_LLM_RETRY_AFTER
+
+
+class FakeChatModel:
+    """
+    Chat model that simulates a provider.
+
+    Args:
+        settings (FakeSettings): Latency, speed and failure settings.
+        model (str): Model name reported in responses.
+    """
+
+    def __init__(self, settings: FakeSettings, model: str = "fake"):
+        self.settings = settings
+        self.model = model
+
+    def _reply(self, messages: List[BaseMessage]) -> List[str]:
+        # Echo the beginning of the last message, so replies differ per input
+        text = str(messages[-1].content) if messages else ""
+        words = text.split()[: self.settings.reply_words] or ["(empty)"]
+        return [f"{word} " for word in words]
+
+    async def _start(self):
+        """
+        Wait for the first token, failing the call at the configured rates.
+        """
+        roll = random.random()
+        if roll < self.settings.rate_limit_rate:
+            # Rejected up front, like a provider enforcing its quota
+            raise FakeRateLimitError(self.settings.retry_after)
+        roll -= self.settings.rate_limit_rate
+        if roll < self.settings.timeout_rate:
+            # Hang like an unresponsive provider; the caller's deadline ends the call
+            await asyncio.Event().wait()
+        await asyncio.sleep(self.settings.latency_ms / 1000)
+        if roll < self.settings.timeout_rate + self.settings.error_rate:
+            raise FakeProviderError("Simulated provider error")
+
+    def _usage(self, messages: List[BaseMessage], reply: List[str]) -> dict:
+        prompt = sum(estimate_tokens(str(message.content)) for message in messages)
+        completion = estimate_tokens("".join(reply))
+        return {"input_tokens": prompt, "output_tokens": completion, "total_tokens": prompt + completion}
+
+    async def ainvoke(self, messages: List[BaseMessage], **kwargs) -> AIMessage:
+        await self._start()
+        reply = self._reply(messages)
+        if self.settings.tokens_per_second > 0:
+            await asyncio.sleep(len(reply) / self.settings.tokens_per_second)
+        return AIMessage(content="".join(reply).strip(), usage_metadata=self._usage(messages, reply))
+
+    async def astream(self, messages: List[BaseMessage], **kwargs) -> AsyncIterator[AIMessageChunk]:
+        await self._start()
+        reply = self._reply(messages)
+        delay = 1 / self.settings.tokens_per_second if self.settings.tokens_per_second > 0 else 0
+        for i, word in enumerate(reply):
+            if i and delay:
+                await asyncio.sleep(delay)
+            yield AIMessageChunk(content=word)
+        # Usage arrives on a final empty chunk, as with OpenAI's stream_usage
+        yield AIMessageChunk(content="", usage_metadata=self._usage(messages, reply))
@@ -0,0 +1,325 @@
+"""
+History Search Module
+
+This module provides full-text search over a visitor's summary history.
+
+Features:
+- BM25 ranking over an inverted index of `summary_text` and `input_text`
+- One index per visitor, so a query only touches that visitor's postings and its
+  cost does not grow with the size of the collection
+- Compact storage: terms are interned to integer ids shared by all visitors, and
+  postings are `array` buffers of row numbers (4 bytes) and term frequencies
+  (1 byte, saturating at 255, where BM25 is flat anyway) scored with vectorized NumPy
+- Maintained incrementally: records are added when summaries are saved and
+  removed when they are deleted or archived; removed rows are tombstoned and
+  compacted once they outnumber the live ones
+- Rebuildable from the `summaries` collection at startup
+
+Summary terms count twice, so documents whose summary mentions the query rank above
+documents that only mention it in their input. Only the first `SEARCH_INPUT_CHARS`
+characters of each input are indexed, which bounds memory for very long documents.
+
+Configuration (environment variables):
+    SEARCH_INPUT_CHARS: Characters of each input text indexed (default 5000).
+    SEARCH_BM25_K1: BM25 term-frequency saturation (default 1.2).
+    SEARCH_BM25_B: BM25 length normalization (default 0.75).
+
+Usage:
+    await history_index.add_records([record])
+    total, hits = history_index.search(visitor_id, "quarterly revenue", limit=10, offset=0)
+    history_index.remove(visitor_id, [summary_id])
+"""
+
+import asyncio
+import logging
+import math
+import os
+import re
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Tuple
+import numpy as np
+from app.utils.text_compression import decompress_text
+
+SEARCH_INPUT_CHARS = int(os.getenv("SEARCH_INPUT_CHARS", "5000"))
+SEARCH_BM25_K1 = float(os.getenv("SEARCH_BM25_K1", "1.2"))
+SEARCH_BM25_B = float(os.getenv("SEARCH_BM25_B", "0.75"))
+
+SUMMARY_WEIGHT = 2
+MAX_TERM_LENGTH = 40
+
+# Records whose text exceeds this are tokenized in a worker thread
+_INLINE_TOKENIZE_CHARS = 32 * 1024
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i in is it its of on or "
+    "our she that the their them they this to was we were will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens of a text, without stopwords.
+    """
+    return [
+        token for token in _TOKEN_RE.findall(text.lower())
+        if token not in STOPWORDS and len(token) <= MAX_TERM_LENGTH
+    ]
+
+
+def term_counts(summary_text: str, input_text: str) -> Counter:
+    """
+    Weighted term frequencies of one record.
+    """
+    counts = Counter(tokenize((input_text or "")[:SEARCH_INPUT_CHARS]))
+    for token in tokenize(summary_text or ""):
+        counts[token] += SUMMARY_WEIGHT
+    return counts
+
+
+class _VisitorIndex:
+    """
+    Inverted index of one visitor's records.
+    """
+
+    __slots__ = ("ids", "rows", "lengths", "alive", "postings", "live", "total_length")
+
+    def __init__(self):
+        self.ids: List[Any] = []
+        self.rows: Dict[Any, int] = {}
+        self.lengths = array("I")
+        self.alive = bytearray()
+        self.postings: Dict[int, Tuple[array, array]] = {}
+        self.live = 0
+        self.total_length = 0
+
+    def add(self, summary_id, counts: Dict[int, int]):
+        if summary_id in self.rows:
+            return
+        row = len(self.ids)
+        self.ids.append(summary_id)
+        self.rows[summary_id] = row
+        length = sum(counts.values())
+        self.lengths.append(length)
+        self.alive.append(1)
+        self.live += 1
+        self.total_length += length
+        for term, tf in counts.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array("I"), array("B"))
+            posting[0].append(row)
+            posting[1].append(min(tf, 0xFF))
+
+    def remove(self, summary_id) -> bool:
+        row = self.rows.pop(summary_id, None)
+        if row is None:
+            return False
+        self.alive[row] = 0
+        self.live -= 1
+        self.total_length -= self.lengths[row]
+        if len(self.ids) - self.live > max(self.live, 64):
+            self._compact()
+        return True
+
+    def _compact(self):
+        """
+        Drop tombstoned rows and renumber the rest.
+        """
+        alive = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+        remap = np.cumsum(alive, dtype=np.int64) - 1
+        postings = {}
+        for term, (rows, tfs) in self.postings.items():
+            rows_np = np.frombuffer(rows, dtype=np.uint32)
+            keep = alive[rows_np]
+            if keep.any():
+                postings[term] = (
+                    array("I", remap[rows_np[keep]].astype(np.uint32).tobytes()),
+                    array("B", np.frombuffer(tfs, dtype=np.uint8)[keep].tobytes()),
+                )
+        lengths = np.frombuffer(self.lengths, dtype=np.uint32)[alive]
+        self.ids = [summary_id for summary_id, keep in zip(self.ids, alive) if keep]
+        self.rows = {summary_id: row for row, summary_id in enumerate(self.ids)}
+        self.lengths = array("I", lengths.tobytes())
+        self.alive = bytearray(b"\x01" * len(self.ids))
+        self.postings = postings
+
+    def score(self, terms: Iterable[int], k1: float, b: float) -> np.ndarray:
+        """
+        BM25 scores of every row (0 for rows without a query term).
+        """
+        size = len(self.ids)
+        scores = np.zeros(size, dtype=np.float32)
+        if not self.live:
+            return scores
+        lengths = np.frombuffer(self.lengths, dtype=np.uint32).astype(np.float32)
+        norm = k1 * (1 - b + b * lengths / (self.total_length / self.live))
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            rows = np.frombuffer(posting[0], dtype=np.uint32)
+            tfs = np.frombuffer(posting[1], dtype=np.uint8).astype(np.float32)
+            # Document frequency counts tombstoned rows too until compaction; close enough for ranking
+            df = min(len(rows), self.live)
+            idf = math.log(1 + (self.live - df + 0.5) / (df + 0.5))
+            scores[rows] += idf * tfs * (k1 + 1) / (tfs + norm[rows])
+        scores *= np.frombuffer(self.alive, dtype=np.uint8)
+        return scores
+
+    def nbytes(self) -> int:
+        postings = sum(rows.itemsize * len(rows) + tfs.itemsize * len(tfs) for rows, tfs in self.postings.values())
+        return postings + self.lengths.itemsize * len(self.lengths) + len(self.alive)
+
+
+class HistorySearchIndex:
+    """
+    Per-visitor BM25 index over summary records.
+
+    Args:
+        k1 (float): BM25 term-frequency saturation.
+        b (float): BM25 length normalization.
+    """
+
+    def __init__(self, k1: float = SEARCH_BM25_K1, b: float = SEARCH_BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._vocab: Dict[str, int] = {}
+        self._visitors: Dict[str, _VisitorIndex] = {}
+        self.queries = 0
+
+    def __len__(self) -> int:
+        return sum(index.live for index in self._visitors.values())
+
+    def _intern(self, counts: Counter) -> Dict[int, int]:
+        vocab = self._vocab
+        interned = {}
+        for term, tf in counts.items():
+            term_id = vocab.get(term)
+            if term_id is None:
+                term_id = vocab[term] = len(vocab)
+            interned[term_id] = tf
+        return interned
+
+    async def add_records(self, records: List[Dict[str, Any]]):
+        """
+        Index summary records (with plain or stored texts). Already indexed ids are skipped.
+        """
+        records = [record for record in records if record.get("visitor_id")]
+        if not records:
+            return
+
+        def count_all():
+            return [
+                term_counts(decompress_text(record.get("summary_text")), decompress_text(record.get("input_text")))
+                for record in records
+            ]
+
+        size = sum(
+            min(len(record.get("input_text") or ""), SEARCH_INPUT_CHARS) + len(record.get("summary_text") or "")
+            for record in records
+        )
+        counts = await asyncio.to_thread(count_all) if size > _INLINE_TOKENIZE_CHARS else count_all()
+        for record, record_counts in zip(records, counts):
+            index = self._visitors.get(record["visitor_id"])
+            if index is None:
+                index = self._visitors[record["visitor_id"]] = _VisitorIndex()
+            index.add(record["_id"], self._intern(record_counts))
+
+    def remove(self, visitor_id: str, summary_ids: Iterable[Any]):
+        """
+        Remove records of a visitor from the index.
+        """
+        index = self._visitors.get(visitor_id)
+        if index is None:
+            return
+        for summary_id in summary_ids:
+            index.remove(summary_id)
+        if not index.live:
+            del self._visitors[visitor_id]
+
+    def drop_visitor(self, visitor_id: str):
+        """
+        Remove every record of a visitor.
+        """
+        self._visitors.pop(visitor_id, None)
+
+    def clear(self):
+        """
+        Drop every indexed record.
+        """
+        self._visitors = {}
+        self._vocab = {}
+
+    def search(self, visitor_id: str, query: str, limit: int, offset: int = 0) -> Tuple[int, List[Tuple[Any, float]]]:
+        """
+        Rank a visitor's records against a query.
+
+        Args:
+            visitor_id (str): Visitor whose history is searched.
+            query (str): Free-text query.
+            limit (int): Results to return.
+            offset (int): Results to skip (pagination).
+
+        Returns:
+            tuple: (number of matching records, [(summary id, score), ...] best first).
+        """
+        self.queries += 1
+        index = self._visitors.get(visitor_id)
+        terms = {self._vocab[token] for token in tokenize(query) if token in self._vocab}
+        if index is None or not terms:
+            return 0, []
+        scores = index.score(terms, self.k1, self.b)
+        matches = np.flatnonzero(scores > 0)
+        total = len(matches)
+        end = min(offset + limit, total)
+        if offset >= end:
+            return total, []
+        if end < total:
+            # Only the top `end` need sorting
+            matches = matches[np.argpartition(-scores[matches], end - 1)[:end]]
+        ranked = matches[np.argsort(-scores[matches], kind="stable")][offset:end]
+        return total, [(index.ids[row], float(scores[row])) for row in ranked]
+
+    async def rebuild(self, db, batch_size: int = 500):
+        """
+        Rebuild the index from the `summaries` collection.
+
+        Records saved while the rebuild runs are indexed by the save path as usual.
+
+        Args:
+            db: MongoDB async database.
+            batch_size (int): Records tokenized per worker-thread batch.
+        """
+        self.clear()
+        cursor = db.summaries.find({}, {"visitor_id": 1, "summary_text": 1, "input_text": 1})
+        batch = []
+        try:
+            async for doc in cursor:
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    await self.add_records(batch)
+                    batch = []
+            if batch:
+                await self.add_records(batch)
+        except Exception as e:
+            logging.warning(f"History search index rebuild stopped early: {e}")
+        logging.info(f"History search index rebuilt with {len(self)} records")
+
+    def stats(self) -> dict:
+        """
+        Index size, memory footprint of the postings and query count.
+        """
+        return {
+            "records": len(self),
+            "visitors": len(self._visitors),
+            "terms": len(self._vocab),
+            "bytes": sum(index.nbytes() for index in self._visitors.values()),
+            "queries": self.queries,
+        }
+
+
+# Shared history search index
+history_index = HistorySearchIndex()
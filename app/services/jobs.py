@@ -0,0 +1,369 @@
+"""
+Summarization Job Queue Module
+
+This module runs summarization as background jobs, so clients with large inputs
+get a job id immediately instead of holding an HTTP request open past proxy
+timeouts.
+
+Features:
+- In-process pool of workers draining a priority queue (higher priority first,
+  then oldest first)
+- Job state is persisted in the `jobs` Mongo collection; queued jobs are reloaded
+  at startup, so work survives a restart
+- Jobs are claimed atomically (`queued` -> `running`), so replicas sharing the
+  collection never run the same job twice
+- Running jobs write a heartbeat; jobs whose worker died (no heartbeat for three
+  intervals) are re-queued by a periodic sweep on every replica, which also picks up
+  jobs left queued by a replica that went away; jobs interrupted by a clean
+  shutdown are re-queued immediately
+- The provider API keys (including fallbacks) are kept only while the job is pending
+  and removed once it finishes; finished jobs expire through a TTL index
+- Completed jobs go through the same summary cache and `summaries` persistence as
+  POST /api/summarize
+- Subscribers are woken on state changes in this process, and poll for jobs run
+  by other replicas
+- Tracks queue length, queue wait times and worker utilization
+
+Configuration (environment variables):
+    JOB_WORKERS: Number of job workers (default 2).
+    JOB_QUEUE_MAX: Queued jobs accepted before rejecting with 429 (default 1000).
+    JOB_RESULT_TTL: Seconds a finished job is kept (default 7 days).
+    JOB_HEARTBEAT: Seconds between heartbeats of a running job (default 15).
+    JOB_POLL_INTERVAL: Seconds between status checks of a watched job (default 2).
+
+Usage:
+    await job_queue.start(db)          # at startup
+    view = await job_queue.submit(db, visitor_id, job_request)
+    view = await job_queue.get(db, view["job_id"], visitor_id)
+    async for view in job_queue.watch(db, job_id, visitor_id):
+        ...
+    await job_queue.stop()             # at shutdown
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from app.schemas.models import SummarizeJobRequest, SummarizeRequest
+from app.services.summarize import ProviderTrace, summarize_with_langchain
+from app.services.summary_reuse import find_reusable_summary, remember_summary
+from app.services.summary_store import build_summary_record, save_summary
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "1000"))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", str(7 * 24 * 3600)))
+JOB_HEARTBEAT = float(os.getenv("JOB_HEARTBEAT", "15"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+
+TERMINAL_STATES = ("completed", "failed")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _object_id(job_id: str) -> Optional[ObjectId]:
+    try:
+        return ObjectId(job_id)
+    except (InvalidId, TypeError):
+        return None
+
+
+def job_view(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Public representation of a job document (never includes the request or API key).
+    """
+    return {
+        "job_id": str(doc["_id"]),
+        "status": doc["status"],
+        "priority": doc.get("priority", 0),
+        "attempts": doc.get("attempts", 0),
+        "created_at": doc.get("created_at"),
+        "started_at": doc.get("started_at"),
+        "finished_at": doc.get("finished_at"),
+        "summary": doc.get("summary"),
+        "cached": doc.get("cache") is not None,
+        "cache": doc.get("cache"),
+        "error": doc.get("error"),
+    }
+
+
+class JobQueue:
+    """
+    Priority queue of summarization jobs drained by an in-process worker pool.
+
+    Args:
+        workers (int): Number of worker tasks.
+        max_queue (int): Queued jobs accepted before `submit` rejects with 429.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queue: int = JOB_QUEUE_MAX):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.db = None
+        self._queue: "asyncio.PriorityQueue" = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[ObjectId, float] = {}
+        self._changed: Dict[ObjectId, asyncio.Event] = {}
+        self._watchers: Dict[ObjectId, int] = {}
+        # Jobs in this process's queue, so the sweep does not queue them twice
+        self._queued: Set[ObjectId] = set()
+        self._waits: deque = deque(maxlen=1000)
+        self._busy_time = 0.0
+        self._started = time.monotonic()
+        self.completed = 0
+        self.failed = 0
+        self.recovered = 0
+
+    async def ensure_indexes(self, db):
+        """
+        Create the indexes used for recovery and the TTL index on finished jobs.
+        """
+        await db.jobs.create_index([("status", 1), ("heartbeat_at", 1)])
+        await db.jobs.create_index("finished_at", expireAfterSeconds=JOB_RESULT_TTL)
+
+    def _enqueue(self, doc: Dict[str, Any]):
+        if doc["_id"] in self._queued:
+            return
+        self._queued.add(doc["_id"])
+        self._queue.put_nowait((-doc.get("priority", 0), next(self._seq), doc["_id"]))
+
+    def _notify(self, job_id: ObjectId):
+        event = self._changed.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def start(self, db):
+        """
+        Re-queue interrupted jobs, load pending ones and start the workers and the sweep.
+        """
+        self.db = db
+        self._started = time.monotonic()
+        await self._recover(queued_before=None)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweep()))
+
+    async def _recover(self, queued_before: Optional[datetime]):
+        """
+        Re-queue running jobs whose heartbeat stopped and queue pending jobs this
+        process does not know about yet (all of them, or those created before
+        `queued_before`).
+        """
+        stale = _now() - timedelta(seconds=3 * JOB_HEARTBEAT)
+        result = await self.db.jobs.update_many(
+            {"status": "running", "heartbeat_at": {"$lt": stale}},
+            {"$set": {"status": "queued"}},
+        )
+        if result.modified_count:
+            logging.warning(f"Re-queued {result.modified_count} jobs whose worker stopped sending heartbeats")
+            self.recovered += result.modified_count
+        query: Dict[str, Any] = {"status": "queued"}
+        if queued_before is not None:
+            # Newer jobs are still in the queue of the replica that accepted them
+            query["created_at"] = {"$lt": queued_before}
+        async for doc in self.db.jobs.find(query, {"priority": 1}).sort("created_at", 1):
+            self._enqueue(doc)
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT)
+            try:
+                await self._recover(queued_before=_now() - timedelta(seconds=3 * JOB_HEARTBEAT))
+            except Exception as e:
+                logging.warning(f"Job recovery sweep failed: {e}")
+
+    async def stop(self):
+        """
+        Stop the workers and hand their unfinished jobs back to the queue.
+        """
+        interrupted = list(self._running)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if interrupted:
+            await self.db.jobs.update_many(
+                {"_id": {"$in": interrupted}, "status": "running"},
+                {"$set": {"status": "queued"}},
+            )
+
+    async def submit(self, db, visitor_id: str, job: SummarizeJobRequest) -> Dict[str, Any]:
+        """
+        Persist a new job and queue it.
+
+        Args:
+            db: MongoDB async database.
+            visitor_id (str): Visitor the job and its summary belong to.
+            job (SummarizeJobRequest): Summarization request and priority.
+
+        Returns:
+            dict: Public view of the queued job.
+
+        Raises:
+            HTTPException: 429 if the queue is full.
+        """
+        if self._queue.qsize() >= self.max_queue:
+            raise HTTPException(status_code=429, detail="Job queue is full, retry later.")
+        doc = {
+            "visitor_id": visitor_id,
+            "status": "queued",
+            "priority": job.priority,
+            "attempts": 0,
+            # Kept until the job finishes so it can be resumed after a restart
+            "request": job.model_dump(exclude={"priority"}),
+            "created_at": _now(),
+        }
+        await db.jobs.insert_one(doc)
+        self._enqueue(doc)
+        return job_view(doc)
+
+    async def _find(self, db, job_id: str, visitor_id: str) -> Optional[Dict[str, Any]]:
+        oid = _object_id(job_id)
+        if oid is None:
+            return None
+        return await db.jobs.find_one({"_id": oid, "visitor_id": visitor_id}, {"request": 0})
+
+    async def get(self, db, job_id: str, visitor_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Public view of a visitor's job, or None if it does not exist.
+        """
+        doc = await self._find(db, job_id, visitor_id)
+        return job_view(doc) if doc is not None else None
+
+    async def watch(self, db, job_id: str, visitor_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield the job's view on every status change until it finishes.
+        Yields nothing if the job does not exist.
+        """
+        oid = _object_id(job_id)
+        if oid is None:
+            return
+        last = None
+        self._watchers[oid] = self._watchers.get(oid, 0) + 1
+        try:
+            while True:
+                event = self._changed.setdefault(oid, asyncio.Event())
+                doc = await self._find(db, job_id, visitor_id)
+                if doc is None:
+                    return
+                if doc["status"] != last:
+                    last = doc["status"]
+                    yield job_view(doc)
+                if last in TERMINAL_STATES:
+                    return
+                try:
+                    # Woken by this process; jobs run by other replicas are picked up by polling
+                    await asyncio.wait_for(event.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._watchers[oid] -= 1
+            if not self._watchers[oid]:
+                del self._watchers[oid]
+                self._changed.pop(oid, None)
+
+    async def _heartbeat(self, job_id: ObjectId):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT)
+            try:
+                await self.db.jobs.update_one({"_id": job_id, "status": "running"}, {"$set": {"heartbeat_at": _now()}})
+            except Exception as e:
+                logging.warning(f"Job heartbeat failed: {e}")
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                await self._claim_and_run(job_id)
+            except Exception as e:
+                logging.error(f"Job worker error: {e}")
+
+    async def _claim_and_run(self, job_id: ObjectId):
+        now = _now()
+        doc = await self.db.jobs.find_one_and_update(
+            {"_id": job_id, "status": "queued"},
+            {"$set": {"status": "running", "started_at": now, "heartbeat_at": now}, "$inc": {"attempts": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            # Claimed by another replica, or already finished
+            return
+        self._waits.append((doc["started_at"] - doc["created_at"]).total_seconds())
+        self._running[job_id] = time.monotonic()
+        self._notify(job_id)
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            update = await self._run(doc)
+            await self.db.jobs.update_one({"_id": job_id}, update)
+        finally:
+            heartbeat.cancel()
+            started = self._running.pop(job_id, None)
+            if started is not None:
+                self._busy_time += time.monotonic() - started
+            self._notify(job_id)
+
+    async def _run(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Summarize a claimed job and return the update recording its outcome.
+        """
+        finished: Dict[str, Any] = {}
+        try:
+            data = SummarizeRequest(**doc["request"])
+            lookup = await find_reusable_summary(self.db, data)
+            summary_text = lookup.summary
+            trace = ProviderTrace()
+            if summary_text is None:
+                summary_text = await summarize_with_langchain(data, trace=trace)
+            record = build_summary_record(doc["visitor_id"], data, summary_text)
+            await save_summary(self.db, record)
+            if lookup.summary is None and not trace.fallback:
+                await remember_summary(self.db, data, lookup, summary_text, record["_id"])
+            self.completed += 1
+            finished.update(status="completed", summary=summary_text, cache=lookup.source, summary_id=record["_id"])
+        except HTTPException as e:
+            self.failed += 1
+            finished.update(status="failed", error={"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logging.error(f"Job {doc['_id']} failed: {e}")
+            self.failed += 1
+            finished.update(status="failed", error={"status_code": 500, "detail": "Failed to summarize the document."})
+        finished["finished_at"] = _now()
+        return {"$set": finished, "$unset": {"request.api_key": "", "request.fallbacks": ""}}
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Queue length, wait times of recently started jobs and worker utilization.
+        """
+        now = time.monotonic()
+        busy_time = self._busy_time + sum(now - started for started in self._running.values())
+        capacity = max(now - self._started, 1e-9) * max(self.workers, 1)
+        waits = sorted(self._waits)
+        return {
+            "workers": self.workers,
+            "busy_workers": len(self._running),
+            "queued": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "utilization": round(busy_time / capacity, 4),
+            "wait_seconds": {
+                "avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "p95": round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+                "max": round(waits[-1], 3) if waits else 0.0,
+            },
+            "completed": self.completed,
+            "failed": self.failed,
+            "recovered": self.recovered,
+        }
+
+
+# Shared job queue
+job_queue = JobQueue()
@@ -1,51 +1,322 @@
 """
-AI Summarization Module using LangChain wrappers for multiple LLM providers.
+LLM Provider Module using LangChain wrappers for multiple LLM providers.
 
-This module provides an asynchronous function to generate text summaries
-using different large language model providers via LangChain abstractions.
+This module builds LangChain-compatible chat model instances for the
+different large language model providers and keeps them in a pooled,
+reusable client registry so repeated requests skip client construction,
+TLS handshakes and connection setup.
 
 Supported providers:
 - OpenAI
 - Azure OpenAI
 - Anthropic
 - Gemini (Google Generative AI)
+- Fake (simulated provider for benchmarks and offline development, only when
+  ENABLE_FAKE_PROVIDER is set; see app.services.fake_llm)
+- Extractive (in-process sentence selection, no network; see app.services.extractive)
 
-The function `summarize_with_langchain` accepts a `SummarizeRequest` data
-model containing text, prompt, provider info, API keys, and model parameters.
-It validates input and returns the summarized text from the chosen provider.
+The in-process providers read their settings from the query string of `api_url`
+and expose the same `ainvoke`/`astream` interface as the LangChain chat models, so
+admission, routing, caching and metrics treat them like any other provider.
 
-Errors in provider selection or API calls raise HTTPException with details.
+Client registry:
+- Models are cached by (provider, model, api_url, api_version, hashed api_key, temperature)
+- Entries are evicted LRU beyond `LLM_CLIENT_CACHE_SIZE` or after `LLM_CLIENT_IDLE_TTL`
+  seconds without use; evicted models have their own clients closed once no call
+  leased through `llm_client()` is still using them
+- OpenAI, Azure OpenAI and Anthropic models share one keep-alive httpx pool per
+  provider host; Gemini models keep their own gRPC channel for the entry lifetime
+- `close_llm_clients()` closes every cached model and pool at app shutdown
+- Models are built with `max_retries=0`: rate limits and retries are handled by
+  app.services.rate_limiter, not hidden inside the SDKs
 
-Logging is included for debugging message formatting and errors.
+Configuration (environment variables):
+    LLM_CLIENT_CACHE_SIZE: Maximum number of cached model instances (default 64).
+    LLM_CLIENT_IDLE_TTL: Seconds an unused model stays cached (default 600).
+    LLM_POOL_MAX_CONNECTIONS: Connections per provider host pool (default 100).
+    LLM_POOL_MAX_KEEPALIVE: Idle keep-alive connections per pool (default 20).
+    LLM_POOL_KEEPALIVE_EXPIRY: Seconds an idle connection is kept open (default 60).
+    LLM_HTTP_TIMEOUT: Per-request HTTP timeout in seconds (default 600).
+
+Errors in provider selection raise HTTPException with details.
 
 Usage:
-    response_text = await summarize_with_langchain(data)
+    async with llm_client(data) as llm:
+        response = await llm.ainvoke(messages)
 """
 
+import asyncio
+import hashlib
+import inspect
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Set, Tuple
+from urllib.parse import parse_qsl, urlparse
 
+import anthropic
+import httpx
 from langchain_openai import ChatOpenAI, AzureChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_google_genai import ChatGoogleGenerativeAI
 from fastapi import HTTPException
+from app.services.extractive import ExtractiveChatModel, ExtractiveSettings
+from app.services.fake_llm import ENABLE_FAKE_PROVIDER, FakeChatModel, FakeSettings
 
-def llm_provider(data):
+LLM_CLIENT_CACHE_SIZE = int(os.getenv("LLM_CLIENT_CACHE_SIZE", "64"))
+LLM_CLIENT_IDLE_TTL = float(os.getenv("LLM_CLIENT_IDLE_TTL", "600"))
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "100"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20"))
+LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "60"))
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "600"))
+
+DEFAULT_HOSTS = {
+    "openai": "api.openai.com",
+    "anthropic": "api.anthropic.com",
+}
+
+# Attributes that may hold provider SDK clients owned by a model instance
+_OWNED_CLIENT_ATTRS = ("_async_client", "_client", "async_client_running", "client")
+
+
+def _host_for(provider: str, api_url: str) -> str:
+    """
+    Resolve the host a provider request will be sent to.
+    """
+    if api_url and provider in ("azure", "azureopenai"):
+        return urlparse(api_url).netloc or api_url
+    return DEFAULT_HOSTS.get(provider, provider)
+
+
+class ConnectionPools:
+    """
+    Shared keep-alive httpx connection pools, one per provider host.
+    """
+
+    def __init__(self):
+        self._pools: Dict[Tuple[str, str], httpx.AsyncClient] = {}
+
+    def get(self, provider: str, api_url: str) -> httpx.AsyncClient:
+        """
+        Return the pooled async HTTP client for a provider host, creating it on first use.
+        """
+        key = (provider, _host_for(provider, api_url))
+        pool = self._pools.get(key)
+        if pool is None or pool.is_closed:
+            pool = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+                    keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(LLM_HTTP_TIMEOUT, connect=10.0),
+                follow_redirects=True,
+            )
+            self._pools[key] = pool
+        return pool
+
+    async def close(self):
+        """
+        Close every pooled HTTP client.
+        """
+        pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            await pool.aclose()
+
+    def __len__(self) -> int:
+        return len(self._pools)
+
+
+async def _close_model(llm: Any):
     """
-    Initialize a LangChain-compatible chat model instance based on the AI provider.
+    Best-effort close of SDK clients created by (and private to) a model instance.
+
+    Only attributes already materialized on the instance are inspected, so closing
+    never triggers lazy client construction.
+    """
+    for attr in _OWNED_CLIENT_ATTRS:
+        client = llm.__dict__.get(attr)
+        if client is None:
+            continue
+        closer = getattr(client, "aclose", None) or getattr(client, "close", None)
+        if closer is None:
+            transport = getattr(client, "transport", None)
+            closer = getattr(transport, "close", None)
+        if closer is None:
+            continue
+        try:
+            result = closer()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logging.warning(f"Failed to close {attr} of {type(llm).__name__}: {e}")
+
+
+class ClientRegistry:
+    """
+    LRU + idle-TTL cache of LangChain chat model instances.
 
     Args:
-        data (SummarizeRequest or ChatRequest): An object containing the following fields:
-            - provider (str): Name of the provider ("openai", "azureopenai", "anthropic", or "gemini").
-            - model (str): Model name or deployment ID (for Azure).
-            - api_key (str): API key for authentication.
-            - api_url (str, optional): Base API URL (used by Azure OpenAI).
-            - api_version (str, optional): API version for Azure OpenAI (default "2025-01-01").
-            - temperature (float): Sampling temperature for model response diversity.
+        max_size (int): Maximum number of cached models.
+        idle_ttl (float): Seconds a model may stay unused before it is evicted.
+    """
 
-    Returns:
-        BaseChatModel: An instance of a LangChain-compatible chat model.
+    def __init__(self, max_size: int = LLM_CLIENT_CACHE_SIZE, idle_ttl: float = LLM_CLIENT_IDLE_TTL):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.pools = ConnectionPools()
+        # key -> (model, owns_clients, last_used)
+        self._entries: "OrderedDict[Tuple, Tuple[Any, bool, float]]" = OrderedDict()
+        self._closing: Set[asyncio.Task] = set()
+        # id(model) -> calls currently using it, and evicted models waiting for their last call
+        self._in_use: Dict[int, int] = {}
+        self._retired: Dict[int, Any] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(data) -> Tuple:
+        """
+        Cache key for a request's provider configuration. The API key is hashed so
+        raw credentials are never kept as dictionary keys.
+        """
+        return (
+            data.provider.lower(),
+            data.model,
+            getattr(data, "api_url", "") or "",
+            getattr(data, "api_version", "") or "",
+            hashlib.sha256((data.api_key or "").encode("utf-8")).hexdigest(),
+            data.temperature,
+        )
+
+    def get(self, data) -> Any:
+        """
+        Return a cached model for the request configuration, building it on a miss.
+        """
+        now = time.monotonic()
+        self._expire(now)
+
+        key = self.key_for(data)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries[key] = (entry[0], entry[1], now)
+            self._entries.move_to_end(key)
+            return entry[0]
+
+        self.misses += 1
+        llm, owns_clients = _build_model(data, self.pools)
+        self._entries[key] = (llm, owns_clients, now)
+        while len(self._entries) > self.max_size:
+            _, evicted = self._entries.popitem(last=False)
+            self._evict(evicted)
+        return llm
+
+    @asynccontextmanager
+    async def lease(self, data) -> AsyncIterator[Any]:
+        """
+        Use the cached model for a request configuration for the duration of a call
+        or stream; if it is evicted meanwhile, its clients are closed only on release.
+        """
+        llm = self.get(data)
+        ident = id(llm)
+        self._in_use[ident] = self._in_use.get(ident, 0) + 1
+        try:
+            yield llm
+        finally:
+            count = self._in_use.pop(ident) - 1
+            if count:
+                self._in_use[ident] = count
+            elif ident in self._retired:
+                self._close_later(self._retired.pop(ident))
+
+    def _expire(self, now: float):
+        # Entries are ordered by last use, so expired ones sit at the front
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry[2] < self.idle_ttl:
+                break
+            del self._entries[key]
+            self._evict(entry)
+
+    def _evict(self, entry: Tuple[Any, bool, float]):
+        self.evictions += 1
+        llm, owns_clients, _ = entry
+        if not owns_clients:
+            return
+        if id(llm) in self._in_use:
+            self._retired[id(llm)] = llm
+            return
+        self._close_later(llm)
+
+    def _close_later(self, llm: Any):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(_close_model(llm))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def close(self):
+        """
+        Close every cached model and shared connection pool.
+        """
+        entries, self._entries = list(self._entries.values()), OrderedDict()
+        retired, self._retired = list(self._retired.values()), {}
+        for llm in [llm for llm, owns_clients, _ in entries if owns_clients] + retired:
+            await _close_model(llm)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        await self.pools.close()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Cache occupancy, hit/miss and eviction counters.
+        """
+        return {
+            "entries": len(self._entries),
+            "pools": len(self.pools),
+            "retired": len(self._retired),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def _settings_from_url(settings_cls, provider: str, api_url: str):
+    """
+    Build an in-process provider's settings dataclass from the query string of `api_url`.
+
+    Missing parameters keep the dataclass defaults; values are converted with the
+    field types.
 
     Raises:
-        HTTPException: If the provider name is not recognized.
+        HTTPException: 400 if a parameter is unknown or has an invalid value.
+    """
+    params = dict(parse_qsl(urlparse(api_url or "").query))
+    fields = settings_cls.__dataclass_fields__
+    unknown = set(params) - set(fields)
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown {provider} provider settings: {', '.join(sorted(unknown))}"
+        )
+    try:
+        return settings_cls(**{name: fields[name].type(value) for name, value in params.items()})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _build_model(data, pools: ConnectionPools) -> Tuple[Any, bool]:
+    """
+    Construct a chat model for the request configuration.
+
+    Returns:
+        tuple: The model instance and whether it owns clients that must be closed
+        on eviction (False when it only uses shared pools).
     """
     provider = data.provider.lower()
 
@@ -54,7 +325,12 @@ def llm_provider(data):
             model_name=data.model,
             temperature=data.temperature,
             openai_api_key=data.api_key,
+            http_async_client=pools.get(provider, data.api_url),
+            max_retries=0,
+            # Report token usage on streamed responses too (for metrics)
+            stream_usage=True,
         )
+        return llm, False
     elif provider in ("azure", "azureopenai"):
         llm = AzureChatOpenAI(
             azure_deployment=data.model,  # Azure uses deployment_name
@@ -62,21 +338,110 @@ def llm_provider(data):
             api_key=data.api_key,
             azure_endpoint=data.api_url,  # Correct param name
             api_version=getattr(data, "api_version", "2025-01-01"),
+            http_async_client=pools.get(provider, data.api_url),
+            max_retries=0,
+            stream_usage=True,
         )
+        return llm, False
 
     elif provider == "anthropic":
         llm = ChatAnthropic(
             model_name=data.model,
             api_key=data.api_key,
             temperature=data.temperature,
+            max_retries=0,
+        )
+        # ChatAnthropic has no http client parameter; seed its cached async client
+        # with one bound to the shared pool instead.
+        llm.__dict__["_async_client"] = anthropic.AsyncClient(
+            **llm._client_params,
+            http_client=pools.get(provider, data.api_url),
         )
+        return llm, False
     elif provider == "gemini":
         llm = ChatGoogleGenerativeAI(
             model=data.model,
             temperature=data.temperature,
             api_key=data.api_key,
+            max_retries=0,
         )
+        return llm, True
+    elif provider == "fake" and ENABLE_FAKE_PROVIDER:
+        return FakeChatModel(_settings_from_url(FakeSettings, provider, data.api_url), data.model), False
+    elif provider == "extractive":
+        settings = _settings_from_url(ExtractiveSettings, provider, data.api_url)
+        try:
+            return ExtractiveChatModel(settings, data.model), False
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     else:
         raise HTTPException(status_code=400, detail=f"Unsupported provider: {data.provider}")
-    return llm
 
+
+# Shared registry of reusable chat model instances
+client_registry = ClientRegistry()
+
+
+def llm_provider(data):
+    """
+    Return a LangChain-compatible chat model instance for the AI provider.
+
+    Instances are reused across requests with the same provider configuration.
+
+    Args:
+        data (SummarizeRequest or ChatRequest): An object containing the following fields:
+            - provider (str): Name of the provider ("openai", "azureopenai", "anthropic", "gemini",
+              "fake" or "extractive").
+            - model (str): Model name or deployment ID (for Azure).
+            - api_key (str): API key for authentication.
+            - api_url (str, optional): Base API URL (used by Azure OpenAI).
+            - api_version (str, optional): API version for Azure OpenAI (default "2025-01-01").
+            - temperature (float): Sampling temperature for model response diversity.
+
+    Returns:
+        BaseChatModel: An instance of a LangChain-compatible chat model.
+
+    Raises:
+        HTTPException: If the provider name is not recognized.
+    """
+    return client_registry.get(data)
+
+
+def llm_client(data):
+    """
+    Lease the chat model for a request configuration around one call or stream.
+
+    Same model as `llm_provider`, but a model evicted from the registry while
+    leased keeps its clients open until the lease ends.
+
+    Usage:
+        async with llm_client(config) as llm:
+            response = await llm.ainvoke(messages)
+    """
+    return client_registry.lease(data)
+
+
+def chunk_text(chunk) -> str:
+    """
+    Extract the text of a streamed message chunk (plain string or content blocks).
+
+    Args:
+        chunk (AIMessageChunk): A chunk yielded by `llm.astream(...)`.
+
+    Returns:
+        str: The text carried by the chunk, possibly empty.
+    """
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in content
+    )
+
+
+async def close_llm_clients():
+    """
+    Close all cached chat models and shared connection pools. Called at app shutdown.
+    """
+    await client_registry.close()
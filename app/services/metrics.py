@@ -0,0 +1,292 @@
+"""
+Metrics Module
+
+This module collects application metrics and renders them in the Prometheus text
+exposition format (served at /api/metrics).
+
+Features:
+- Minimal in-process `Counter` and `Histogram` types with labels
+- LLM call metrics labeled by provider, model and operation: latency, time to first
+  token of streamed calls, prompt/completion tokens from the provider's usage
+  metadata, and error/timeout/rate-limit counters (`observe_llm`)
+- Rate-limit retries and client-side throttle waits (app.services.rate_limiter)
+- HTTP request counters and latency per router (`MetricsMiddleware`)
+- Gauges read from the `stats()` of the caches, queues and indexes at scrape time
+  (`register_stats`)
+
+Metrics are per process; with several workers, each is scraped separately.
+
+Usage:
+    async with observe_llm(data.provider, data.model, "summarize") as call:
+        response = await llm.ainvoke(messages)
+        call.usage(response)
+
+    register_stats("write_behind", write_behind.stats)
+    app.add_middleware(MetricsMiddleware)
+    text = render()
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Sequence, Tuple
+
+from fastapi import HTTPException
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter with labels.
+    """
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with labels.
+    """
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        # Layout: one count per bucket, then the sum and the total count
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series[-1] if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {series[-1]}")
+        return lines
+
+
+LLM_LABELS = ("provider", "model", "operation")
+
+llm_requests = Counter("llm_requests_total", "LLM calls by outcome.", LLM_LABELS + ("outcome",))
+llm_latency = Histogram("llm_request_duration_seconds", "LLM call latency.", LLM_LABELS)
+llm_first_token = Histogram("llm_time_to_first_token_seconds", "Time to the first streamed token.", LLM_LABELS)
+llm_tokens = Counter("llm_tokens_total", "Tokens reported by the provider.", ("provider", "model", "kind"))
+llm_errors = Counter("llm_errors_total", "Failed LLM calls by error kind.", LLM_LABELS + ("kind",))
+llm_retries = Counter("llm_retries_total", "Retried LLM calls.", ("provider", "reason"))
+llm_throttle_wait = Histogram("llm_throttle_wait_seconds", "Time calls waited for the client-side rate limiter.", ("provider",))
+
+http_requests = Counter("http_requests_total", "HTTP requests.", ("router", "method", "status"))
+http_latency = Histogram("http_request_duration_seconds", "HTTP request latency.", ("router",), HTTP_BUCKETS)
+
+_metrics = [
+    llm_requests, llm_latency, llm_first_token, llm_tokens, llm_errors, llm_retries, llm_throttle_wait,
+    http_requests, http_latency,
+]
+_stats: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+class LLMCall:
+    """
+    Handle of one observed LLM call.
+    """
+
+    def __init__(self, provider: str, model: str, operation: str):
+        self.labels = (provider, model, operation)
+        self.started = time.monotonic()
+        self._first_token = False
+
+    def first_token(self):
+        """
+        Record the time to the first streamed token (only the first call counts).
+        """
+        if not self._first_token:
+            self._first_token = True
+            llm_first_token.observe(time.monotonic() - self.started, *self.labels)
+
+    def usage(self, message: Any):
+        """
+        Count the tokens of a response or stream chunk that carries usage metadata.
+        """
+        usage = getattr(message, "usage_metadata", None)
+        if not usage:
+            return
+        provider, model, _ = self.labels
+        if usage.get("input_tokens"):
+            llm_tokens.inc(provider, model, "prompt", amount=usage["input_tokens"])
+        if usage.get("output_tokens"):
+            llm_tokens.inc(provider, model, "completion", amount=usage["output_tokens"])
+
+
+def _error_kind(e: BaseException) -> str:
+    from app.services.rate_limiter import is_rate_limited
+
+    if isinstance(e, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(e, (asyncio.CancelledError, GeneratorExit)):
+        # The caller went away (e.g. a client closed a stream)
+        return "cancelled"
+    if isinstance(e, HTTPException) and e.status_code == 504:
+        return "timeout"
+    if is_rate_limited(e) or (isinstance(e, HTTPException) and e.status_code == 429):
+        return "rate_limited"
+    return "error"
+
+
+@asynccontextmanager
+async def observe_llm(provider: str, model: str, operation: str) -> AsyncIterator[LLMCall]:
+    """
+    Time an LLM call and count its outcome.
+
+    Args:
+        provider (str): Provider name.
+        model (str): Model name.
+        operation (str): What the call does (e.g. "summarize", "chat_stream").
+
+    Yields:
+        LLMCall: Report the first token and usage metadata through it.
+    """
+    call = LLMCall((provider or "").lower(), model or "", operation)
+    try:
+        yield call
+    except BaseException as e:
+        kind = _error_kind(e)
+        if kind != "cancelled":
+            llm_errors.inc(*call.labels, kind)
+        llm_requests.inc(*call.labels, kind)
+        llm_latency.observe(time.monotonic() - call.started, *call.labels)
+        raise
+    llm_requests.inc(*call.labels, "ok")
+    llm_latency.observe(time.monotonic() - call.started, *call.labels)
+
+
+def register_stats(component: str, stats: Callable[[], Dict[str, Any]]):
+    """
+    Export the numeric fields of `stats()` as gauges named `<component>_<field>`.
+    Nested dicts are flattened with "_"; keys that are not identifiers become a "key" label.
+    """
+    _stats[component] = stats
+
+
+def _gauges(prefix: str, values: Dict[str, Any], samples: Dict[str, List[str]], labels: str = ""):
+    for key, value in values.items():
+        if isinstance(value, bool) or value is None:
+            continue
+        if isinstance(value, dict):
+            if str(key).isidentifier():
+                _gauges(f"{prefix}_{key}", value, samples, labels)
+            else:
+                # e.g. admission lanes keyed by "provider/model"
+                _gauges(prefix, value, samples, f'{{key="{_escape(key)}"}}')
+        elif isinstance(value, (int, float)):
+            name = f"{prefix}_{key}"
+            samples.setdefault(name, []).append(f"{name}{labels} {_number(value)}")
+
+
+def render() -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for component, stats in _stats.items():
+        samples: Dict[str, List[str]] = {}
+        try:
+            _gauges(component, stats(), samples)
+        except Exception as e:
+            lines.append(f"# {component} stats unavailable: {_escape(e)}")
+            continue
+        # Samples of one metric must be grouped under its TYPE line
+        for name, group in samples.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(group)
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests and their latency per router.
+
+    The router label is the first tag of the matched route (as given to
+    `include_router` in app/main.py); unmatched requests are labeled "unmatched".
+    Streaming responses are timed until their last body chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            tags = getattr(route, "tags", None)
+            router = tags[0] if tags else ("unmatched" if route is None else getattr(route, "name", "other"))
+            http_requests.inc(router, scope["method"], str(status["code"]))
+            http_latency.observe(time.monotonic() - started, router)
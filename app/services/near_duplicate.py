@@ -0,0 +1,301 @@
+"""
+Near-Duplicate Index Module
+
+This module detects summarization requests whose text is almost identical to a
+previously summarized document (a different footer, re-extracted whitespace, ...)
+so the earlier summary can be reused instead of calling the provider again.
+
+Features:
+- MinHash signatures over word shingles of the whitespace-normalized text
+- LSH banding to find candidates, verified against a Jaccard similarity threshold
+- Matches are only reused for the same prompt, provider, model, endpoint URL,
+  temperature, preprocessing steps and extractive pre-pass budget
+- Compact, array-backed storage: signatures and band hashes live in NumPy arrays
+  and candidate search is a vectorized scan
+- Rebuildable from the `summaries` collection at startup
+
+Configuration (environment variables):
+    NEAR_DUPLICATE_THRESHOLD: Minimum estimated Jaccard similarity to reuse a summary (default 0.9).
+    NEAR_DUPLICATE_SHINGLE_SIZE: Words per shingle (default 5).
+
+Usage:
+    signature = await near_duplicate_index.signature_async(data.text)
+    summary = await near_duplicate_index.find(db, data, signature)
+    ...
+    near_duplicate_index.add(record["_id"], data, signature)
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import zlib
+from typing import Any, Iterable, List, Optional
+import numpy as np
+from app.schemas.models import SummarizeRequest
+from app.services.summarize import DEFAULT_PROMPT
+from app.services.write_behind import write_behind
+from app.utils.text_compression import decompress_text
+from app.utils.text_preprocess import parse_steps
+
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.9"))
+NEAR_DUPLICATE_SHINGLE_SIZE = int(os.getenv("NEAR_DUPLICATE_SHINGLE_SIZE", "5"))
+
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+SHINGLE_BLOCK = 4096
+# Texts above this many characters are hashed in a worker thread
+THREAD_THRESHOLD = 20_000
+
+_rng = np.random.default_rng(0x5EED)
+_PERM_A = _rng.integers(1, int(MERSENNE_PRIME), size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, int(MERSENNE_PRIME), size=NUM_PERM, dtype=np.uint64)
+_BAND_MULT = np.array([1, 0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D], dtype=np.uint64)[:ROWS]
+
+
+def _variant_key(
+    prompt: Optional[str],
+    provider: str,
+    model: str,
+    temperature: Any,
+    preprocess: Iterable[str] = (),
+    prepass_tokens: Optional[int] = None,
+    api_url: Optional[str] = None,
+) -> int:
+    """
+    64-bit id of the prompt/provider/model/endpoint/temperature/preprocessing/pre-pass combination
+    a summary was made with.
+    """
+    raw = "\x00".join([
+        prompt or DEFAULT_PROMPT,
+        (provider or "").lower(),
+        model or "",
+        api_url or "",
+        repr(temperature),
+        ",".join(preprocess),
+        repr(prepass_tokens),
+    ])
+    return int.from_bytes(hashlib.blake2b(raw.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+def _request_variant(data: SummarizeRequest) -> int:
+    return _variant_key(
+        data.prompt, data.provider, data.model, data.temperature, parse_steps(data.preprocess), data.prepass_tokens,
+        data.api_url,
+    )
+
+
+def minhash_signature(text: str, shingle_size: int = NEAR_DUPLICATE_SHINGLE_SIZE) -> np.ndarray:
+    """
+    Compute the MinHash signature of a text's word shingles.
+
+    Args:
+        text (str): Input text.
+        shingle_size (int): Number of consecutive words per shingle.
+
+    Returns:
+        np.ndarray: `NUM_PERM` uint32 minimum hash values.
+    """
+    words = text.lower().split()
+    word_hashes = np.fromiter(
+        (zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint64, count=len(words)
+    )
+    if len(word_hashes) == 0:
+        word_hashes = np.zeros(1, dtype=np.uint64)
+
+    # Rolling combination of `shingle_size` consecutive word hashes, reduced mod p
+    k = min(shingle_size, len(word_hashes))
+    count = len(word_hashes) - k + 1
+    shingles = np.zeros(count, dtype=np.uint64)
+    for offset in range(k):
+        shingles = (shingles * np.uint64(1_000_003) + word_hashes[offset:offset + count]) % MERSENNE_PRIME
+    shingles = np.unique(shingles)
+
+    signature = np.full(NUM_PERM, MERSENNE_PRIME, dtype=np.uint64)
+    for start in range(0, len(shingles), SHINGLE_BLOCK):
+        block = shingles[start:start + SHINGLE_BLOCK, None]
+        hashed = (block * _PERM_A + _PERM_B) % MERSENNE_PRIME
+        np.minimum(signature, hashed.min(axis=0), out=signature)
+    return signature.astype(np.uint32)
+
+
+def _band_hashes(signature: np.ndarray) -> np.ndarray:
+    """
+    Collapse each LSH band of a signature into one 64-bit hash.
+    """
+    bands = signature.astype(np.uint64).reshape(BANDS, ROWS)
+    return (bands * _BAND_MULT).sum(axis=1)
+
+
+class NearDuplicateIndex:
+    """
+    Array-backed MinHash/LSH index of summarized documents.
+
+    Args:
+        threshold (float): Minimum estimated Jaccard similarity for a match.
+        capacity (int): Initial number of rows allocated.
+    """
+
+    def __init__(self, threshold: float = NEAR_DUPLICATE_THRESHOLD, capacity: int = 1024):
+        self.threshold = threshold
+        self._size = 0
+        self._signatures = np.zeros((capacity, NUM_PERM), dtype=np.uint32)
+        self._bands = np.zeros((capacity, BANDS), dtype=np.uint64)
+        self._variants = np.zeros(capacity, dtype=np.int64)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._ids: List[Any] = []
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return int(self._alive[:self._size].sum())
+
+    def _grow(self):
+        capacity = len(self._variants) * 2
+        self._signatures = np.resize(self._signatures, (capacity, NUM_PERM))
+        self._bands = np.resize(self._bands, (capacity, BANDS))
+        self._variants = np.resize(self._variants, capacity)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._alive = alive
+
+    async def signature_async(self, text: str) -> np.ndarray:
+        """
+        Compute a MinHash signature, off the event loop for long texts.
+        """
+        if len(text) > THREAD_THRESHOLD:
+            return await asyncio.to_thread(minhash_signature, text)
+        return minhash_signature(text)
+
+    def add(self, summary_id: Any, data: SummarizeRequest, signature: np.ndarray):
+        """
+        Index a stored summary.
+
+        Args:
+            summary_id: `_id` of the record in the `summaries` collection.
+            data (SummarizeRequest): Request the summary was generated for.
+            signature (np.ndarray): MinHash signature of the request text.
+        """
+        self._add(summary_id, _request_variant(data), signature)
+
+    def _add(self, summary_id: Any, variant: int, signature: np.ndarray):
+        if self._size == len(self._variants):
+            self._grow()
+        row = self._size
+        self._signatures[row] = signature
+        self._bands[row] = _band_hashes(signature)
+        self._variants[row] = variant
+        self._alive[row] = True
+        self._ids.append(summary_id)
+        self._size += 1
+
+    def candidates(self, data: SummarizeRequest, signature: np.ndarray) -> List[int]:
+        """
+        Rows of the same variant sharing an LSH band and meeting the threshold, best first.
+        """
+        n = self._size
+        if n == 0:
+            return []
+        variant = _request_variant(data)
+        mask = self._alive[:n] & (self._variants[:n] == variant)
+        mask &= (self._bands[:n] == _band_hashes(signature)).any(axis=1)
+        rows = np.nonzero(mask)[0]
+        if len(rows) == 0:
+            return []
+        similarity = (self._signatures[rows] == signature).mean(axis=1)
+        order = np.argsort(-similarity)
+        return [int(rows[i]) for i in order if similarity[i] >= self.threshold]
+
+    async def find(self, db, data: SummarizeRequest, signature: np.ndarray) -> Optional[str]:
+        """
+        Return the summary of a near-duplicate document, if one is indexed.
+
+        Rows whose record no longer exists (deleted history) are dropped; a record
+        still in the write-behind buffer is flushed first rather than dropped.
+
+        Args:
+            db: MongoDB async database.
+            data (SummarizeRequest): Incoming request.
+            signature (np.ndarray): MinHash signature of the request text.
+
+        Returns:
+            str or None: A reusable summary, or None when there is no match.
+        """
+        for row in self.candidates(data, signature):
+            doc = await db.summaries.find_one({"_id": self._ids[row]}, {"summary_text": 1})
+            if doc is None and write_behind.pending:
+                await write_behind.flush()
+                doc = await db.summaries.find_one({"_id": self._ids[row]}, {"summary_text": 1})
+            if doc is None:
+                self._alive[row] = False
+                continue
+            self.hits += 1
+            return decompress_text(doc["summary_text"])
+        self.misses += 1
+        return None
+
+    def clear(self):
+        """
+        Drop every indexed document.
+        """
+        self._alive[:] = False
+        self._size = 0
+        self._ids = []
+
+    async def rebuild(self, db, batch_size: int = 500):
+        """
+        Rebuild the index from completed records of the `summaries` collection.
+
+        Records created before prompt and temperature were stored are skipped.
+
+        Args:
+            db: MongoDB async database.
+            batch_size (int): Records hashed per worker-thread batch.
+        """
+        self.clear()
+        cursor = db.summaries.find(
+            {"temperature": {"$exists": True}, "status": {"$in": [None, "completed"]}},
+            {"input_text": 1, "prompt": 1, "provider": 1, "model": 1, "temperature": 1,
+             "preprocess": 1, "prepass_tokens": 1, "api_url": 1},
+        )
+        batch = []
+        try:
+            async for doc in cursor:
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    await self._index_batch(batch)
+                    batch = []
+            if batch:
+                await self._index_batch(batch)
+        except Exception as e:
+            logging.warning(f"Near-duplicate index rebuild stopped early: {e}")
+        logging.info(f"Near-duplicate index rebuilt with {len(self)} documents")
+
+    async def _index_batch(self, docs: List[dict]):
+        signatures = await asyncio.to_thread(
+            lambda: [minhash_signature(decompress_text(doc.get("input_text")) or "") for doc in docs]
+        )
+        for doc, signature in zip(docs, signatures):
+            variant = _variant_key(
+                doc.get("prompt"), doc.get("provider"), doc.get("model"), doc.get("temperature"),
+                doc.get("preprocess") or (), doc.get("prepass_tokens"), doc.get("api_url"),
+            )
+            self._add(doc["_id"], variant, signature)
+
+    def stats(self) -> dict:
+        """
+        Index size, memory footprint and hit/miss counters.
+        """
+        return {
+            "documents": len(self),
+            "rows": self._size,
+            "bytes": self._signatures.nbytes + self._bands.nbytes + self._variants.nbytes + self._alive.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Shared near-duplicate index instance
+near_duplicate_index = NearDuplicateIndex()
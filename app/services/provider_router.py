@@ -0,0 +1,400 @@
+"""
+Provider Routing Module
+
+This module routes a provider call across an ordered set of provider configurations,
+so one slow or failing provider does not set the latency of every request. A request
+opts in by listing `fallbacks` after its own provider; requests without fallbacks are
+sent to their provider directly, exactly as before.
+
+Features:
+- Rolling latency window and error rate per provider/model/endpoint
+- Hedged requests ("hedged" routing): when the current provider has not answered
+  after its p95 latency, a duplicate call is sent to the next provider; the first
+  answer wins and the other calls are cancelled
+- Fallback: a failed call moves on to the next provider immediately ("fallback"
+  routing only does this, never sending duplicates)
+- Circuit breaker: a provider failing `ROUTER_BREAKER_FAILURES` times in a row is
+  skipped for `ROUTER_BREAKER_COOLDOWN` seconds, then a single probe call decides
+  whether it is used again
+- Streams are hedged up to their first token; after that the stream is committed to
+  the provider that produced it
+
+Only provider failures count towards the breaker: timeouts and provider errors do,
+client errors (invalid configuration, 4xx answers such as a bad API key), rate limits
+and local admission rejections do not.
+
+Configuration (environment variables):
+    ROUTER_HEDGE_DELAY: Seconds before hedging while a provider has too few latency
+        samples (default 5).
+    ROUTER_HEDGE_MIN_DELAY: Lower bound of the hedge delay in seconds (default 0.25).
+    ROUTER_HEDGE_QUANTILE: Latency quantile used as hedge delay (default 0.95).
+    ROUTER_MIN_SAMPLES: Latency samples needed before the quantile is used (default 20).
+    ROUTER_WINDOW: Latency samples kept per provider (default 200).
+    ROUTER_BREAKER_FAILURES: Consecutive failures that open the breaker (default 5).
+    ROUTER_BREAKER_COOLDOWN: Seconds the breaker stays open (default 30).
+
+Usage:
+    config, result = await provider_router.call(candidates(data), attempt, hedge=True)
+    async for config, delta in provider_router.stream(candidates(data), open_stream):
+        ...
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from app.schemas.models import ProviderConfig
+from app.services.rate_limiter import status_of, is_rate_limited
+
+ROUTER_HEDGE_DELAY = float(os.getenv("ROUTER_HEDGE_DELAY", "5"))
+ROUTER_HEDGE_MIN_DELAY = float(os.getenv("ROUTER_HEDGE_MIN_DELAY", "0.25"))
+ROUTER_HEDGE_QUANTILE = float(os.getenv("ROUTER_HEDGE_QUANTILE", "0.95"))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "20"))
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "200"))
+ROUTER_BREAKER_FAILURES = int(os.getenv("ROUTER_BREAKER_FAILURES", "5"))
+ROUTER_BREAKER_COOLDOWN = float(os.getenv("ROUTER_BREAKER_COOLDOWN", "30"))
+
+# Weight of the latest outcome in the rolling error rate
+ERROR_RATE_ALPHA = 0.1
+
+
+def candidates(data) -> List[ProviderConfig]:
+    """
+    The ordered provider configurations of a request: its own provider, then its fallbacks.
+
+    Fallbacks without a temperature use the request's.
+    """
+    primary = ProviderConfig(
+        provider=data.provider,
+        model=data.model,
+        api_key=data.api_key,
+        api_url=data.api_url,
+        api_version=data.api_version,
+        temperature=data.temperature,
+    )
+    fallbacks = [
+        config if config.temperature is not None else config.model_copy(update={"temperature": data.temperature})
+        for config in getattr(data, "fallbacks", None) or []
+    ]
+    return [primary] + fallbacks
+
+
+def _is_provider_failure(e: BaseException) -> bool:
+    """
+    Whether an attempt failed because of the provider (timeout, provider error).
+    Rate limits are quota, not health, and are handled by app.services.rate_limiter.
+
+    Client errors the provider answered with (4xx, e.g. an invalid API key or a bad
+    request) belong to the caller and do not count either; they are read from the
+    original SDK error, which HTTP errors mapped from it carry as their cause.
+    """
+    original = (e.__cause__ or e.__context__) if isinstance(e, HTTPException) else e
+    status = status_of(original) if original is not None else None
+    if status is not None and 400 <= status < 500:
+        return False
+    if isinstance(e, HTTPException):
+        return e.status_code >= 500 and e.status_code != 503
+    return not is_rate_limited(e)
+
+
+class ProviderHealth:
+    """
+    Latency window, error rate and circuit breaker of one provider endpoint.
+    """
+
+    def __init__(self):
+        self.latencies: Dict[str, Deque[float]] = {}
+        self.error_rate = 0.0
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probing = False
+        self.opened = 0
+
+    def available(self, now: float) -> bool:
+        """
+        Whether a call may be sent. Once the cooldown has passed, one probe call is let through.
+        """
+        if self.state == "open" and now - self.opened_at >= ROUTER_BREAKER_COOLDOWN:
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self.probing:
+                return False
+            self.probing = True
+            return True
+        return self.state == "closed"
+
+    def hedge_delay(self, kind: str) -> float:
+        """
+        Seconds to wait for this provider before hedging to the next one.
+        """
+        window = self.latencies.get(kind)
+        if not window or len(window) < ROUTER_MIN_SAMPLES:
+            return ROUTER_HEDGE_DELAY
+        ordered = sorted(window)
+        index = min(len(ordered) - 1, int(ROUTER_HEDGE_QUANTILE * len(ordered)))
+        return max(ROUTER_HEDGE_MIN_DELAY, ordered[index])
+
+    def success(self, kind: str, latency: float):
+        self.latencies.setdefault(kind, deque(maxlen=ROUTER_WINDOW)).append(latency)
+        self.error_rate *= 1 - ERROR_RATE_ALPHA
+        self.failures = 0
+        self.state = "closed"
+        self.probing = False
+
+    def failure(self, now: float):
+        self.error_rate = self.error_rate * (1 - ERROR_RATE_ALPHA) + ERROR_RATE_ALPHA
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= ROUTER_BREAKER_FAILURES:
+            if self.state != "open":
+                self.opened += 1
+            self.state = "open"
+            self.opened_at = now
+        self.probing = False
+
+    def released(self):
+        """
+        An attempt ended without an outcome (cancelled or a client error).
+        """
+        self.probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        window = self.latencies.get("call") or self.latencies.get("stream") or ()
+        ordered = sorted(window)
+        return {
+            "state": self.state,
+            "breaker_open": int(self.state == "open"),
+            "error_rate": round(self.error_rate, 4),
+            "consecutive_failures": self.failures,
+            "breaker_opened": self.opened,
+            "latency_p50": round(ordered[len(ordered) // 2], 3) if ordered else None,
+            "latency_p95": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 3) if ordered else None,
+        }
+
+
+class _Attempt:
+    """
+    One in-flight call of a routed request.
+    """
+
+    def __init__(self, config: ProviderConfig, health: ProviderHealth, task: asyncio.Task, hedged: bool):
+        self.config = config
+        self.health = health
+        self.task = task
+        self.hedged = hedged
+        self.started = time.monotonic()
+
+
+class ProviderRouter:
+    """
+    Routes calls over ordered provider configurations with hedging, fallback and circuit breaking.
+    """
+
+    def __init__(self):
+        self._health: Dict[Tuple[str, str, str], ProviderHealth] = {}
+        self.routed = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+        self.skipped = 0
+        self.rejected = 0
+
+    def health(self, config: ProviderConfig) -> ProviderHealth:
+        key = ((config.provider or "").lower(), config.model, config.api_url or "")
+        health = self._health.get(key)
+        if health is None:
+            health = self._health[key] = ProviderHealth()
+        return health
+
+    def _plan(self, configs: List[ProviderConfig]) -> List[ProviderConfig]:
+        """
+        Drop providers whose circuit breaker is open.
+
+        Raises:
+            HTTPException: 503 if every provider is unavailable.
+        """
+        now = time.monotonic()
+        plan = [config for config in configs if self.health(config).available(now)]
+        self.skipped += len(configs) - len(plan)
+        if not plan:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="All AI providers are temporarily unavailable, retry later.")
+        return plan
+
+    def _finish(self, attempt: _Attempt, kind: str, error: Optional[BaseException] = None):
+        if error is None:
+            attempt.health.success(kind, time.monotonic() - attempt.started)
+        elif _is_provider_failure(error):
+            logging.warning(f"Provider {attempt.config.provider}/{attempt.config.model} failed: {error}")
+            attempt.health.failure(time.monotonic())
+        else:
+            attempt.health.released()
+
+    async def _race(
+        self,
+        configs: List[ProviderConfig],
+        start: Callable[[ProviderConfig], Awaitable[Any]],
+        kind: str,
+        hedge: bool,
+    ) -> Tuple[ProviderConfig, Any]:
+        """
+        Run `start` over the providers with hedging and fallback until one succeeds.
+
+        Returns:
+            tuple: The winning configuration and its result.
+
+        Raises:
+            The last attempt's exception if every provider failed.
+        """
+        plan = self._plan(configs)
+        self.routed += 1
+        attempts: List[_Attempt] = []
+        last_error: Optional[BaseException] = None
+
+        def launch(hedged: bool = False):
+            config = plan[len(attempts)]
+            attempts.append(_Attempt(config, self.health(config), asyncio.ensure_future(start(config)), hedged))
+
+        launch()
+        try:
+            while True:
+                pending = [attempt for attempt in attempts if not attempt.task.done()]
+                if not pending:
+                    if len(attempts) == len(plan):
+                        raise last_error
+                    self.fallbacks += 1
+                    launch()
+                    continue
+                timeout = None
+                if hedge and len(attempts) < len(plan):
+                    latest = attempts[-1]
+                    timeout = max(0.0, latest.started + latest.health.hedge_delay(kind) - time.monotonic())
+                done, _ = await asyncio.wait([a.task for a in pending], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges += 1
+                    launch(hedged=True)
+                    continue
+                for attempt in pending:
+                    if attempt.task not in done:
+                        continue
+                    error = attempt.task.exception()
+                    self._finish(attempt, kind, error)
+                    if error is None:
+                        if attempt.hedged:
+                            self.hedge_wins += 1
+                        return attempt.config, attempt.task.result()
+                    last_error = error
+        finally:
+            losers = [attempt for attempt in attempts if not attempt.task.done()]
+            for attempt in losers:
+                attempt.task.cancel()
+                attempt.health.released()
+            # Providers planned but never called give back their half-open probe
+            for config in plan[len(attempts):]:
+                self.health(config).released()
+            if losers:
+                await asyncio.gather(*(attempt.task for attempt in losers), return_exceptions=True)
+
+    async def call(
+        self,
+        configs: List[ProviderConfig],
+        attempt: Callable[[ProviderConfig], Awaitable[Any]],
+        hedge: bool = True,
+    ) -> Tuple[ProviderConfig, Any]:
+        """
+        Call the providers in order until one answers.
+
+        Args:
+            configs (list): Provider configurations, preferred first (see `candidates`).
+            attempt (callable): Makes the call for one configuration.
+            hedge (bool): Send duplicate calls to the next provider after the hedge delay.
+
+        Returns:
+            tuple: The configuration that answered (one of `configs`) and the result
+            of its attempt.
+
+        Raises:
+            HTTPException: 503 if every provider's breaker is open; otherwise the last
+                attempt's error if every provider failed.
+        """
+        if len(configs) == 1:
+            return configs[0], await attempt(configs[0])
+        return await self._race(configs, attempt, "call", hedge)
+
+    async def stream(
+        self,
+        configs: List[ProviderConfig],
+        open_stream: Callable[[ProviderConfig], AsyncIterator[str]],
+        hedge: bool = True,
+    ) -> AsyncIterator[Tuple[ProviderConfig, str]]:
+        """
+        Stream from the first provider to produce a token.
+
+        Providers are hedged and failed over until the first delta arrives; the rest
+        of the stream then comes from that provider, and a later failure is raised.
+
+        Args:
+            configs (list): Provider configurations, preferred first.
+            open_stream (callable): Opens the delta stream for one configuration.
+            hedge (bool): Open the next provider's stream after the hedge delay.
+
+        Yields:
+            tuple: The configuration serving the stream and the next text delta.
+        """
+        if len(configs) == 1:
+            deltas = open_stream(configs[0])
+            try:
+                async for delta in deltas:
+                    yield configs[0], delta
+            finally:
+                await deltas.aclose()
+            return
+
+        streams: Dict[int, AsyncIterator[str]] = {}
+
+        async def first_delta(config: ProviderConfig) -> Optional[str]:
+            deltas = streams[id(config)] = open_stream(config)
+            try:
+                return await deltas.__anext__()
+            except StopAsyncIteration:
+                return None
+
+        try:
+            winner, first = await self._race(configs, first_delta, "stream", hedge)
+            health = self.health(winner)
+            if first is None:
+                return
+            yield winner, first
+            try:
+                async for delta in streams[id(winner)]:
+                    yield winner, delta
+            except Exception as e:
+                if _is_provider_failure(e):
+                    health.failure(time.monotonic())
+                raise
+        finally:
+            for deltas in streams.values():
+                await deltas.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Routing counters and the state of every provider seen.
+        """
+        return {
+            "routed": self.routed,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+            "skipped_open": self.skipped,
+            "rejected": self.rejected,
+            "providers": {
+                f"{provider}/{model}": health.stats() for (provider, model, _), health in self._health.items()
+            },
+        }
+
+
+# Shared router, so provider health is learned across requests
+provider_router = ProviderRouter()
@@ -0,0 +1,404 @@
+"""
+Provider Rate Limiter Module
+
+This module keeps provider calls within each API key's quota on the client side and
+retries calls the provider rejected with a rate limit (HTTP 429), so bursts queue
+here instead of failing and clients are not sent into a retry storm.
+
+Features:
+- Token buckets per (provider, API key): requests per minute and tokens per minute,
+  refilled continuously; the prompt is estimated before the call and the reservation
+  is corrected with the provider's usage metadata afterwards, or given back when the
+  attempt fails or is rejected
+- Calls wait in FIFO order when a bucket is empty, for at most their deadline; a
+  wait that cannot finish within the deadline is rejected with 429 and Retry-After
+- Rate-limited calls are retried with jittered exponential backoff; a Retry-After
+  from the provider pauses every call on that key until it has passed
+- When retries are exhausted, the client gets 429 with Retry-After instead of 500
+- Throttle waits, retries and bucket levels are reported (`stats`, /api/metrics)
+
+Configuration (environment variables):
+    LLM_RATE_LIMITS: JSON limits per provider, e.g.
+        '{"openai": {"rpm": 500, "tpm": 200000}, "anthropic": {"rpm": 50}}'.
+    LLM_DEFAULT_RPM: Requests per minute for providers not listed (default 0, unlimited).
+    LLM_DEFAULT_TPM: Tokens per minute for providers not listed (default 0, unlimited).
+    LLM_EXPECTED_COMPLETION_TOKENS: Completion tokens reserved per call (default 512).
+    LLM_RETRY_MAX: Retries of a rate-limited call (default 3).
+    LLM_RETRY_BASE_DELAY: First backoff in seconds, doubled per retry (default 0.5).
+    LLM_RETRY_MAX_DELAY: Upper bound of one backoff in seconds (default 30).
+    LLM_RATE_LIMIT_MAX_KEYS: API keys tracked before idle ones are dropped (default 1024).
+
+Usage:
+    response = await rate_limiter.run(config, prompt_tokens, deadline, lambda: llm.ainvoke(messages))
+    stream, first = await rate_limiter.open_stream(config, prompt_tokens, deadline, lambda: llm.astream(messages))
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException
+from app.services.admission import remaining
+from app.services.metrics import llm_retries, llm_throttle_wait
+
+LLM_RATE_LIMITS = json.loads(os.getenv("LLM_RATE_LIMITS", "{}") or "{}")
+LLM_DEFAULT_RPM = float(os.getenv("LLM_DEFAULT_RPM", "0"))
+LLM_DEFAULT_TPM = float(os.getenv("LLM_DEFAULT_TPM", "0"))
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "512"))
+LLM_RETRY_MAX = int(os.getenv("LLM_RETRY_MAX", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "30"))
+LLM_RATE_LIMIT_MAX_KEYS = int(os.getenv("LLM_RATE_LIMIT_MAX_KEYS", "1024"))
+
+# Provider statuses meaning "slow down": rate limited, and Anthropic's overloaded
+RATE_LIMIT_STATUSES = (429, 529)
+
+
+def status_of(e: BaseException) -> Optional[int]:
+    """
+    HTTP status of a provider SDK error, when it carries one.
+    """
+    for status in (
+        getattr(e, "status_code", None),
+        getattr(getattr(e, "response", None), "status_code", None),
+        getattr(e, "code", None),
+    ):
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def is_rate_limited(e: BaseException) -> bool:
+    """
+    Whether a provider SDK error is a rate limit (OpenAI/Anthropic RateLimitError,
+    Gemini ResourceExhausted, or any error carrying status 429/529).
+
+    HTTPExceptions are this app's own errors (e.g. admission rejections) and never match.
+    """
+    if isinstance(e, HTTPException):
+        return False
+    return status_of(e) in RATE_LIMIT_STATUSES or type(e).__name__ in ("RateLimitError", "ResourceExhausted")
+
+
+def retry_after(e: BaseException) -> Optional[float]:
+    """
+    Seconds the provider asked to wait, from `retry-after-ms` / `retry-after` headers.
+    """
+    seconds = getattr(e, "retry_after", None)
+    if isinstance(seconds, (int, float)):
+        return float(seconds)
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def rate_limit_error(e: BaseException) -> HTTPException:
+    """
+    The 429 returned to the client once a call stays rate limited after its retries.
+    """
+    wait = retry_after(e) or LLM_RETRY_BASE_DELAY
+    return HTTPException(
+        status_code=429,
+        detail="AI provider rate limit reached, retry later.",
+        headers={"Retry-After": str(max(1, math.ceil(wait)))},
+    )
+
+
+class TokenBucket:
+    """
+    Continuously refilled bucket holding at most one minute of quota.
+
+    Args:
+        per_minute (float): Quota refilled per minute.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """
+        Seconds until `amount` (at most a full bucket) is available.
+        """
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float):
+        # May go negative when usage exceeds the reservation; the debt delays later calls
+        self.level -= amount
+
+
+class _KeyLimits:
+    """
+    Buckets, pause and wait queue of one provider API key.
+    """
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.paused_until = 0.0
+        self.queue = asyncio.Lock()
+        self.waiting = 0
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        wait = self.paused_until - now
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1, now))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        return max(0.0, wait)
+
+    def take(self, tokens: int):
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+
+    def settle(self, reserved: int, used: int):
+        if self.tokens is not None:
+            self.tokens.take(used - reserved)
+
+    @property
+    def idle(self) -> bool:
+        return not self.waiting and not self.queue.locked()
+
+
+class RateLimiter:
+    """
+    Client-side rate limits and rate-limit retries for provider calls.
+    """
+
+    def __init__(self, limits: Dict[str, Dict[str, float]] = LLM_RATE_LIMITS):
+        self.limits = {provider.lower(): value for provider, value in limits.items()}
+        self._keys: "OrderedDict[Tuple[str, str], _KeyLimits]" = OrderedDict()
+        self.throttled = 0
+        self.throttle_seconds = 0.0
+        self.retries = 0
+        self.exhausted = 0
+        self.rejected = 0
+
+    def _limits_for(self, config) -> Tuple[Tuple[str, str], _KeyLimits]:
+        provider = (config.provider or "").lower()
+        key = (provider, hashlib.sha256((config.api_key or "").encode("utf-8")).hexdigest()[:16])
+        limits = self._keys.get(key)
+        if limits is None:
+            quota = self.limits.get(provider, {})
+            limits = self._keys[key] = _KeyLimits(quota.get("rpm", LLM_DEFAULT_RPM), quota.get("tpm", LLM_DEFAULT_TPM))
+            self._evict()
+        self._keys.move_to_end(key)
+        return key, limits
+
+    def _evict(self):
+        excess = len(self._keys) - LLM_RATE_LIMIT_MAX_KEYS
+        for key in [key for key, limits in self._keys.items() if limits.idle][:max(0, excess)]:
+            del self._keys[key]
+
+    async def acquire(self, config, tokens: int, deadline: Optional[float]):
+        """
+        Wait until the key's buckets allow a call of `tokens` tokens, then take them.
+
+        Raises:
+            HTTPException: 429 with Retry-After if the wait would outlast the deadline.
+        """
+        key, limits = self._limits_for(config)
+        if limits.requests is None and limits.tokens is None and limits.paused_until <= time.monotonic():
+            return
+
+        started = time.monotonic()
+        limits.waiting += 1
+        try:
+            try:
+                # Not wait_for: on a timeout racing the acquire it can leave the lock held
+                async with asyncio.timeout(remaining(deadline)):
+                    await limits.queue.acquire()
+            except TimeoutError:
+                raise self._reject(limits.wait_time(tokens, time.monotonic()))
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = limits.wait_time(tokens, now)
+                    if wait <= 0:
+                        limits.take(tokens)
+                        break
+                    left = remaining(deadline)
+                    if left is not None and wait > left:
+                        raise self._reject(wait)
+                    await asyncio.sleep(wait)
+            finally:
+                limits.queue.release()
+        finally:
+            limits.waiting -= 1
+            waited = time.monotonic() - started
+            if waited > 0.001:
+                self.throttled += 1
+                self.throttle_seconds += waited
+                llm_throttle_wait.observe(waited, key[0])
+
+    def _reject(self, wait: float) -> HTTPException:
+        self.rejected += 1
+        return HTTPException(
+            status_code=429,
+            detail="AI provider quota exhausted for this key, retry later.",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+    def backoff(self, config, e: BaseException, retry: int, deadline: Optional[float]) -> Optional[float]:
+        """
+        Seconds to wait before retry number `retry` of a failed call, or None if the
+        error is not a rate limit, the retries are used up or the deadline is too close.
+
+        A Retry-After from the provider pauses the whole key.
+        """
+        if not is_rate_limited(e):
+            return None
+        if retry >= LLM_RETRY_MAX:
+            self.exhausted += 1
+            return None
+        # Full jitter spreads out callers that were rejected together
+        delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** retry))
+        asked = retry_after(e)
+        if asked is not None:
+            _, limits = self._limits_for(config)
+            limits.paused_until = max(limits.paused_until, time.monotonic() + asked)
+            delay = max(delay, asked + random.uniform(0, LLM_RETRY_BASE_DELAY))
+        left = remaining(deadline)
+        if left is not None and delay >= left:
+            self.exhausted += 1
+            return None
+        self.retries += 1
+        llm_retries.inc((config.provider or "").lower(), "rate_limited")
+        logging.info(f"Rate limited by {config.provider}/{config.model}, retrying in {delay:.2f}s")
+        return delay
+
+    def settle(self, config, reserved: int, message: Any):
+        """
+        Replace a call's token reservation with the usage the provider reported.
+        """
+        usage = getattr(message, "usage_metadata", None)
+        if usage and usage.get("total_tokens"):
+            _, limits = self._limits_for(config)
+            limits.settle(reserved, usage["total_tokens"])
+
+    def refund(self, config, reserved: int):
+        """
+        Give back the token reservation of an attempt that failed or was rate limited.
+        """
+        _, limits = self._limits_for(config)
+        limits.settle(reserved, 0)
+
+    async def run(self, config, prompt_tokens: int, deadline: Optional[float], call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Make a provider call within the key's limits, retrying rate limits.
+
+        Args:
+            config: Provider configuration (provider, model, api_key).
+            prompt_tokens (int): Estimated prompt size.
+            deadline (float, optional): Absolute `time.monotonic()` deadline.
+            call (callable): Makes one attempt of the call.
+
+        Returns:
+            The call's result.
+
+        Raises:
+            HTTPException: 429 if the quota wait would outlast the deadline.
+            The provider error when it is not a rate limit or retries are exhausted.
+        """
+        reserved = prompt_tokens + LLM_EXPECTED_COMPLETION_TOKENS
+        retry = 0
+        while True:
+            await self.acquire(config, reserved, deadline)
+            try:
+                result = await call()
+            except Exception as e:
+                self.refund(config, reserved)
+                delay = self.backoff(config, e, retry, deadline)
+                if delay is None:
+                    raise
+                retry += 1
+                await asyncio.sleep(delay)
+                continue
+            self.settle(config, reserved, result)
+            return result
+
+    async def open_stream(
+        self,
+        config,
+        prompt_tokens: int,
+        deadline: Optional[float],
+        open_stream: Callable[[], AsyncIterator[Any]],
+    ) -> Tuple[AsyncIterator[Any], Any]:
+        """
+        Open a provider stream within the key's limits, retrying rate limits until the
+        first chunk arrives. Streams keep their token estimate as reservation.
+
+        Returns:
+            tuple: The open stream and its first chunk (None if it was empty).
+        """
+        reserved = prompt_tokens + LLM_EXPECTED_COMPLETION_TOKENS
+        retry = 0
+        while True:
+            await self.acquire(config, reserved, deadline)
+            stream = open_stream()
+            try:
+                return stream, await asyncio.wait_for(stream.__anext__(), remaining(deadline))
+            except StopAsyncIteration:
+                return stream, None
+            except Exception as e:
+                await stream.aclose()
+                self.refund(config, reserved)
+                delay = self.backoff(config, e, retry, deadline)
+                if delay is None:
+                    raise
+                retry += 1
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Throttling and retry counters, and the bucket levels of every tracked key.
+        """
+        now = time.monotonic()
+        keys = {}
+        for (provider, key_hash), limits in self._keys.items():
+            limits.wait_time(0, now)  # refill before reading levels
+            keys[f"{provider}/{key_hash[:8]}"] = {
+                "waiting": limits.waiting,
+                "paused_seconds": round(max(0.0, limits.paused_until - now), 3),
+                "requests_available": round(limits.requests.level, 1) if limits.requests else None,
+                "tokens_available": round(limits.tokens.level) if limits.tokens else None,
+            }
+        return {
+            "throttled": self.throttled,
+            "throttle_seconds": round(self.throttle_seconds, 3),
+            "retries": self.retries,
+            "retries_exhausted": self.exhausted,
+            "rejected": self.rejected,
+            "keys": keys,
+        }
+
+
+# Shared limiter, so every request on one API key draws from the same buckets
+rate_limiter = RateLimiter()
@@ -0,0 +1,328 @@
+"""
+Chat Session Store Module
+
+This module defines where per-visitor chat sessions (recent messages plus a
+rolling summary of older turns) are kept, behind a pluggable interface so chat
+can run on several workers or replicas.
+
+Backends:
+- `InMemorySessionStore`: bounded in-process store with LRU, idle-TTL and
+  memory-cap eviction. Suitable for a single worker.
+- `MongoSessionStore`: shared store in the `chat_sessions` collection using the
+  application's motor client. Messages are written append-only with `$push`, the
+  message array is capped with `$slice`, compaction removes messages by id with
+  `$pull`, and idle sessions expire through a TTL index.
+
+Compaction is a compare-and-set on the session's `version`: when two workers
+compact the same session, only the first one's summary and removals apply and the
+other is told to retry later, so no message is dropped without being summarized.
+`max_messages` is a backstop; chat compacts sessions well before they reach it.
+
+Configuration (environment variables):
+    CHAT_SESSION_BACKEND: "memory" or "mongo" (default "memory").
+    CHAT_SESSION_MAX_MESSAGES: Messages kept per visitor (default 200).
+    CHAT_MEMORY_MAX_ENTRIES: Maximum in-memory sessions (default 10000).
+    CHAT_MEMORY_IDLE_TTL: Seconds an unused session is kept (default 3600).
+    CHAT_MEMORY_MAX_BYTES: Maximum total bytes of in-memory text (default 64 MiB).
+
+Usage:
+    state = await session_store.load(visitor_id)
+    await session_store.append(visitor_id, [HumanMessage(...), AIMessage(...)])
+    await session_store.compact(visitor_id, state, cut, summary)
+"""
+
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from langchain.schema import AIMessage, BaseMessage, HumanMessage
+
+CHAT_SESSION_BACKEND = os.getenv("CHAT_SESSION_BACKEND", "memory").lower()
+CHAT_SESSION_MAX_MESSAGES = int(os.getenv("CHAT_SESSION_MAX_MESSAGES", "200"))
+CHAT_MEMORY_MAX_ENTRIES = int(os.getenv("CHAT_MEMORY_MAX_ENTRIES", "10000"))
+CHAT_MEMORY_IDLE_TTL = float(os.getenv("CHAT_MEMORY_IDLE_TTL", "3600"))
+CHAT_MEMORY_MAX_BYTES = int(os.getenv("CHAT_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class ChatState:
+    """
+    Snapshot of a visitor's chat session.
+
+    Attributes:
+        messages (list): Recent messages kept verbatim, oldest first.
+        summary (str): Rolling summary of turns compacted out of `messages`.
+        message_ids (list): Store-specific ids of `messages`, used for compaction.
+        version (int): Number of compactions applied to the session when it was loaded.
+    """
+
+    def __init__(
+        self,
+        messages: Optional[List[BaseMessage]] = None,
+        summary: str = "",
+        message_ids: Optional[List[Any]] = None,
+        version: int = 0,
+    ):
+        self.messages = messages or []
+        self.summary = summary
+        self.message_ids = message_ids or []
+        self.version = version
+
+
+class SessionStore(ABC):
+    """
+    Interface of chat session backends. Backends must implement every abstract method.
+
+    Attributes:
+        max_messages (int): Messages kept per visitor; older ones are dropped on append.
+    """
+
+    max_messages: int = CHAT_SESSION_MAX_MESSAGES
+
+    async def ensure_indexes(self):
+        """
+        Create any indexes the backend needs. Called at startup.
+        """
+
+    @abstractmethod
+    async def load(self, visitor_id: str) -> ChatState:
+        """
+        Return a snapshot of the visitor's session (empty if none exists).
+        """
+
+    @abstractmethod
+    async def append(self, visitor_id: str, messages: List[BaseMessage]):
+        """
+        Append messages to the end of the visitor's session.
+        """
+
+    @abstractmethod
+    async def compact(self, visitor_id: str, state: ChatState, cut: int, summary: str) -> bool:
+        """
+        Replace the rolling summary and drop the first `cut` messages of `state`.
+        Messages appended after `state` was loaded are kept.
+
+        Returns:
+            bool: False, with nothing changed, if the session was compacted since
+            `state` was loaded.
+        """
+
+    @abstractmethod
+    async def stats(self) -> Dict[str, Any]:
+        """
+        Backend statistics.
+        """
+
+
+def _text_bytes(message: BaseMessage) -> int:
+    return len(str(message.content).encode("utf-8"))
+
+
+class _MemorySession:
+    """
+    Mutable session record of the in-memory backend.
+    """
+
+    def __init__(self):
+        self.messages: List[BaseMessage] = []
+        self.summary = ""
+        self.version = 0
+        self.size_bytes = 0
+        self.last_access = time.monotonic()
+
+    def measure(self) -> int:
+        self.size_bytes = len(self.summary.encode("utf-8")) + sum(_text_bytes(m) for m in self.messages)
+        return self.size_bytes
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Bounded in-process session store with LRU, idle-TTL and memory-cap eviction.
+
+    Args:
+        max_entries (int): Maximum number of sessions.
+        idle_ttl (float): Seconds an unused session is kept.
+        max_bytes (int): Maximum total bytes across all sessions.
+        max_messages (int): Messages kept per session.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CHAT_MEMORY_MAX_ENTRIES,
+        idle_ttl: float = CHAT_MEMORY_IDLE_TTL,
+        max_bytes: int = CHAT_MEMORY_MAX_BYTES,
+        max_messages: int = CHAT_SESSION_MAX_MESSAGES,
+    ):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        self._sessions: "OrderedDict[str, _MemorySession]" = OrderedDict()
+        self._bytes = 0
+        self.evictions = {"lru": 0, "idle": 0, "memory": 0}
+
+    def _get(self, visitor_id: str) -> _MemorySession:
+        now = time.monotonic()
+        self._expire(now)
+        session = self._sessions.get(visitor_id)
+        if session is None:
+            session = _MemorySession()
+            self._sessions[visitor_id] = session
+            while len(self._sessions) > self.max_entries:
+                self._evict_oldest("lru")
+        else:
+            self._sessions.move_to_end(visitor_id)
+        session.last_access = now
+        return session
+
+    def _update_size(self, visitor_id: str, session: _MemorySession):
+        # The session being updated is evicted last
+        self._bytes -= session.size_bytes
+        self._bytes += session.measure()
+        while self._bytes > self.max_bytes and len(self._sessions) > 1:
+            if next(iter(self._sessions)) == visitor_id:
+                self._sessions.move_to_end(visitor_id)
+            self._evict_oldest("memory")
+
+    def _evict_oldest(self, reason: str):
+        _, session = self._sessions.popitem(last=False)
+        self._bytes -= session.size_bytes
+        self.evictions[reason] += 1
+
+    def _expire(self, now: float):
+        # Sessions are ordered by last use, so idle ones sit at the front
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_access < self.idle_ttl:
+                break
+            self._evict_oldest("idle")
+
+    async def load(self, visitor_id: str) -> ChatState:
+        session = self._get(visitor_id)
+        return ChatState(list(session.messages), session.summary, version=session.version)
+
+    async def append(self, visitor_id: str, messages: List[BaseMessage]):
+        session = self._get(visitor_id)
+        session.messages.extend(messages)
+        del session.messages[:-self.max_messages]
+        self._update_size(visitor_id, session)
+
+    async def compact(self, visitor_id: str, state: ChatState, cut: int, summary: str) -> bool:
+        session = self._sessions.get(visitor_id)
+        if session is None or session.version != state.version:
+            return False
+        # Appends only ever add to the end, so the snapshot's prefix is still the prefix
+        compacted = set(map(id, state.messages[:cut]))
+        session.messages = [m for m in session.messages if id(m) not in compacted]
+        session.summary = summary
+        session.version += 1
+        self._update_size(visitor_id, session)
+        return True
+
+    async def stats(self) -> Dict[str, Any]:
+        self._expire(time.monotonic())
+        return {
+            "backend": "memory",
+            "entries": len(self._sessions),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": dict(self.evictions),
+        }
+
+
+_MESSAGE_TYPES = {"human": HumanMessage, "ai": AIMessage}
+
+
+class MongoSessionStore(SessionStore):
+    """
+    Shared session store in the `chat_sessions` Mongo collection.
+
+    Document shape:
+        {"_id": visitor_id, "summary": str, "version": int, "updated_at": datetime,
+         "messages": [{"id": ObjectId, "type": "human" | "ai", "content": str}, ...]}
+
+    Args:
+        db: MongoDB async database.
+        max_messages (int): Messages kept per visitor (older ones are sliced off).
+        idle_ttl (float): Seconds after the last update before a session expires.
+    """
+
+    def __init__(self, db, max_messages: int = CHAT_SESSION_MAX_MESSAGES, idle_ttl: float = CHAT_MEMORY_IDLE_TTL):
+        self.db = db
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+
+    async def ensure_indexes(self):
+        await self.db.chat_sessions.create_index("updated_at", expireAfterSeconds=int(self.idle_ttl))
+
+    async def load(self, visitor_id: str) -> ChatState:
+        doc = await self.db.chat_sessions.find_one({"_id": visitor_id})
+        if doc is None:
+            return ChatState()
+        stored = doc.get("messages", [])
+        return ChatState(
+            [_MESSAGE_TYPES[m["type"]](content=m["content"]) for m in stored],
+            doc.get("summary", ""),
+            [m["id"] for m in stored],
+            doc.get("version", 0),
+        )
+
+    async def append(self, visitor_id: str, messages: List[BaseMessage]):
+        entries = [{"id": ObjectId(), "type": m.type, "content": m.content} for m in messages]
+        await self.db.chat_sessions.update_one(
+            {"_id": visitor_id},
+            {
+                "$push": {"messages": {"$each": entries, "$slice": -self.max_messages}},
+                "$set": {"updated_at": datetime.now(timezone.utc)},
+                "$setOnInsert": {"summary": "", "version": 0},
+            },
+            upsert=True,
+        )
+
+    async def compact(self, visitor_id: str, state: ChatState, cut: int, summary: str) -> bool:
+        # Sessions stored before compactions were versioned have no `version` field
+        version = state.version or {"$in": [0, None]}
+        result = await self.db.chat_sessions.update_one(
+            {"_id": visitor_id, "version": version},
+            {
+                "$pull": {"messages": {"id": {"$in": state.message_ids[:cut]}}},
+                "$set": {"summary": summary, "updated_at": datetime.now(timezone.utc)},
+                "$inc": {"version": 1},
+            },
+        )
+        return result.modified_count > 0
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "mongo",
+            "entries": await self.db.chat_sessions.estimated_document_count(),
+            "max_messages": self.max_messages,
+        }
+
+
+def create_session_store(backend: str = CHAT_SESSION_BACKEND) -> SessionStore:
+    """
+    Build the session store selected by `CHAT_SESSION_BACKEND`.
+
+    Args:
+        backend (str): "memory" or "mongo".
+
+    Returns:
+        SessionStore: The configured backend.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    if backend == "memory":
+        return InMemorySessionStore()
+    if backend == "mongo":
+        from app.database import db
+        return MongoSessionStore(db)
+    raise ValueError(f"Unsupported CHAT_SESSION_BACKEND: {backend}")
+
+
+# Shared chat session store
+session_store = create_session_store()
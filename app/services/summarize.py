@@ -1,14 +1,307 @@
+"""
+Summarization Service Module
+
+This module generates summaries through the configured LLM provider.
+
+Features:
+- Short inputs are summarized with a single provider call
+- Long documents use map-reduce: the text is split into token-sized, overlapping
+  chunks, chunks are summarized concurrently with a bounded fan-out, and the partial
+  summaries are combined through a hierarchical reduce
+- Every provider call is awaited asynchronously inside an admission slot, within the
+  API key's client-side rate limits; provider rate limits are retried with backoff
+  and surface as 429 with Retry-After (app.services.rate_limiter)
+- `stream_summary` yields summary text as the provider streams tokens
+- Every provider call is recorded in app.services.metrics (latency, time to first
+  token, token usage, errors)
+- Requests listing fallback providers have every call (map, reduce, final and the
+  stream up to its first token) hedged and failed over by app.services.provider_router;
+  a `ProviderTrace` tells the caller whether a fallback provider answered any of them
+- `provider: "extractive"` summarizes in-process by selecting key sentences, and
+  `prepass_tokens` uses the same engine to shorten long inputs before an LLM call
+  (app.services.extractive); extractive requests never need map-reduce
+- The input is cleaned before summarization (whitespace, running headers and footers,
+  hyphenation; app.utils.text_preprocess) so fewer tokens reach the provider
+
+Configuration (environment variables):
+    LONG_DOCUMENT_THRESHOLD_TOKENS: Estimated input size above which "auto" mode
+        switches to map-reduce (default 12000).
+
+Usage:
+    trace = ProviderTrace()
+    summary = await summarize_with_langchain(data, deadline, trace)
+    async for delta in stream_summary(data, deadline, trace):
+        ...
+    if not trace.fallback:
+        ...  # the request's own provider produced the summary
+"""
+
+import asyncio
 import logging
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
 from langchain.schema import SystemMessage, HumanMessage
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 from fastapi import HTTPException
-from app.schemas.models import SummarizeRequest
-from app.services.llm_providers import llm_provider
+from app.schemas.models import ProviderConfig, SummarizeRequest
+from app.services.llm_providers import llm_client, chunk_text
+from app.services.extractive import extract_summary
+from app.services.admission import admission, remaining
+from app.services.metrics import observe_llm
+from app.services.provider_router import candidates, provider_router
+from app.services.rate_limiter import is_rate_limited, rate_limit_error, rate_limiter
+from app.utils.text_preprocess import THREAD_MIN_CHARS, preprocess_text
+from app.utils.tokens import count_tokens, estimate_message_tokens, estimate_tokens
+
+LONG_DOCUMENT_THRESHOLD_TOKENS = int(os.getenv("LONG_DOCUMENT_THRESHOLD_TOKENS", "12000"))
+
+DEFAULT_PROMPT = "You are a helpful summarizer."
+MAP_PROMPT = (
+    "You are summarizing part {index} of {total} of a longer document. "
+    "Summarize this part on its own, keeping key facts, names and figures."
+)
+COMBINE_PROMPT = (
+    "The following are summaries of consecutive parts of one document. "
+    "Combine them into a single coherent summary, keeping key facts, names and figures."
+)
+
+
+class ProviderTrace:
+    """
+    Records which providers answered the calls of one summarization.
+
+    Attributes:
+        fallback (bool): A fallback provider (directly or by winning a hedge) answered
+            at least one call, so the summary is not the request's own provider's output.
+    """
+
+    def __init__(self):
+        self.fallback = False
+
+    def record(self, configs: List[ProviderConfig], served_by: ProviderConfig):
+        if served_by is not configs[0]:
+            self.fallback = True
+
+
+def use_map_reduce(data: SummarizeRequest, text: str) -> bool:
+    """
+    Decide whether a request should be summarized with map-reduce.
+    """
+    if data.provider.lower() == "extractive":
+        # Ranks the whole document at once, whatever its length
+        return False
+    if data.mode == "auto":
+        return estimate_tokens(text) > LONG_DOCUMENT_THRESHOLD_TOKENS
+    return data.mode == "map_reduce"
+
+
+def split_text(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """
+    Split text into chunks of at most `chunk_size` tokens with `chunk_overlap` tokens of overlap.
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=count_tokens,
+    )
+    return splitter.split_text(text)
+
+
+def _group_by_tokens(parts: List[str], budget: int) -> List[List[str]]:
+    """
+    Pack consecutive parts into groups of at most `budget` tokens.
+
+    Every group holds at least two parts (when available) so each reduce round
+    is guaranteed to shrink the number of parts.
+    """
+    groups: List[List[str]] = []
+    current: List[str] = []
+    used = 0
+    for part in parts:
+        size = count_tokens(part)
+        if current and used + size > budget and len(current) >= 2:
+            groups.append(current)
+            current, used = [], 0
+        current.append(part)
+        used += size
+    if current:
+        if len(current) == 1 and groups:
+            groups[-1].append(current[0])
+        else:
+            groups.append(current)
+    return groups
 
-async def summarize_with_langchain(data: SummarizeRequest) -> str:
+
+async def _gather_bounded(calls: List[Awaitable[str]], limit: int) -> List[str]:
+    """
+    Await calls with at most `limit` running at once, cancelling the rest on the first failure.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(call: Awaitable[str]) -> str:
+        async with semaphore:
+            return await call
+
+    tasks = [asyncio.ensure_future(run(call)) for call in calls]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def _messages(prompt: str, text: str) -> list:
+    """
+    Build the system + human message pair sent to the provider.
+    """
+    messages = [
+        SystemMessage(content=prompt),
+        HumanMessage(content=text),
+    ]
+
+    # Debug: log message types and contents
+    logging.debug("Messages sent to LLM:")
+    for i, msg in enumerate(messages):
+        logging.debug(f"Message {i}: Type={type(msg)}, Content={repr(msg.content)}")
+    return messages
+
+
+def _llm_error(data: ProviderConfig, e: Exception) -> HTTPException:
+    """
+    Map a provider call failure to the HTTP error returned to the client.
+    """
+    if is_rate_limited(e):
+        logging.warning(f"LLM call to {data.provider}/{data.model} stayed rate limited after retries.")
+        return rate_limit_error(e)
+    if isinstance(e, asyncio.TimeoutError):
+        logging.error(f"LLM call to {data.provider}/{data.model} exceeded its deadline.")
+        return HTTPException(status_code=504, detail="AI API request timed out.")
+    if isinstance(e, AttributeError):
+        logging.error(f"AttributeError: {e}. This usually means message format is wrong.")
+        return HTTPException(status_code=500, detail="Internal Server Error: message format issue.")
+    logging.error(f"Unexpected error from LLM: {e}")
+    return HTTPException(status_code=500, detail=f"AI API request failed: {str(e)}")
+
+
+async def _invoke(
+    data: SummarizeRequest,
+    prompt: str,
+    text: str,
+    deadline: Optional[float],
+    trace: ProviderTrace,
+    operation: str = "summarize",
+) -> str:
+    """
+    Run one provider call inside an admission slot, mapping failures to HTTP errors.
+
+    Requests with fallback providers are routed through app.services.provider_router.
+    """
+    messages = _messages(prompt, text)
+
+    prompt_tokens = estimate_message_tokens(messages)
+
+    async def attempt(config: ProviderConfig) -> str:
+        async with llm_client(config) as llm:
+
+            async def call_once():
+                async with admission.slot(config.provider, config.model, deadline):
+                    async with observe_llm(config.provider, config.model, operation) as call:
+                        response = await asyncio.wait_for(llm.ainvoke(messages), remaining(deadline))
+                        call.usage(response)
+                        return response
+
+            try:
+                response = await rate_limiter.run(config, prompt_tokens, deadline, call_once)
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise _llm_error(config, e) from e
+        return response.content
+
+    configs = candidates(data)
+    config, text = await provider_router.call(configs, attempt, hedge=data.routing == "hedged")
+    trace.record(configs, config)
+    return text
+
+
+async def _reduce_to_final(
+    data: SummarizeRequest, text: str, deadline: Optional[float], trace: ProviderTrace
+) -> Tuple[str, str]:
+    """
+    Run the map and intermediate reduce rounds of a long document.
+
+    Returns:
+        tuple: The system prompt and content for the final summarization call.
+    """
+    prompt = data.prompt or DEFAULT_PROMPT
+    chunks = await asyncio.to_thread(split_text, text, data.chunk_size, data.chunk_overlap)
+    if len(chunks) <= 1:
+        return prompt, text
+
+    logging.info(f"Map-reduce summarization over {len(chunks)} chunks")
+    total = len(chunks)
+    partials = await _gather_bounded(
+        [
+            _invoke(data, MAP_PROMPT.format(index=i + 1, total=total), chunk, deadline, trace, "summarize_map")
+            for i, chunk in enumerate(chunks)
+        ],
+        data.max_concurrency,
+    )
+
+    # Hierarchical reduce until the partial summaries fit in a single call
+    while True:
+        groups = await asyncio.to_thread(_group_by_tokens, partials, data.chunk_size)
+        if len(groups) == 1:
+            break
+        partials = await _gather_bounded(
+            [_invoke(data, COMBINE_PROMPT, "\n\n".join(group), deadline, trace, "summarize_reduce") for group in groups],
+            data.max_concurrency,
+        )
+
+    return f"{prompt}\n\n{COMBINE_PROMPT}", "\n\n".join(partials)
+
+
+async def _prepare(data: SummarizeRequest, deadline: Optional[float], trace: ProviderTrace) -> Tuple[str, str]:
+    """
+    Validate the input and resolve the system prompt and content of the final call.
+    """
+    text = data.text.strip()
+    if not text:
+        raise HTTPException(status_code=400, detail="Text is empty.")
+
+    if len(text) > THREAD_MIN_CHARS:
+        cleaned, report = await asyncio.to_thread(preprocess_text, text, data.preprocess)
+    else:
+        cleaned, report = preprocess_text(text, data.preprocess)
+    if report["tokens_before"]:
+        logging.debug("Preprocessing: %s -> %s tokens", report["tokens_before"], report["tokens_after"])
+    # A text made only of removable lines is still summarized as given
+    text = cleaned.strip() or text
+
+    if data.prepass_tokens and data.provider.lower() != "extractive" and estimate_tokens(text) > data.prepass_tokens:
+        shortened = await asyncio.to_thread(extract_summary, text, max_tokens=data.prepass_tokens)
+        logging.info(f"Extractive prepass: {estimate_tokens(text)} -> {estimate_tokens(shortened)} tokens")
+        text = shortened
+
+    if use_map_reduce(data, text):
+        return await _reduce_to_final(data, text, deadline, trace)
+    return data.prompt or DEFAULT_PROMPT, text
+
+
+async def summarize_with_langchain(
+    data: SummarizeRequest, deadline: Optional[float] = None, trace: Optional[ProviderTrace] = None
+) -> str:
 
     """
     Generate a summary of the given text using specified AI provider.
 
+    The provider call is awaited asynchronously and runs inside an admission
+    slot for the provider/model pair, so slow providers cannot stall the event loop
+    or accumulate unbounded in-flight work. Long documents are summarized with
+    map-reduce (see module docstring).
+
     Args:
         data (SummarizeRequest): Input data containing:
             - text (str): Text to summarize. Must not be empty.
@@ -19,38 +312,102 @@ async def summarize_with_langchain(data: SummarizeRequest) -> str:
             - api_url (str, optional): API endpoint URL (for Azure).
             - temperature (float): Sampling temperature (0 to 1).
             - api_version (str, optional): API version (for Azure).
+            - mode, chunk_size, chunk_overlap, max_concurrency: Long-document settings.
+        deadline (float, optional): Absolute `time.monotonic()` deadline for the call.
+        trace (ProviderTrace, optional): Updated with whether a fallback provider answered.
 
     Returns:
         str: Generated summary text.
 
     Raises:
-        HTTPException: If input text is empty, provider is unsupported, or API call fails.
+        HTTPException: If input text is empty, provider is unsupported, the request
+            is rejected by admission control, the deadline expires, or API call fails.
     """
 
-    text = data.text.strip()
-    if not text:
-        raise HTTPException(status_code=400, detail="Text is empty.")
+    trace = trace or ProviderTrace()
+    prompt, content = await _prepare(data, deadline, trace)
+    return await _invoke(data, prompt, content, deadline, trace)
 
-    prompt = data.prompt or "You are a helpful summarizer."
-    messages = [
-        SystemMessage(content=prompt),
-        HumanMessage(content=text),
-    ]
 
-    # Debug: log message types and contents
-    logging.info("Messages sent to LLM:")
-    for i, msg in enumerate(messages):
-        logging.info(f"Message {i}: Type={type(msg)}, Content={repr(msg.content)}")
+async def stream_summary(
+    data: SummarizeRequest, deadline: Optional[float] = None, trace: Optional[ProviderTrace] = None
+) -> AsyncIterator[str]:
+    """
+    Generate a summary and yield its text incrementally as the provider produces tokens.
+
+    Long documents run their map and intermediate reduce rounds first; only the final
+    combine call is streamed. The admission slot is held for the whole stream.
+
+    Args:
+        data (SummarizeRequest): Same input as `summarize_with_langchain`.
+        deadline (float, optional): Absolute `time.monotonic()` deadline for the stream.
+        trace (ProviderTrace, optional): Updated with whether a fallback provider answered.
 
-    llm = llm_provider(data)
+    Yields:
+        str: Successive pieces of summary text.
 
-    # Call agenerate once for all providers
+    Raises:
+        HTTPException: Under the same conditions as `summarize_with_langchain`.
+    """
+    trace = trace or ProviderTrace()
+    prompt, content = await _prepare(data, deadline, trace)
+    messages = _messages(prompt, content)
+    configs = candidates(data)
+    deltas = provider_router.stream(
+        configs, lambda config: _stream_one(config, messages, deadline), hedge=data.routing == "hedged"
+    )
     try:
-        response = llm.invoke(messages)
-        return response.content
-    except AttributeError as e:
-        logging.error(f"AttributeError: {e}. This usually means message format is wrong.")
-        raise HTTPException(status_code=500, detail="Internal Server Error: message format issue.")
-    except Exception as e:
-        logging.error(f"Unexpected error from LLM: {e}")
-        raise HTTPException(status_code=500, detail=f"AI API request failed: {str(e)}")
+        async for config, delta in deltas:
+            trace.record(configs, config)
+            yield delta
+    finally:
+        await deltas.aclose()
+
+
+async def _stream_in_slot(
+    config: ProviderConfig,
+    deadline: Optional[float],
+    open_stream: Callable[[], AsyncIterator[Any]],
+) -> AsyncIterator[Any]:
+    """
+    A provider stream that takes its admission slot when first iterated and holds it
+    until the stream is exhausted or closed.
+    """
+    async with admission.slot(config.provider, config.model, deadline):
+        stream = open_stream()
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+
+async def _stream_one(config: ProviderConfig, messages: list, deadline: Optional[float]) -> AsyncIterator[str]:
+    """
+    Stream one provider's reply; the admission slot is held for the whole stream.
+    """
+    async with llm_client(config) as llm, observe_llm(config.provider, config.model, "summarize_stream") as call:
+        stream = None
+        try:
+            # As in `_invoke`, the quota wait happens before the admission slot is taken
+            stream, chunk = await rate_limiter.open_stream(
+                config, estimate_message_tokens(messages), deadline,
+                lambda: _stream_in_slot(config, deadline, lambda: llm.astream(messages)),
+            )
+            while chunk is not None:
+                call.usage(chunk)
+                delta = chunk_text(chunk)
+                if delta:
+                    call.first_token()
+                    yield delta
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), remaining(deadline))
+                except StopAsyncIteration:
+                    break
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise _llm_error(config, e) from e
+        finally:
+            if stream is not None:
+                await stream.aclose()
@@ -0,0 +1,208 @@
+"""
+Summary Archive Module
+
+This module maintains the storage of the `summaries` collection.
+
+Features:
+- `compress_existing`: migration that compresses the texts of records written
+  before compression (and adds their history previews), in `_id` order and
+  resumable
+- `archive_older_than`: retention policy that moves records older than N days to
+  the `summaries_archive` collection, keeping the summary and metadata but not the
+  input text (archived records leave the history search index)
+- `retention_loop`: runs the retention policy periodically when
+  `SUMMARY_RETENTION_DAYS` is set (started from the app lifespan)
+- Both report the bytes saved
+
+Configuration (environment variables):
+    SUMMARY_RETENTION_DAYS: Archive records older than this many days (default 0, off).
+    SUMMARY_ARCHIVE_INTERVAL: Seconds between retention runs (default 3600).
+
+Usage:
+    python -m app.services.summary_archive compress [--batch 200]
+    python -m app.services.summary_archive archive --days 90 [--batch 500]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.services.history_search import history_index
+from app.services.summary_store import (
+    ARCHIVE_COLLECTION,
+    COMPRESSED_FIELDS,
+    compress_record,
+    decode_record,
+    preview_fields,
+)
+from app.services.write_behind import write_behind
+
+SUMMARY_RETENTION_DAYS = int(os.getenv("SUMMARY_RETENTION_DAYS", "0"))
+SUMMARY_ARCHIVE_INTERVAL = float(os.getenv("SUMMARY_ARCHIVE_INTERVAL", "3600"))
+
+# Fields of a record kept in the archive
+ARCHIVED_FIELDS = (
+    "visitor_id",
+    "summary_text",
+    "summary_preview",
+    "summary_length",
+    "input_preview",
+    "input_length",
+    "model",
+    "provider",
+    "prompt",
+    "temperature",
+    "status",
+    "created_at",
+)
+
+
+def _text_bytes(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, bytes):
+        return len(value)
+    return 0
+
+
+def _migrate(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fields to set on a stored record: compressed texts, and previews if missing.
+    """
+    stored = compress_record(doc)
+    update = {field: stored[field] for field in COMPRESSED_FIELDS if stored.get(field) is not doc.get(field)}
+    if "summary_preview" not in doc:
+        decoded = decode_record(dict(doc))
+        update.update(preview_fields(decoded.get("input_text"), decoded.get("summary_text")))
+    return update
+
+
+async def compress_existing(db, batch_size: int = 200) -> Dict[str, int]:
+    """
+    Compress the uncompressed texts of stored summary records.
+
+    Records are walked in `_id` order in batches; already compressed fields are
+    skipped, so the migration can be interrupted and run again.
+
+    Returns:
+        dict: Records scanned and updated, text bytes before and after.
+    """
+    stats = {"scanned": 0, "updated": 0, "bytes_before": 0, "bytes_after": 0}
+    projection = {field: 1 for field in COMPRESSED_FIELDS + ("summary_preview",)}
+    last_id = None
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        docs = await db.summaries.find(query, projection).sort("_id", 1).limit(batch_size).to_list(None)
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+        updates = await asyncio.to_thread(lambda: [_migrate(doc) for doc in docs])
+
+        ops = []
+        for doc, update in zip(docs, updates):
+            before = sum(_text_bytes(doc.get(field)) for field in COMPRESSED_FIELDS)
+            after = sum(_text_bytes(update.get(field, doc.get(field))) for field in COMPRESSED_FIELDS)
+            stats["bytes_before"] += before
+            stats["bytes_after"] += after
+            if update:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+        stats["scanned"] += len(docs)
+        if ops:
+            await db.summaries.bulk_write(ops, ordered=False)
+            stats["updated"] += len(ops)
+        logging.info(f"Compressed {stats['updated']} of {stats['scanned']} summary records so far")
+    stats["saved_bytes"] = stats["bytes_before"] - stats["bytes_after"]
+    return stats
+
+
+async def archive_older_than(db, days: int, batch_size: int = 500) -> Dict[str, int]:
+    """
+    Move records older than `days` days to the archive collection, without their input text.
+
+    Each batch is copied before it is deleted, so an interrupted run loses nothing;
+    records already copied by an earlier run are not duplicated.
+
+    Returns:
+        dict: Records archived and the bytes of input text dropped.
+    """
+    # Buffered inserts must land first, or they would be stored after the archiving
+    await write_behind.flush()
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    projection = {field: 1 for field in ARCHIVED_FIELDS + ("input_text",)}
+    stats = {"archived": 0, "saved_bytes": 0}
+    while True:
+        docs = await db.summaries.find({"created_at": {"$lt": cutoff}}, projection).limit(batch_size).to_list(None)
+        if not docs:
+            break
+        archived: List[Dict[str, Any]] = []
+        for doc in docs:
+            if "summary_preview" not in doc:
+                decoded = decode_record(dict(doc))
+                doc.update(preview_fields(decoded.get("input_text"), decoded.get("summary_text")))
+            stats["saved_bytes"] += _text_bytes(doc.pop("input_text", None))
+            doc["archived_at"] = datetime.now(timezone.utc)
+            archived.append(doc)
+        archived = await asyncio.to_thread(lambda: [compress_record(doc) for doc in archived])
+        try:
+            await db[ARCHIVE_COLLECTION].insert_many(archived, ordered=False)
+        except BulkWriteError as e:
+            # Duplicate keys are records copied by an interrupted run
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+        await db.summaries.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+        for doc in docs:
+            history_index.remove(doc.get("visitor_id"), [doc["_id"]])
+        stats["archived"] += len(docs)
+    return stats
+
+
+async def ensure_indexes(db):
+    """
+    Index the archive for per-visitor lookups and deletion.
+    """
+    await db[ARCHIVE_COLLECTION].create_index([("visitor_id", 1), ("created_at", -1)])
+
+
+async def retention_loop(db, days: int = SUMMARY_RETENTION_DAYS, interval: float = SUMMARY_ARCHIVE_INTERVAL):
+    """
+    Apply the retention policy every `interval` seconds. Returns at once when disabled.
+    """
+    if days <= 0:
+        return
+    while True:
+        try:
+            stats = await archive_older_than(db, days)
+            if stats["archived"]:
+                logging.info(f"Archived {stats['archived']} summaries older than {days} days, saved {stats['saved_bytes']} bytes")
+        except Exception as e:
+            logging.error(f"Summary retention run failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress or archive stored summary records.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compress = commands.add_parser("compress", help="Compress texts of existing records")
+    compress.add_argument("--batch", type=int, default=200)
+    archive = commands.add_parser("archive", help="Move old records to the archive collection")
+    archive.add_argument("--days", type=int, default=SUMMARY_RETENTION_DAYS or 90)
+    archive.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    from app.database import db
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "compress":
+        stats = asyncio.run(compress_existing(db, args.batch))
+    else:
+        stats = asyncio.run(archive_older_than(db, args.days, args.batch))
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Summary Cache Module
+
+This module provides a content-addressed, two-tier cache of generated summaries
+so identical documents are not sent to the LLM provider again.
+
+Features:
+- Keys are SHA-256 digests of the whitespace-normalized text, the effective prompt,
+  provider, model, endpoint URL, temperature, preprocessing steps and pre-pass budget
+- Tier 1: in-process LRU bounded by entry count and total summary bytes
+- Tier 2: the `summary_cache` Mongo collection, expired by a TTL index on `created_at`
+- Mongo hits are promoted into the in-process tier
+
+Configuration (environment variables):
+    SUMMARY_CACHE_MAX_ENTRIES: Maximum in-process entries (default 1024).
+    SUMMARY_CACHE_MAX_BYTES: Maximum in-process summary bytes (default 16 MiB).
+    SUMMARY_CACHE_TTL: Seconds a cached summary is kept in Mongo (default 7 days).
+
+Usage:
+    key = cache_key(data)
+    summary = await summary_cache.get(db, key)
+    if summary is None:
+        summary = await summarize_with_langchain(data)
+        await summary_cache.put(db, key, summary, data)
+"""
+
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from app.schemas.models import SummarizeRequest
+from app.services.summarize import DEFAULT_PROMPT
+from app.utils.text_preprocess import parse_steps
+
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "1024"))
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv("SUMMARY_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", str(7 * 24 * 3600)))
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapse runs of whitespace so formatting-only differences share a cache entry.
+    """
+    return " ".join(text.split())
+
+
+def cache_key(data: SummarizeRequest) -> str:
+    """
+    Compute the content-addressed cache key of a summarization request.
+
+    Args:
+        data (SummarizeRequest): The summarization request.
+
+    Returns:
+        str: Hex SHA-256 digest identifying the request's expected output.
+    """
+    digest = hashlib.sha256()
+    for part in (
+        normalize_text(data.text),
+        data.prompt or DEFAULT_PROMPT,
+        (data.provider or "").lower(),
+        data.model,
+        data.api_url or "",
+        repr(data.temperature),
+        ",".join(parse_steps(data.preprocess)),
+        repr(data.prepass_tokens),
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class SummaryCache:
+    """
+    Two-tier summary cache: in-process LRU backed by a Mongo TTL collection.
+
+    Args:
+        max_entries (int): Maximum number of in-process entries.
+        max_bytes (int): Maximum total size of in-process summaries in bytes.
+        ttl (int): Seconds a summary is kept in the Mongo tier.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SUMMARY_CACHE_MAX_ENTRIES,
+        max_bytes: int = SUMMARY_CACHE_MAX_BYTES,
+        ttl: int = SUMMARY_CACHE_TTL,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._bytes = 0
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+
+    async def ensure_indexes(self, db):
+        """
+        Create the TTL index that expires entries of the Mongo tier.
+        """
+        await db.summary_cache.create_index("created_at", expireAfterSeconds=self.ttl)
+
+    def _remember(self, key: str, summary: str):
+        size = len(summary.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous.encode("utf-8"))
+        self._entries[key] = summary
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted.encode("utf-8"))
+
+    async def get(self, db, key: str) -> Optional[str]:
+        """
+        Look up a cached summary, checking the in-process tier before Mongo.
+
+        Args:
+            db: MongoDB async database.
+            key (str): Key from `cache_key`.
+
+        Returns:
+            str or None: The cached summary, or None on a miss.
+        """
+        summary = self._entries.get(key)
+        if summary is not None:
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            return summary
+
+        try:
+            doc = await db.summary_cache.find_one({"_id": key}, {"summary_text": 1})
+        except Exception as e:
+            logging.warning(f"Summary cache lookup failed: {e}")
+            doc = None
+        if doc is None:
+            self.misses += 1
+            return None
+
+        self.mongo_hits += 1
+        self._remember(key, doc["summary_text"])
+        return doc["summary_text"]
+
+    async def put(self, db, key: str, summary: str, data: SummarizeRequest):
+        """
+        Store a summary in both tiers.
+
+        Args:
+            db: MongoDB async database.
+            key (str): Key from `cache_key`.
+            summary (str): Generated summary text.
+            data (SummarizeRequest): The originating request (for provider/model metadata).
+        """
+        self._remember(key, summary)
+        try:
+            await db.summary_cache.replace_one(
+                {"_id": key},
+                {
+                    "summary_text": summary,
+                    "provider": data.provider,
+                    "model": data.model,
+                    "created_at": datetime.now(timezone.utc),
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            logging.warning(f"Summary cache write failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """
+        In-process occupancy and hit/miss counters.
+        """
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "memory_hits": self.memory_hits,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+        }
+
+
+# Shared summary cache instance
+summary_cache = SummaryCache()
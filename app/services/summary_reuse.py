@@ -0,0 +1,94 @@
+"""
+Summary Reuse Module
+
+This module decides whether a summarization request can be answered with a
+previously generated summary, combining the exact-match summary cache with the
+near-duplicate index.
+
+Lookup order:
+1. Exact content-addressed cache (in-process LRU, then Mongo)
+2. Near-duplicate index (MinHash/LSH over the request text)
+
+Requests with `no_cache` set skip both lookups and are not remembered. Summaries
+answered by a fallback provider (see `ProviderTrace` in app.services.summarize) are
+not remembered either, since they are keyed by the request's own provider and model.
+
+Usage:
+    lookup = await find_reusable_summary(db, data)
+    if lookup.summary is None:
+        trace = ProviderTrace()
+        summary = await summarize_with_langchain(data, trace=trace)
+        ...
+        if not trace.fallback:
+            await remember_summary(db, data, lookup, summary, record["_id"])
+"""
+
+from dataclasses import dataclass
+from typing import Any, Optional
+import numpy as np
+from app.schemas.models import SummarizeRequest
+from app.services.summary_cache import summary_cache, cache_key
+from app.services.near_duplicate import near_duplicate_index
+
+
+@dataclass
+class ReuseLookup:
+    """
+    Result of a reuse lookup.
+
+    Attributes:
+        key (str, optional): Exact cache key, None when caching is bypassed.
+        signature (np.ndarray, optional): MinHash signature of the request text.
+        summary (str, optional): Reusable summary, None on a miss.
+        source (str, optional): "exact" or "near_duplicate" when a summary was found.
+    """
+    key: Optional[str] = None
+    signature: Optional[np.ndarray] = None
+    summary: Optional[str] = None
+    source: Optional[str] = None
+
+
+async def find_reusable_summary(db, data: SummarizeRequest) -> ReuseLookup:
+    """
+    Look up a previously generated summary for the request.
+
+    Args:
+        db: MongoDB async database.
+        data (SummarizeRequest): Incoming request.
+
+    Returns:
+        ReuseLookup: The lookup state, with `summary` set on a hit.
+    """
+    if data.no_cache:
+        return ReuseLookup()
+
+    lookup = ReuseLookup(key=cache_key(data))
+    lookup.summary = await summary_cache.get(db, lookup.key)
+    if lookup.summary is not None:
+        lookup.source = "exact"
+        return lookup
+
+    lookup.signature = await near_duplicate_index.signature_async(data.text)
+    lookup.summary = await near_duplicate_index.find(db, data, lookup.signature)
+    if lookup.summary is not None:
+        lookup.source = "near_duplicate"
+        await summary_cache.put(db, lookup.key, lookup.summary, data)
+    return lookup
+
+
+async def remember_summary(db, data: SummarizeRequest, lookup: ReuseLookup, summary: str, summary_id: Any):
+    """
+    Make a freshly generated summary reusable by later requests.
+
+    Args:
+        db: MongoDB async database.
+        data (SummarizeRequest): Request the summary was generated for.
+        lookup (ReuseLookup): Lookup state returned by `find_reusable_summary`.
+        summary (str): Generated summary text.
+        summary_id: `_id` of the stored `summaries` record.
+    """
+    if lookup.key is None:
+        return
+    await summary_cache.put(db, lookup.key, summary, data)
+    if lookup.signature is not None:
+        near_duplicate_index.add(summary_id, data, lookup.signature)
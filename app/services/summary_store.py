@@ -0,0 +1,355 @@
+"""
+Summary Store Module
+
+This module centralizes how summarization results are recorded in the
+`summaries` collection, so every endpoint that produces a summary writes
+the same record shape.
+
+Records get their `_id` when they are built, and are written through the
+write-behind buffer, so the response does not wait for the insert unless the
+caller asks for strict (read-your-write) persistence.
+
+History reads never load full texts: records store short previews and lengths of
+the input and summary, history pages project only those, and pages are walked
+with a keyset cursor over (created_at, _id) backed by compound indexes. Records
+written before previews existed get them on first read.
+
+Long `input_text` and `summary_text` values are stored zlib-compressed (see
+app.utils.text_compression) when the record is written; `decode_record` restores
+them on read. Bytes saved on the write path are reported by `storage_stats()`.
+
+Saved records are added to the history search index (app.services.history_search).
+
+Configuration (environment variables):
+    HISTORY_PREVIEW_CHARS: Characters kept in input/summary previews (default 280).
+    HISTORY_MAX_LIMIT: Maximum records per history page (default 100).
+    TEXT_COMPRESSION, TEXT_COMPRESS_MIN_BYTES, TEXT_COMPRESS_LEVEL:
+        See app/utils/text_compression.py.
+
+Functions:
+    build_summary_record(visitor_id, data, summary_text, **extra) -> dict:
+        Builds the document stored for one summarization.
+    save_summary(db, record, strict=False) -> None:
+        Persists a summary record.
+    compress_record(record) -> dict:
+        The record with its long texts compressed, as stored.
+    decode_record(doc) -> dict:
+        Restores the texts of a stored record.
+    ensure_indexes(db) -> None:
+        Creates the history indexes. Called at app startup.
+    history_page(db, visitor_id, limit, cursor) -> (list, str | None):
+        One page of history previews and the cursor of the next page.
+    summary_previews(db, summary_ids) -> list:
+        History previews of the given records (e.g. search results), in order.
+    get_summary(db, summary_id, visitor_id=None) -> dict | None:
+        A full summary record.
+
+Usage:
+    record = build_summary_record(visitor_id, data, summary_text)
+    await save_summary(db, record)
+    items, next_cursor = await history_page(db, visitor_id, limit=20, cursor=None)
+"""
+
+import asyncio
+import base64
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import InsertOne, UpdateOne
+from app.schemas.models import SummarizeRequest
+from app.services.history_search import history_index
+from app.services.write_behind import write_behind
+from app.utils.text_compression import compress_text, decompress_text
+from app.utils.text_preprocess import parse_steps
+
+HISTORY_PREVIEW_CHARS = int(os.getenv("HISTORY_PREVIEW_CHARS", "280"))
+HISTORY_MAX_LIMIT = int(os.getenv("HISTORY_MAX_LIMIT", "100"))
+
+COMPRESSED_FIELDS = ("input_text", "summary_text")
+
+# Old records keep only their summary here (see app.services.summary_archive)
+ARCHIVE_COLLECTION = "summaries_archive"
+
+# Records larger than this are compressed in a worker thread
+_INLINE_COMPRESS_BYTES = 64 * 1024
+
+_storage = {"records": 0, "raw_bytes": 0, "stored_bytes": 0}
+
+# Fields returned for history pages; full texts are fetched by id
+HISTORY_PROJECTION = {
+    "visitor_id": 1,
+    "input_preview": 1,
+    "input_length": 1,
+    "summary_preview": 1,
+    "summary_length": 1,
+    "model": 1,
+    "provider": 1,
+    "prompt": 1,
+    "temperature": 1,
+    "status": 1,
+    "created_at": 1,
+}
+
+
+def _preview(text: Optional[str]) -> str:
+    text = text or ""
+    if len(text) <= HISTORY_PREVIEW_CHARS:
+        return text
+    return text[:HISTORY_PREVIEW_CHARS].rstrip() + "…"
+
+
+def preview_fields(input_text: Optional[str], summary_text: Optional[str]) -> Dict[str, Any]:
+    return {
+        "input_preview": _preview(input_text),
+        "input_length": len(input_text or ""),
+        "summary_preview": _preview(summary_text),
+        "summary_length": len(summary_text or ""),
+    }
+
+
+def build_summary_record(visitor_id: str, data: SummarizeRequest, summary_text: str, **extra: Any) -> Dict[str, Any]:
+    """
+    Build the database record for a generated summary.
+
+    Args:
+        visitor_id (str): Visitor the summary belongs to.
+        data (SummarizeRequest): The originating request.
+        summary_text (str): Generated summary text.
+        **extra: Additional fields to store (e.g. stream status).
+
+    Returns:
+        dict: Document ready to be inserted into `summaries`.
+    """
+    return {
+        "_id": ObjectId(),
+        "visitor_id": visitor_id,
+        "input_text": data.text,
+        "summary_text": summary_text,
+        "model": data.model,
+        "provider": data.provider,
+        "api_url": data.api_url,
+        "prompt": data.prompt,
+        "temperature": data.temperature,
+        "preprocess": list(parse_steps(data.preprocess)),
+        "prepass_tokens": data.prepass_tokens,
+        "created_at": datetime.now(timezone.utc),
+        **preview_fields(data.text, summary_text),
+        **extra,
+    }
+
+
+def compress_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return a copy of the record with its long text fields compressed.
+
+    Fields that are already compressed are left alone, so this is safe to apply
+    to stored records (e.g. by the migration in app.services.summary_archive).
+    """
+    stored = dict(record)
+    raw_total = stored_total = 0
+    for field in COMPRESSED_FIELDS:
+        value = stored.get(field)
+        if isinstance(value, str):
+            stored[field], raw, size = compress_text(value)
+            raw_total += raw
+            stored_total += size
+    _storage["records"] += 1
+    _storage["raw_bytes"] += raw_total
+    _storage["stored_bytes"] += stored_total
+    return stored
+
+
+async def compress_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Compress records for storage, off the event loop when they are large.
+    """
+    size = sum(len(record.get(field) or "") for record in records for field in COMPRESSED_FIELDS)
+    if size > _INLINE_COMPRESS_BYTES:
+        return await asyncio.to_thread(lambda: [compress_record(record) for record in records])
+    return [compress_record(record) for record in records]
+
+
+def decode_record(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Restore the compressed text fields of a stored record, in place.
+    """
+    for field in COMPRESSED_FIELDS:
+        if field in doc:
+            doc[field] = decompress_text(doc[field])
+    return doc
+
+
+def storage_stats() -> Dict[str, Any]:
+    """
+    Text bytes written by this process before and after compression.
+    """
+    return {
+        **_storage,
+        "saved_bytes": _storage["raw_bytes"] - _storage["stored_bytes"],
+    }
+
+
+async def save_summary(db, record: Dict[str, Any], strict: bool = False) -> None:
+    """
+    Queue a summary record for insertion into the `summaries` collection.
+
+    Args:
+        db: MongoDB async database.
+        record (dict): Document built by `build_summary_record`. It is not modified;
+            the stored copy has its long texts compressed.
+        strict (bool): Wait until the record is stored, so it is visible to the
+            next read (e.g. the history page the client opens next).
+    """
+    [stored] = await compress_records([record])
+    await write_behind.write(db, "summaries", InsertOne(stored), strict=strict)
+    await history_index.add_records([record])
+
+
+async def ensure_indexes(db):
+    """
+    Create the indexes serving history pages (per visitor and global) in cursor order.
+    """
+    await db.summaries.create_index([("visitor_id", 1), ("created_at", -1), ("_id", -1)])
+    await db.summaries.create_index([("created_at", -1), ("_id", -1)])
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Motor returns naive UTC datetimes unless the client is tz-aware
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    """
+    Opaque cursor pointing after `doc` in (created_at, _id) descending order.
+    """
+    millis = int(_as_utc(doc["created_at"]).timestamp() * 1000)
+    raw = f"{millis}:{doc['_id']}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """
+    Decode a cursor from `encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        millis, oid = raw.split(":", 1)
+        return datetime.fromtimestamp(int(millis) / 1000, tz=timezone.utc), ObjectId(oid)
+    except (ValueError, InvalidId, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+async def _backfill_previews(db, docs: List[Dict[str, Any]]):
+    """
+    Add previews to records stored before they existed, and store them for next time.
+    """
+    missing = [doc["_id"] for doc in docs if "summary_preview" not in doc]
+    if not missing:
+        return
+    texts = {}
+    async for full in db.summaries.find({"_id": {"$in": missing}}, {"input_text": 1, "summary_text": 1}):
+        decode_record(full)
+        texts[full["_id"]] = preview_fields(full.get("input_text"), full.get("summary_text"))
+    updates = []
+    for doc in docs:
+        fields = texts.get(doc["_id"])
+        if fields is not None and "summary_preview" not in doc:
+            doc.update(fields)
+            updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+    if updates:
+        await db.summaries.bulk_write(updates, ordered=False)
+
+
+async def history_page(
+    db,
+    visitor_id: Optional[str],
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Read one page of history, newest first.
+
+    Args:
+        db: MongoDB async database.
+        visitor_id (str, optional): Only records of this visitor.
+        limit (int): Records per page (capped at `HISTORY_MAX_LIMIT`).
+        cursor (str, optional): `next_cursor` of the previous page.
+
+    Returns:
+        tuple: (records with previews, cursor of the next page or None).
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+    query: Dict[str, Any] = {"visitor_id": visitor_id} if visitor_id else {}
+    if cursor:
+        created_at, oid = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": oid}},
+        ]
+
+    # One extra record tells whether there is a next page
+    docs = await (
+        db.summaries.find(query, HISTORY_PROJECTION)
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+        .to_list(None)
+    )
+    more = len(docs) > limit
+    docs = docs[:limit]
+    await _backfill_previews(db, docs)
+
+    next_cursor = encode_cursor(docs[-1]) if more else None
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    return docs, next_cursor
+
+
+async def summary_previews(db, summary_ids: List[Any]) -> List[Dict[str, Any]]:
+    """
+    History previews of the given records, in the given order. Missing records are skipped.
+    """
+    docs = await db.summaries.find({"_id": {"$in": summary_ids}}, HISTORY_PROJECTION).to_list(None)
+    await _backfill_previews(db, docs)
+    by_id = {doc["_id"]: doc for doc in docs}
+    previews = []
+    for summary_id in summary_ids:
+        doc = by_id.get(summary_id)
+        if doc is not None:
+            doc["_id"] = str(doc["_id"])
+            previews.append(doc)
+    return previews
+
+
+async def get_summary(db, summary_id: str, visitor_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Read a full summary record, optionally only if it belongs to `visitor_id`.
+
+    Records moved to the archive are returned with `"archived": True` and without
+    their input text.
+
+    Returns:
+        dict or None: The record with its full input and summary texts.
+    """
+    try:
+        query: Dict[str, Any] = {"_id": ObjectId(summary_id)}
+    except InvalidId:
+        return None
+    if visitor_id:
+        query["visitor_id"] = visitor_id
+    doc = await db.summaries.find_one(query)
+    if doc is None:
+        doc = await db[ARCHIVE_COLLECTION].find_one(query)
+        if doc is not None:
+            doc["archived"] = True
+    if doc is not None:
+        decode_record(doc)
+        doc["_id"] = str(doc["_id"])
+    return doc
@@ -0,0 +1,254 @@
+"""
+Visitor Statistics Module
+
+This module keeps visitor counts cheap to read.
+
+Features:
+- `VisitorCounter`: the total unique-visitor count served from memory. The stored
+  `global` counter is re-read at most every `VISITOR_COUNT_TTL` seconds (one
+  refresh at a time), and visitors inserted by this process are added immediately.
+  The stored counter is reconciled against the `visitor` collection every
+  `VISITOR_COUNT_RECONCILE_INTERVAL` seconds, and soon after an increment fails.
+- `HyperLogLog`: fixed-size (4 KiB) approximate distinct counter, ~1.6% standard error
+- `UniqueVisitorWindows`: one HyperLogLog per UTC day. Visits update the sketch in
+  memory; changed registers are persisted to the `visitor_hll` collection with
+  `$max`, so sketches from several workers merge in Mongo. Daily/weekly unique
+  visitors are estimated by merging day sketches, without scanning `visitor`.
+
+Configuration (environment variables):
+    VISITOR_COUNT_TTL: Seconds the cached unique-visitor count is served (default 5).
+    VISITOR_COUNT_RECONCILE_INTERVAL: Seconds between recounts of the visitor
+        collection; 0 disables them (default 3600).
+    VISITOR_HLL_RETENTION_DAYS: Days a daily sketch is kept (default 90).
+
+Usage:
+    count = await visitor_counter.get(db)
+    asyncio.create_task(visitor_counter.reconcile_loop(db))
+    unique_windows.record(visitor_id)
+    await unique_windows.persist(db)
+    estimate = await unique_windows.estimate(db, days=7)
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+VISITOR_COUNT_TTL = float(os.getenv("VISITOR_COUNT_TTL", "5"))
+VISITOR_COUNT_RECONCILE_INTERVAL = float(os.getenv("VISITOR_COUNT_RECONCILE_INTERVAL", "3600"))
+VISITOR_HLL_RETENTION_DAYS = int(os.getenv("VISITOR_HLL_RETENTION_DAYS", "90"))
+
+HLL_PRECISION = 12
+
+
+class VisitorCounter:
+    """
+    In-process cache of the stored unique-visitor count.
+
+    Args:
+        ttl (float): Seconds a value read from Mongo is served before refreshing.
+    """
+
+    def __init__(self, ttl: float = VISITOR_COUNT_TTL):
+        self.ttl = ttl
+        self._count: Optional[int] = None
+        self._read_at = 0.0
+        self._lock = asyncio.Lock()
+        self._drifted = asyncio.Event()
+        self.reconciled = 0
+
+    def add(self, n: int):
+        """
+        Account for visitors inserted by this process before the next refresh.
+        """
+        if self._count is not None:
+            self._count += n
+
+    async def get(self, db) -> int:
+        """
+        Return the unique-visitor count, refreshing it from Mongo when stale.
+        """
+        if self._count is not None and time.monotonic() - self._read_at < self.ttl:
+            return self._count
+        async with self._lock:
+            # Another request may have refreshed while this one waited
+            if self._count is None or time.monotonic() - self._read_at >= self.ttl:
+                doc = await db.visitor.find_one({"_id": "global"}, {"count": 1})
+                self._count = doc["count"] if doc else 0
+                self._read_at = time.monotonic()
+        return self._count
+
+    def mark_drifted(self):
+        """
+        Ask the reconcile loop to recount soon (e.g. after a failed increment).
+        """
+        self._drifted.set()
+
+    async def reconcile(self, db) -> int:
+        """
+        Set the stored count to the number of visitor documents.
+
+        Increments flushed while the recount runs may be counted twice or not at
+        all; the next reconcile corrects them.
+        """
+        count = await db.visitor.count_documents({"_id": {"$ne": "global"}})
+        await db.visitor.update_one({"_id": "global"}, {"$set": {"count": count}}, upsert=True)
+        self._count = count
+        self._read_at = time.monotonic()
+        self.reconciled += 1
+        return count
+
+    async def reconcile_loop(self, db, interval: float = VISITOR_COUNT_RECONCILE_INTERVAL):
+        """
+        Reconcile every `interval` seconds, or sooner when marked drifted. Returns at once when disabled.
+        """
+        if interval <= 0:
+            return
+        while True:
+            try:
+                await asyncio.wait_for(self._drifted.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.reconcile(db)
+                self._drifted.clear()
+            except Exception as e:
+                logging.warning(f"Visitor count reconcile failed: {e}")
+                await asyncio.sleep(min(interval, 60))
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter with 2**precision one-byte registers.
+
+    Args:
+        precision (int): Number of index bits (4-16).
+        registers (list, optional): Initial register values.
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[List[int]] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = list(registers) if registers is not None else [0] * self.size
+
+    def add(self, item: str) -> Optional[int]:
+        """
+        Add an item. Returns the index of the register it raised, or None.
+        """
+        x = int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big")
+        index = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return index
+        return None
+
+    def merge(self, registers: Iterable[int]):
+        """
+        Merge another sketch of the same precision (register-wise maximum).
+        """
+        self.registers = [max(a, b) for a, b in zip(self.registers, registers)]
+
+    def estimate(self) -> int:
+        """
+        Approximate number of distinct items added.
+        """
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Small-range correction: linear counting
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+
+def _day(when: datetime) -> str:
+    return when.strftime("%Y-%m-%d")
+
+
+class UniqueVisitorWindows:
+    """
+    Daily HyperLogLog sketches of visitor ids, persisted to `visitor_hll`.
+
+    Document shape:
+        {"_id": "YYYY-MM-DD", "day": datetime, "r": {"<register>": rank, ...}}
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION, retention_days: int = VISITOR_HLL_RETENTION_DAYS):
+        self.precision = precision
+        self.retention_days = retention_days
+        self._sketches: Dict[str, HyperLogLog] = {}
+        self._dirty: Dict[str, Set[int]] = {}
+
+    async def ensure_indexes(self, db):
+        """
+        Expire day sketches after the retention period.
+        """
+        await db.visitor_hll.create_index("day", expireAfterSeconds=self.retention_days * 24 * 3600)
+
+    def record(self, visitor_id: str, when: Optional[datetime] = None):
+        """
+        Count a visit in the sketch of its UTC day (in memory).
+        """
+        day = _day(when or datetime.now(timezone.utc))
+        sketch = self._sketches.get(day)
+        if sketch is None:
+            sketch = self._sketches[day] = HyperLogLog(self.precision)
+            # Only today's and yesterday's sketches receive visits
+            for old in sorted(self._sketches)[:-2]:
+                if not self._dirty.get(old):
+                    del self._sketches[old]
+        index = sketch.add(visitor_id)
+        if index is not None:
+            self._dirty.setdefault(day, set()).add(index)
+
+    async def persist(self, db):
+        """
+        Write registers raised since the last call, merging with other workers via `$max`.
+        """
+        dirty, self._dirty = self._dirty, {}
+        for day, indexes in dirty.items():
+            if not indexes:
+                continue
+            registers = self._sketches[day].registers
+            try:
+                await db.visitor_hll.update_one(
+                    {"_id": day},
+                    {
+                        "$max": {f"r.{i}": registers[i] for i in indexes},
+                        "$setOnInsert": {"day": datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc)},
+                    },
+                    upsert=True,
+                )
+            except Exception:
+                # Retried with the next persist
+                self._dirty.setdefault(day, set()).update(indexes)
+                raise
+
+    async def estimate(self, db, days: int = 1) -> int:
+        """
+        Approximate unique visitors over the last `days` UTC days, today included.
+        """
+        today = datetime.now(timezone.utc)
+        wanted = [_day(today - timedelta(days=n)) for n in range(days)]
+        merged = HyperLogLog(self.precision)
+        async for doc in db.visitor_hll.find({"_id": {"$in": wanted}}, {"r": 1}):
+            registers = [0] * merged.size
+            for index, rank in doc.get("r", {}).items():
+                registers[int(index)] = rank
+            merged.merge(registers)
+        for day in wanted:
+            if day in self._sketches:
+                merged.merge(self._sketches[day].registers)
+        return merged.estimate()
+
+
+# Shared visitor statistics
+visitor_counter = VisitorCounter()
+unique_windows = UniqueVisitorWindows()
@@ -0,0 +1,294 @@
+"""
+Write-Behind Buffer Module
+
+This module takes Mongo writes that do not have to be visible immediately off the
+request path. Writes are buffered per collection and flushed in the background
+with a single unordered `bulk_write` per collection.
+
+Features:
+- Flushes when a collection has `WRITE_BEHIND_BATCH` pending writes, or every
+  `WRITE_BEHIND_INTERVAL` seconds
+- Writes sharing a coalescing key (e.g. repeated visits of one visitor) replace
+  each other, so only the latest is sent
+- Flush callbacks receive the `BulkWriteResult` (e.g. to count upserted documents)
+- Backpressure: once `WRITE_BEHIND_MAX_PENDING` writes are buffered, writers flush
+  inline instead of growing the buffer
+- Strict mode for callers that need read-your-write: the write is flushed, with
+  everything buffered before it, before the call returns
+- Writes that fail with a transient error (connection, timeout, write concern or a
+  retryable server error) are kept for the next flush (within the pending limit);
+  rejected writes are logged and dropped
+- Flushed on shutdown from the app lifespan, retrying transient errors a few times
+  and logging how many writes were lost; writes go straight to Mongo when the
+  background flusher is not running
+
+Configuration (environment variables):
+    WRITE_BEHIND_BATCH: Pending writes per collection that trigger a flush (default 500).
+    WRITE_BEHIND_INTERVAL: Maximum seconds a write stays buffered (default 0.5).
+    WRITE_BEHIND_MAX_PENDING: Buffered writes before writers must wait (default 10000).
+
+Usage:
+    await write_behind.write(db, "summaries", InsertOne(record))
+    await write_behind.write(db, "visitor", UpdateOne(...), key=visitor_id, strict=True)
+"""
+
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from pymongo.errors import (
+    BulkWriteError,
+    ConnectionFailure,
+    ExecutionTimeout,
+    PyMongoError,
+    WriteConcernError,
+    WTimeoutError,
+)
+from pymongo.results import BulkWriteResult
+
+WRITE_BEHIND_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", "500"))
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "0.5"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+
+FlushCallback = Callable[[Any, Any], Awaitable[None]]
+
+# Flushes attempted at shutdown before the remaining writes are given up
+_STOP_ATTEMPTS = 4
+_STOP_RETRY_DELAY = 0.5
+
+
+def _is_transient(e: Exception) -> bool:
+    """
+    Whether a failed flush may succeed if retried unchanged.
+    """
+    if isinstance(e, (ConnectionFailure, ExecutionTimeout, WriteConcernError, WTimeoutError)):
+        return True
+    return isinstance(e, PyMongoError) and (
+        e.has_error_label("RetryableWriteError") or e.has_error_label("TransientTransactionError")
+    )
+
+
+class _Pending:
+    """
+    Buffered writes of one collection. Unkeyed writes get a unique key.
+    """
+
+    def __init__(self, db, collection: str):
+        self.db = db
+        self.collection = collection
+        self.ops: "OrderedDict[Any, Any]" = OrderedDict()
+        self.seq = 0
+
+
+class WriteBehindBuffer:
+    """
+    Per-collection write buffer flushed with `bulk_write`.
+
+    Args:
+        batch (int): Pending writes per collection that trigger a flush.
+        interval (float): Maximum seconds a write stays buffered.
+        max_pending (int): Total buffered writes before writers flush inline.
+    """
+
+    def __init__(
+        self,
+        batch: int = WRITE_BEHIND_BATCH,
+        interval: float = WRITE_BEHIND_INTERVAL,
+        max_pending: int = WRITE_BEHIND_MAX_PENDING,
+    ):
+        self.batch = batch
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: Dict[Tuple[int, str], _Pending] = {}
+        self._callbacks: Dict[str, List[FlushCallback]] = {}
+        self._lock = asyncio.Lock()
+        self._kick = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.written = 0
+        self.failed = 0
+        self.inline_flushes = 0
+
+    def on_flush(self, collection: str, callback: FlushCallback):
+        """
+        Register `callback(db, result)` to run after each flush of `collection`.
+        """
+        self._callbacks.setdefault(collection, []).append(callback)
+
+    @property
+    def pending(self) -> int:
+        return sum(len(p.ops) for p in self._pending.values())
+
+    async def write(self, db, collection: str, op, key: Any = None, strict: bool = False):
+        """
+        Buffer a write.
+
+        Args:
+            db: MongoDB async database.
+            collection (str): Target collection.
+            op: A pymongo write model (InsertOne, UpdateOne, ...).
+            key (optional): Coalescing key; a pending write with the same key is replaced.
+            strict (bool): Return only once the write is stored (read-your-write).
+                Errors of a strict write are raised to the caller.
+
+        Returns:
+            BulkWriteResult or None: The result of a write made immediately, None when buffered.
+        """
+        if strict or self._task is None:
+            return await self._write_through(db, collection, op, key)
+
+        pending = self._pending.get((id(db), collection))
+        if pending is None:
+            pending = self._pending[(id(db), collection)] = _Pending(db, collection)
+        if key is None:
+            pending.seq += 1
+            key = ("_seq", pending.seq)
+        else:
+            pending.ops.pop(key, None)
+        pending.ops[key] = op
+
+        if self.pending >= self.max_pending:
+            # Backpressure: the writer pays for the flush instead of growing the buffer
+            self.inline_flushes += 1
+            await self.flush()
+        elif len(pending.ops) >= self.batch:
+            self._kick.set()
+
+    async def _write_through(self, db, collection: str, op, key: Any) -> BulkWriteResult:
+        """
+        Write immediately, after the writes already buffered for the collection.
+        """
+        async with self._lock:
+            pending = self._pending.pop((id(db), collection), None)
+            if pending is not None:
+                if key is not None:
+                    # Superseded by this write
+                    pending.ops.pop(key, None)
+                if pending.ops:
+                    await self._flush_one(pending)
+            result = await db[collection].bulk_write([op])
+            self.written += 1
+            await self._after_flush(db, collection, result)
+            return result
+
+    async def _after_flush(self, db, collection: str, result):
+        for callback in self._callbacks.get(collection, []):
+            try:
+                await callback(db, result)
+            except Exception as e:
+                logging.error(f"Write-behind callback for {collection} failed: {e}")
+
+    async def flush(self):
+        """
+        Write every buffered operation. Safe to call concurrently.
+        """
+        async with self._lock:
+            batches, self._pending = self._pending, {}
+            for pending in batches.values():
+                if pending.ops:
+                    await self._flush_one(pending)
+
+    async def _flush_one(self, pending: _Pending):
+        ops = list(pending.ops.values())
+        rejected = 0
+        try:
+            result = await pending.db[pending.collection].bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            rejected = len(errors)
+            self.failed += rejected
+            logging.error(f"Write-behind flush of {pending.collection} rejected {rejected} writes: {errors[:3]}")
+            # The other writes were applied; report them to callbacks as usual
+            result = BulkWriteResult(e.details, acknowledged=True)
+        except Exception as e:
+            if _is_transient(e):
+                logging.warning(f"Write-behind flush of {pending.collection} failed, will retry: {e}")
+                self._requeue(pending)
+                return
+            self.failed += len(ops)
+            logging.error(f"Write-behind flush of {pending.collection} failed, dropped {len(ops)} writes: {e}")
+            return
+
+        self.flushes += 1
+        self.written += len(ops) - rejected
+        await self._after_flush(pending.db, pending.collection, result)
+
+    def _requeue(self, pending: _Pending):
+        """
+        Put the writes of a failed flush back in front of newer ones, up to the pending limit.
+        """
+        current = self._pending.get((id(pending.db), pending.collection))
+        if current is not None:
+            for key, op in current.ops.items():
+                pending.ops.pop(key, None)
+                pending.ops[key] = op
+            pending.seq = max(pending.seq, current.seq)
+        while len(pending.ops) > self.max_pending:
+            pending.ops.popitem(last=False)
+            self.failed += 1
+        self._pending[(id(pending.db), pending.collection)] = pending
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._kick.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._kick.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Write-behind flush failed: {e}")
+
+    def start(self):
+        """
+        Start the background flusher. Called at app startup.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop the background flusher and flush what is left. Called at app shutdown.
+
+        Writes re-queued by transient errors are retried a few times with backoff;
+        whatever is still buffered after that is dropped and logged.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for attempt in range(_STOP_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(_STOP_RETRY_DELAY * 2 ** (attempt - 1))
+            await self.flush()
+            if not self.pending:
+                return
+        lost = self.pending
+        self._pending = {}
+        self.failed += lost
+        logging.error(f"Write-behind stopped with {lost} writes that could not be stored")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Buffered writes and flush counters.
+        """
+        return {
+            "pending": self.pending,
+            "flushes": self.flushes,
+            "written": self.written,
+            "failed": self.failed,
+            "inline_flushes": self.inline_flushes,
+        }
+
+
+# Shared write-behind buffer
+write_behind = WriteBehindBuffer()
+
+
+def is_strict(consistency: Optional[str]) -> bool:
+    """
+    Whether a request opted into read-your-write via the `X-Consistency: strict` header.
+    """
+    return (consistency or "").lower() == "strict"
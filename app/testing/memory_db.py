@@ -0,0 +1,35 @@
+"""
+In-process MongoDB stand-in for benchmarks and offline development.
+
+Imported by app.database only when MONGODB_URI is "memory://". Requires
+mongomock-motor from requirements-dev.txt.
+
+Functions:
+    memory_client() -> AsyncMongoMockClient:
+        A fresh in-memory client with motor's async interface.
+"""
+
+import mongomock.collection
+from mongomock_motor import AsyncMongoMockClient
+
+
+def _accept_update_sort():
+    """
+    mongomock does not accept the `sort` option newer pymongo versions pass for UpdateOne.
+    """
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+    if "sort" in add_update.__code__.co_varnames:
+        return
+
+    def add_update_without_sort(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+
+    mongomock.collection.BulkOperationBuilder.add_update = add_update_without_sort
+
+
+def memory_client() -> AsyncMongoMockClient:
+    """
+    In-process MongoDB stand-in with motor's async interface.
+    """
+    _accept_update_sort()
+    return AsyncMongoMockClient()
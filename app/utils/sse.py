@@ -0,0 +1,35 @@
+"""
+sse.py
+
+This module provides helpers for formatting Server-Sent Events (SSE) frames
+returned by streaming endpoints.
+
+Functions:
+    sse_event(data: dict, event: str = None) -> str:
+        Formats a JSON payload as a single SSE frame.
+"""
+
+import json
+from typing import Any, Dict, Optional
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # Disable proxy buffering (nginx and similar)
+}
+
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """
+    Format a JSON payload as a Server-Sent Events frame.
+
+    Args:
+        data (dict): JSON-serializable payload placed on the `data:` line.
+        event (str, optional): Event name; omitted frames default to "message".
+
+    Returns:
+        str: The encoded frame, terminated by a blank line.
+    """
+    frame = f"data: {json.dumps(data, default=str)}\n\n"
+    if event:
+        frame = f"event: {event}\n{frame}"
+    return frame
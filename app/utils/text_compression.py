@@ -0,0 +1,57 @@
+"""
+text_compression.py
+
+This module compresses long text fields for storage in MongoDB.
+
+Compressed values are stored as BSON binary (zlib streams) in place of the string,
+so a field's type tells whether it is compressed and readers need no extra marker.
+Short texts, and texts that do not shrink, are kept as plain strings.
+
+Configuration (environment variables):
+    TEXT_COMPRESSION: "zlib" (default) or "none" to store new texts uncompressed.
+    TEXT_COMPRESS_MIN_BYTES: Texts shorter than this are stored as-is (default 1024).
+    TEXT_COMPRESS_LEVEL: zlib compression level, 1-9 (default 6).
+
+Functions:
+    compress_text(text: str) -> (str | Binary, int, int):
+        Returns the value to store, and the raw and stored sizes in bytes.
+    decompress_text(value) -> str:
+        Returns the text of a stored value, compressed or not.
+"""
+
+import os
+import zlib
+from typing import Optional, Tuple, Union
+from bson.binary import Binary
+
+TEXT_COMPRESSION = os.getenv("TEXT_COMPRESSION", "zlib").lower()
+TEXT_COMPRESS_MIN_BYTES = int(os.getenv("TEXT_COMPRESS_MIN_BYTES", "1024"))
+TEXT_COMPRESS_LEVEL = int(os.getenv("TEXT_COMPRESS_LEVEL", "6"))
+
+
+def compress_text(text: str) -> Tuple[Union[str, Binary], int, int]:
+    """
+    Compress a text for storage when it is long enough to benefit.
+
+    Args:
+        text (str): Text to store.
+
+    Returns:
+        tuple: (value to store, raw size in bytes, stored size in bytes).
+    """
+    raw = text.encode("utf-8")
+    if TEXT_COMPRESSION != "zlib" or len(raw) < TEXT_COMPRESS_MIN_BYTES:
+        return text, len(raw), len(raw)
+    packed = zlib.compress(raw, TEXT_COMPRESS_LEVEL)
+    if len(packed) >= len(raw):
+        return text, len(raw), len(raw)
+    return Binary(packed), len(raw), len(packed)
+
+
+def decompress_text(value: Optional[Union[str, bytes]]) -> Optional[str]:
+    """
+    Return the text of a stored value, decompressing binary values.
+    """
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode("utf-8")
+    return value
@@ -0,0 +1,372 @@
+"""
+text_preprocess.py
+
+This module removes text that costs prompt tokens without carrying content before a
+document is sent to the LLM: layout whitespace, page headers and footers, page
+numbers, hyphenation breaks and (optionally) boilerplate lines.
+
+Steps (each can be enabled on its own; applied in this order per page):
+- "whitespace": collapse runs of spaces and tabs, strip invisible characters, trim
+  lines and collapse blank lines.
+- "repeated_lines": drop lines repeating across pages near the page edges (running
+  headers and footers, with digits ignored so "Page 3 of 40" matches "Page 4 of 40"),
+  and bare page numbers at the page edges.
+- "hyphenation": rejoin words broken across lines ("exam-" + "ple" -> "example").
+- "boilerplate": drop copyright and confidentiality notices, "intentionally left blank"
+  pages, table-of-contents dot leaders and lines holding only a URL. Off by default.
+
+Processing is streaming and linear in the text size: pages are pushed one at a time
+and released after a window of `PREPROCESS_REPEAT_WINDOW` pages, which is what the
+repeated-line detection needs to see a line recur. Text without page structure
+(plain text without form feeds) is processed in blocks of `PREPROCESS_BLOCK_LINES`
+lines; without page edges to look at, only explicit "Page N" labels are removed from
+it, since repetition alone does not tell a header from a refrain in the text.
+
+Every run reports tokens before and after, and per step the characters removed and
+an estimate of the tokens saved.
+
+Configuration (environment variables):
+    PREPROCESS_STEPS: Steps applied when a request does not choose, comma-separated, or
+        "none" (default "whitespace,repeated_lines,hyphenation").
+    PREPROCESS_REPEAT_MIN_PAGES: Pages a line must appear on to be a header/footer (default 3).
+    PREPROCESS_REPEAT_RATIO: Share of the pages seen it must appear on (default 0.3).
+    PREPROCESS_REPEAT_WINDOW: Pages held back before release (default 8).
+    PREPROCESS_EDGE_LINES: Lines at the top and bottom of a page checked (default 3).
+    PREPROCESS_BLOCK_LINES: Lines per block for text without page breaks (default 60).
+
+Functions:
+    parse_steps(spec) -> Tuple[str, ...]:
+        Validates a step selection ("whitespace,hyphenation", a list, None for the default).
+    preprocess_text(text, steps=None) -> Tuple[str, dict]:
+        Cleans a whole text and returns it with the report.
+    preprocess_pages(pages, preprocessor) -> AsyncIterator[Tuple[int, str]]:
+        Cleans an async stream of (page number, text) pairs.
+    preprocess_stats() -> dict:
+        Totals over every document processed by this process.
+"""
+
+import asyncio
+import os
+import re
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from app.utils.tokens import CHARS_PER_TOKEN, count_tokens
+
+PREPROCESS_STEPS = os.getenv("PREPROCESS_STEPS", "whitespace,repeated_lines,hyphenation")
+PREPROCESS_REPEAT_MIN_PAGES = int(os.getenv("PREPROCESS_REPEAT_MIN_PAGES", "3"))
+PREPROCESS_REPEAT_RATIO = float(os.getenv("PREPROCESS_REPEAT_RATIO", "0.3"))
+PREPROCESS_REPEAT_WINDOW = int(os.getenv("PREPROCESS_REPEAT_WINDOW", "8"))
+PREPROCESS_EDGE_LINES = int(os.getenv("PREPROCESS_EDGE_LINES", "3"))
+PREPROCESS_BLOCK_LINES = int(os.getenv("PREPROCESS_BLOCK_LINES", "60"))
+
+STEPS = ("whitespace", "repeated_lines", "hyphenation", "boilerplate")
+
+# Header/footer candidates longer than this are treated as body text
+MAX_REPEATED_LINE_CHARS = 120
+# Pages longer than this are processed in a worker thread by `preprocess_pages`
+THREAD_MIN_CHARS = 64 * 1024
+# Distinct candidate lines tracked before single sightings are forgotten
+MAX_TRACKED_LINES = 100_000
+
+_SPACES = re.compile(r"[ \t\u00a0\u2000-\u200a\u202f\u205f\u3000]+")
+_INVISIBLE = re.compile(r"[\u00ad\u200b-\u200d\u2060\ufeff\x00-\x08\x0b\x0e-\x1f\x7f]")
+_DIGITS = re.compile(r"\d+")
+_LETTERS = re.compile(r"[^\W\d_]")
+_PAGE_NUMBER = re.compile(r"^[\W_]*(?:page\s*)?\d{1,5}(?:\s*(?:of|/)\s*\d{1,5})?[\W_]*$", re.IGNORECASE)
+_PAGE_LABEL = re.compile(r"^[\W_]*page\s*\d{1,5}(?:\s*(?:of|/)\s*\d{1,5})?[\W_]*$", re.IGNORECASE)
+_HYPHENATED = re.compile(r"[^\W\d_]-$")
+_BOILERPLATE = re.compile(
+    r"^(?:"
+    r".*(?:\u00a9|\(c\)\s*\d{4}|copyright\s+(?:\u00a9\s*)?\d{4}|all rights reserved).*"
+    r"|.*(?:confidential|proprietary)(?:\s+(?:and|&)\s+(?:confidential|proprietary))?(?:\s+information)?\W*"
+    r"|.*intentionally\s+(?:left\s+)?blank.*"
+    r"|.{0,120}?(?:\.\s?){4,}\s*\d{1,5}"
+    r"|(?:https?://|www\.)\S+"
+    r")$",
+    re.IGNORECASE,
+)
+
+_totals = {"documents": 0, "pages": 0, "tokens_before": 0, "tokens_after": 0}
+_step_totals = {step: {"lines_removed": 0, "chars_removed": 0} for step in STEPS}
+
+
+def parse_steps(spec: Union[None, str, Iterable[str]]) -> Tuple[str, ...]:
+    """
+    Validate a step selection and return it in application order.
+
+    Args:
+        spec: Comma-separated names, an iterable of names, "none"/"" for no steps,
+            or None for `PREPROCESS_STEPS`.
+
+    Raises:
+        ValueError: If a step name is unknown.
+    """
+    if spec is None:
+        spec = PREPROCESS_STEPS
+    names = [name.strip().lower() for name in (spec.split(",") if isinstance(spec, str) else spec)]
+    names = [name for name in names if name and name != "none"]
+    unknown = set(names) - set(STEPS)
+    if unknown:
+        raise ValueError(f"Unknown preprocessing steps: {', '.join(sorted(unknown))}; use {', '.join(STEPS)}")
+    return tuple(step for step in STEPS if step in names)
+
+
+def _normalize_whitespace(lines: List[str]) -> List[str]:
+    cleaned: List[str] = []
+    for line in lines:
+        line = _SPACES.sub(" ", _INVISIBLE.sub("", line)).strip()
+        if line or (cleaned and cleaned[-1]):
+            cleaned.append(line)
+    while cleaned and not cleaned[-1]:
+        cleaned.pop()
+    return cleaned
+
+
+def _repeat_key(line: str) -> Optional[str]:
+    """
+    Key under which a line is matched against other pages, or None if it cannot be a header/footer.
+    """
+    line = line.strip()
+    if not line or len(line) > MAX_REPEATED_LINE_CHARS or len(_LETTERS.findall(line)) < 3:
+        return None
+    return _SPACES.sub(" ", _DIGITS.sub("#", line.lower()))
+
+
+def _rejoin_hyphenation(lines: List[str]) -> Tuple[List[str], int]:
+    joined: List[str] = []
+    count = 0
+    for line in lines:
+        previous = joined[-1] if joined else ""
+        if previous and line[:1].islower() and _HYPHENATED.search(previous):
+            joined[-1] = previous[:-1] + line
+            count += 1
+        else:
+            joined.append(line)
+    return joined, count
+
+
+class TextPreprocessor:
+    """
+    Streaming preprocessor: push pages in order, collect the cleaned pages it releases.
+
+    Args:
+        steps: Step selection, see `parse_steps`.
+        paged (bool): Input consists of real pages, whose edges are searched for
+            headers and footers, rather than unpaged text.
+    """
+
+    def __init__(self, steps: Union[None, str, Iterable[str]] = None, paged: bool = True):
+        self.steps = parse_steps(steps)
+        self.paged = paged
+        self._pending: Deque[Tuple[int, List[str], List[Tuple[int, str]]]] = deque()
+        self._counts: Dict[str, int] = {}
+        self._seen = 0
+        self.pages = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.step_stats = {step: {"lines_removed": 0, "chars_removed": 0} for step in self.steps}
+
+    def _account(self, step: str, before: List[str], after: List[str]):
+        stats = self.step_stats[step]
+        stats["lines_removed"] += len(before) - len(after)
+        stats["chars_removed"] += sum(map(len, before)) - sum(map(len, after))
+
+    def _candidates(self, lines: List[str]) -> List[Tuple[int, str]]:
+        """
+        Positions and keys of the lines that may be headers or footers: the lines at
+        the page edges. Blocks of unpaged text have no edges and yield none.
+        """
+        if not self.paged:
+            return []
+        filled = [i for i, line in enumerate(lines) if line.strip()]
+        edge = PREPROCESS_EDGE_LINES
+        candidates = []
+        for i in filled[:edge] + [i for i in filled[-edge:] if i not in filled[:edge]]:
+            key = _repeat_key(lines[i])
+            if key is not None:
+                candidates.append((i, key))
+        return candidates
+
+    def _track(self, candidates: List[Tuple[int, str]]):
+        self._seen += 1
+        for key in {key for _, key in candidates}:
+            self._counts[key] = self._counts.get(key, 0) + 1
+        if len(self._counts) > MAX_TRACKED_LINES:
+            self._counts = {key: count for key, count in self._counts.items() if count > 1}
+
+    def _is_repeated(self, key: str) -> bool:
+        count = self._counts.get(key, 0)
+        return count >= PREPROCESS_REPEAT_MIN_PAGES and count >= PREPROCESS_REPEAT_RATIO * self._seen
+
+    def _strip_repeated(self, lines: List[str], candidates: List[Tuple[int, str]]) -> List[str]:
+        drop = {i for i, key in candidates if self._is_repeated(key)}
+        filled = [i for i, line in enumerate(lines) if line.strip()]
+        if self.paged:
+            edges = filled[:PREPROCESS_EDGE_LINES] + filled[-PREPROCESS_EDGE_LINES:]
+            drop.update(i for i in edges if _PAGE_NUMBER.match(lines[i]))
+        else:
+            # Without page boundaries only explicit "Page N" labels are page numbers
+            drop.update(i for i in filled if _PAGE_LABEL.match(lines[i]))
+        return [line for i, line in enumerate(lines) if i not in drop]
+
+    def push(self, page: int, text: str) -> List[Tuple[int, str]]:
+        """
+        Add the next page; returns the pages released, cleaned, in order.
+
+        Without page structure (`paged=False`) the text is processed in blocks of
+        `PREPROCESS_BLOCK_LINES` lines, each released as its own piece of `page`.
+        """
+        self.pages += 1
+        self.tokens_before += count_tokens(text)
+        lines = text.split("\n")
+        if self.paged:
+            units = [lines]
+        else:
+            units = [lines[i:i + PREPROCESS_BLOCK_LINES] for i in range(0, len(lines), PREPROCESS_BLOCK_LINES)]
+        released = []
+        for lines in units:
+            if "whitespace" in self.steps:
+                cleaned = _normalize_whitespace(lines)
+                self._account("whitespace", lines, cleaned)
+                lines = cleaned
+            candidates: List[Tuple[int, str]] = []
+            if "repeated_lines" in self.steps:
+                candidates = self._candidates(lines)
+                self._track(candidates)
+            self._pending.append((page, lines, candidates))
+            while len(self._pending) > PREPROCESS_REPEAT_WINDOW:
+                released.append(self._release(*self._pending.popleft()))
+        return released
+
+    def flush(self) -> List[Tuple[int, str]]:
+        """
+        Release every page still held back. Call once after the last page.
+        """
+        released = [self._release(*entry) for entry in self._pending]
+        self._pending.clear()
+        return released
+
+    def _release(self, page: int, lines: List[str], candidates: List[Tuple[int, str]]) -> Tuple[int, str]:
+        if "repeated_lines" in self.steps:
+            kept = self._strip_repeated(lines, candidates)
+            self._account("repeated_lines", lines, kept)
+            lines = kept
+        if "hyphenation" in self.steps:
+            joined, count = _rejoin_hyphenation(lines)
+            self.step_stats["hyphenation"]["lines_removed"] += count
+            self.step_stats["hyphenation"]["chars_removed"] += count
+            lines = joined
+        if "boilerplate" in self.steps:
+            kept = [line for line in lines if not _BOILERPLATE.match(line)]
+            self._account("boilerplate", lines, kept)
+            lines = kept
+        if "whitespace" in self.steps:
+            # Removed lines may leave blank lines next to each other
+            lines = _normalize_whitespace(lines)
+        text = "\n".join(lines)
+        self.tokens_after += count_tokens(text)
+        return page, text
+
+    def report(self) -> Dict[str, object]:
+        """
+        Tokens before and after, and what every step removed. Adds to the process totals.
+        """
+        steps = {
+            step: {**stats, "tokens_saved_estimate": -(-stats["chars_removed"] // CHARS_PER_TOKEN)}
+            for step, stats in self.step_stats.items()
+        }
+        return {
+            "steps": steps,
+            "pages": self.pages,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+        }
+
+    def record(self) -> Dict[str, object]:
+        """
+        Return the report and add it to the totals of `preprocess_stats`.
+        """
+        report = self.report()
+        _totals["documents"] += 1
+        _totals["pages"] += self.pages
+        _totals["tokens_before"] += self.tokens_before
+        _totals["tokens_after"] += self.tokens_after
+        for step, stats in self.step_stats.items():
+            _step_totals[step]["lines_removed"] += stats["lines_removed"]
+            _step_totals[step]["chars_removed"] += stats["chars_removed"]
+        return report
+
+
+def preprocess_text(text: str, steps: Union[None, str, Sequence[str]] = None) -> Tuple[str, Dict[str, object]]:
+    """
+    Clean a whole text.
+
+    Args:
+        text (str): Input text; form feeds mark page breaks when present.
+        steps: Step selection, see `parse_steps`.
+
+    Returns:
+        tuple: The cleaned text and the report (see `TextPreprocessor.report`).
+
+    Raises:
+        ValueError: If a step name is unknown.
+    """
+    paged = "\f" in text
+    preprocessor = TextPreprocessor(steps, paged=paged)
+    if not preprocessor.steps:
+        return text, preprocessor.report()
+    cleaned: List[str] = []
+    for number, page in enumerate(text.split("\f") if paged else [text], start=1):
+        cleaned.extend(piece for _, piece in preprocessor.push(number, page))
+    cleaned.extend(piece for _, piece in preprocessor.flush())
+    return ("\f" if paged else "\n").join(piece for piece in cleaned if piece), preprocessor.record()
+
+
+async def preprocess_pages(
+    pages: AsyncIterator[Tuple[int, str]],
+    preprocessor: TextPreprocessor,
+) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Clean a stream of (page number, text) pairs, such as `iter_pdf_pages` yields.
+
+    Pages are released `PREPROCESS_REPEAT_WINDOW` pages behind the input; the pieces
+    of one page are joined again. Read the report from `preprocessor` once the stream
+    is exhausted.
+    """
+    current: Optional[int] = None
+    pieces: List[str] = []
+
+    def merge(released: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+        nonlocal current, pieces
+        complete = []
+        for page, text in released:
+            if page != current and current is not None:
+                complete.append((current, "\n".join(piece for piece in pieces if piece)))
+                pieces = []
+            current = page
+            pieces.append(text)
+        return complete
+
+    try:
+        async for page, text in pages:
+            if len(text) > THREAD_MIN_CHARS:
+                released = await asyncio.to_thread(preprocessor.push, page, text)
+            else:
+                released = preprocessor.push(page, text)
+            for complete in merge(released):
+                yield complete
+        for complete in merge(preprocessor.flush()):
+            yield complete
+        if current is not None:
+            yield current, "\n".join(piece for piece in pieces if piece)
+        preprocessor.record()
+    finally:
+        await pages.aclose()
+
+
+def preprocess_stats() -> Dict[str, object]:
+    """
+    Documents, pages and tokens before/after over every preprocessed document, and
+    lines/characters removed per step.
+    """
+    return {**_totals, "steps": {step: dict(stats) for step, stats in _step_totals.items()}}
@@ -0,0 +1,75 @@
+"""
+tokens.py
+
+This module provides helpers for measuring text length in model tokens.
+
+Token counts use the `cl100k_base` tiktoken encoding, which is a close enough
+approximation across providers for budgeting prompt sizes. If the encoding
+cannot be loaded (e.g. no network access to fetch it), counts fall back to a
+characters-per-token estimate.
+
+Functions:
+    count_tokens(text: str) -> int:
+        Returns the number of tokens in the text.
+    estimate_tokens(text: str) -> int:
+        Returns a cheap length-based token estimate without encoding.
+    estimate_message_tokens(messages) -> int:
+        Returns the length-based estimate of a list of chat messages.
+"""
+
+import logging
+from functools import lru_cache
+
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logging.warning(f"tiktoken encoding unavailable, estimating tokens from length: {e}")
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the token count from the text length alone.
+
+    Args:
+        text (str): Text to measure.
+
+    Returns:
+        int: Approximate number of tokens.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens in the text.
+
+    Args:
+        text (str): Text to measure.
+
+    Returns:
+        int: Number of tokens, or a length-based estimate if no encoding is available.
+    """
+    encoding = _encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def estimate_message_tokens(messages) -> int:
+    """
+    Estimate the tokens of chat messages from their length alone.
+
+    Args:
+        messages (list): LangChain messages.
+
+    Returns:
+        int: Estimated number of prompt tokens.
+    """
+    return sum(estimate_tokens(str(message.content)) for message in messages)
@@ -0,0 +1,243 @@
+"""
+upload_stream.py
+
+This module receives a multipart file upload by streaming the request body,
+so uploads never have to be buffered whole in memory or copied to a shared
+file name before processing.
+
+Features:
+- Parses `multipart/form-data` incrementally as body chunks arrive
+- Enforces a maximum upload size while streaming (413 as soon as it is exceeded)
+- Computes the SHA-256 digest of the file while it streams in
+- Decodes text/plain uploads incrementally with a UTF-8 incremental decoder
+- Spools binary uploads (PDF) in memory up to a threshold, then rolls them over to a
+  uniquely named temporary file
+
+Classes:
+    Spool: Memory-then-disk buffer whose content can be handed to a worker process.
+    ReceivedUpload: Result of receiving the upload field.
+
+Functions:
+    receive_upload(request, field, max_bytes, allowed_types) -> ReceivedUpload:
+        Streams the request body and returns the received file field.
+"""
+
+import codecs
+import hashlib
+import io
+import os
+import tempfile
+import time
+from typing import Iterable, List, Optional, Union
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+UPLOAD_SPOOL_MAX_MEMORY = int(os.getenv("UPLOAD_SPOOL_MAX_MEMORY", str(4 * 1024 * 1024)))
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or None
+
+
+class Spool:
+    """
+    Buffer that keeps data in memory up to `max_memory` bytes and then rolls over to
+    a uniquely named temporary file.
+
+    Args:
+        max_memory (int): Bytes kept in memory before rolling over to disk.
+    """
+
+    def __init__(self, max_memory: int = UPLOAD_SPOOL_MAX_MEMORY):
+        self.max_memory = max_memory
+        self._buffer: Optional[io.BytesIO] = io.BytesIO()
+        self._file = None
+        self.path: Optional[str] = None
+
+    def write(self, data: bytes):
+        if self._buffer is not None and self._buffer.tell() + len(data) > self.max_memory:
+            self._file = tempfile.NamedTemporaryFile(prefix="upload-", dir=UPLOAD_TMP_DIR, delete=False)
+            self.path = self._file.name
+            self._file.write(self._buffer.getvalue())
+            self._buffer = None
+        (self._buffer or self._file).write(data)
+
+    def source(self) -> Union[bytes, str]:
+        """
+        Picklable handle on the content: the bytes while in memory, else the file path.
+        """
+        if self._buffer is not None:
+            return self._buffer.getvalue()
+        self._file.flush()
+        return self.path
+
+    def close(self):
+        """
+        Release the buffer and delete the temporary file, if any.
+        """
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        self._buffer = None
+
+
+class ReceivedUpload:
+    """
+    A file field received from a multipart upload.
+
+    Attributes:
+        filename (str): Client-supplied file name (informational only).
+        content_type (str): Declared content type of the part.
+        size (int): Bytes received.
+        digest (str): Hex SHA-256 digest of the file content.
+        elapsed (float): Seconds spent receiving the body.
+        text (str, optional): Decoded content of text/plain uploads.
+        spool (Spool, optional): Buffered content of binary uploads.
+    """
+
+    def __init__(self):
+        self.filename = ""
+        self.content_type = ""
+        self.size = 0
+        self.digest = ""
+        self.elapsed = 0.0
+        self.text: Optional[str] = None
+        self.spool: Optional[Spool] = None
+
+    def close(self):
+        if self.spool is not None:
+            self.spool.close()
+
+
+class _Receiver:
+    """
+    python-multipart callbacks capturing a single file field.
+    """
+
+    def __init__(self, field: str, max_bytes: int, allowed_types: Iterable[str]):
+        self.field = field
+        self.max_bytes = max_bytes
+        self.allowed_types = set(allowed_types)
+        self.upload = ReceivedUpload()
+        self.found = False
+        self._capturing = False
+        self._header_field = b""
+        self._header_value = b""
+        self._headers = {}
+        self._decoder = None
+        self._text: List[str] = []
+        self._hash = hashlib.sha256()
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._capturing = options.get(b"name", b"").decode("latin-1") == self.field and not self.found
+        if not self._capturing:
+            return
+        self.found = True
+        content_type, _ = parse_options_header(self._headers.get(b"content-type", b""))
+        self.upload.content_type = content_type.decode("latin-1")
+        self.upload.filename = options.get(b"filename", b"").decode("utf-8", "replace")
+        if self.upload.content_type not in self.allowed_types:
+            raise HTTPException(status_code=400, detail="Only txt and pdf files are supported.")
+        if self.upload.content_type == "text/plain":
+            self._decoder = codecs.getincrementaldecoder("utf-8")()
+        else:
+            self.upload.spool = Spool()
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if not self._capturing:
+            return
+        chunk = data[start:end]
+        self.upload.size += len(chunk)
+        if self.upload.size > self.max_bytes:
+            raise HTTPException(status_code=413, detail=f"File exceeds the maximum upload size of {self.max_bytes} bytes.")
+        self._hash.update(chunk)
+        if self._decoder is not None:
+            try:
+                self._text.append(self._decoder.decode(chunk))
+            except UnicodeDecodeError:
+                raise HTTPException(status_code=400, detail="Text file is not valid UTF-8.")
+        else:
+            self.upload.spool.write(chunk)
+
+    def on_part_end(self):
+        if self._capturing:
+            self.upload.digest = self._hash.hexdigest()
+        if self._capturing and self._decoder is not None:
+            try:
+                self._text.append(self._decoder.decode(b"", final=True))
+            except UnicodeDecodeError:
+                raise HTTPException(status_code=400, detail="Text file is not valid UTF-8.")
+            self.upload.text = "".join(self._text)
+            self._text = []
+        self._capturing = False
+
+
+async def receive_upload(request: Request, field: str, max_bytes: int, allowed_types: Iterable[str]) -> ReceivedUpload:
+    """
+    Stream a multipart request body and capture one file field.
+
+    Args:
+        request (Request): Incoming request with a `multipart/form-data` body.
+        field (str): Name of the form field holding the file.
+        max_bytes (int): Maximum accepted file size in bytes.
+        allowed_types (Iterable[str]): Accepted content types of the file part.
+
+    Returns:
+        ReceivedUpload: The received file. Call `close()` when done with it.
+
+    Raises:
+        HTTPException: 400 for malformed bodies, unsupported types or a missing field,
+            413 when the file exceeds `max_bytes`.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload.")
+
+    # Reject obviously oversized bodies before reading them
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + 64 * 1024:
+        raise HTTPException(status_code=413, detail=f"File exceeds the maximum upload size of {max_bytes} bytes.")
+
+    receiver = _Receiver(field, max_bytes, allowed_types)
+    parser = MultipartParser(boundary, {
+        "on_part_begin": receiver.on_part_begin,
+        "on_part_data": receiver.on_part_data,
+        "on_part_end": receiver.on_part_end,
+        "on_header_field": receiver.on_header_field,
+        "on_header_value": receiver.on_header_value,
+        "on_header_end": receiver.on_header_end,
+        "on_headers_finished": receiver.on_headers_finished,
+    })
+
+    started = time.monotonic()
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except HTTPException:
+        receiver.upload.close()
+        raise
+    except Exception as e:
+        receiver.upload.close()
+        raise HTTPException(status_code=400, detail=f"Malformed multipart body: {e}")
+
+    if not receiver.found:
+        raise HTTPException(status_code=400, detail=f"Missing '{field}' file field.")
+    receiver.upload.elapsed = time.monotonic() - started
+    return receiver.upload
@@ -0,0 +1,293 @@
+"""
+load_test.py
+
+Load test of the main API routes, runnable offline.
+
+By default the app runs in-process against the in-memory database
+(MONGODB_URI=memory://) and the fake LLM provider (app.services.fake_llm), so no
+provider tokens or MongoDB server are needed. With --url, a running server is
+driven over HTTP instead (it must accept the fake provider; its database is used).
+
+Scenarios:
+- summarize: POST /api/summarize with a distinct document per request
+- chat: POST /api/chat (one conversation per worker)
+- upload: POST /api/upload with a text or PDF file
+- history: GET /api/history for visitors with stored summaries
+
+For each scenario it reports throughput, p50/p95/p99 latency, errors and status
+codes, plus the peak RSS of this process (which includes the app when in-process).
+Results are written as JSON, with the git commit, so runs can be compared:
+--compare BASELINE.json prints the change of every metric against an earlier run.
+
+Usage:
+    python -m benchmarks.load_test [--scenarios summarize chat upload history]
+        [--requests 200] [--concurrency 16] [--latency-ms 200] [--tokens-per-second 400]
+        [--error-rate 0] [--upload-kind txt|pdf] [--url http://localhost:8000]
+        [--output benchmarks/results/run.json] [--compare baseline.json]
+
+Configuration (environment variables):
+    MONGODB_URI: Defaults to memory:// when running in-process.
+    ENABLE_FAKE_PROVIDER: Set for the in-process app; a server driven with --url must
+        be started with ENABLE_FAKE_PROVIDER=true.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+SCENARIOS = ("summarize", "chat", "upload", "history")
+
+WORDS = (
+    "revenue growth quarter board approved investment plan supplier contract review region "
+    "operating cost margin forecast customer product launch market share risk audit team "
+    "hiring budget travel policy security incident report roadmap delivery milestone"
+).split()
+
+
+def document(words: int) -> str:
+    """
+    Random text, so requests do not hit the summary cache or near-duplicate reuse.
+    """
+    return " ".join(random.choice(WORDS) for _ in range(words))
+
+
+def make_pdf(pages: int) -> bytes:
+    import fitz
+
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 545, 790), f"Page {number + 1}\n" + document(400), fontsize=10)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Scenario:
+    """
+    Builds the requests of one scenario.
+    """
+
+    def __init__(self, name: str, args: argparse.Namespace):
+        self.name = name
+        self.args = args
+        self.provider = {
+            "provider": "fake",
+            "model": "fake",
+            "api_key": "-",
+            "api_url": (
+                f"fake://?latency_ms={args.latency_ms}&tokens_per_second={args.tokens_per_second}"
+                f"&error_rate={args.error_rate}"
+            ),
+        }
+        self.pdf = make_pdf(args.pdf_pages) if name == "upload" and args.upload_kind == "pdf" else None
+
+    async def setup(self, client: httpx.AsyncClient, concurrency: int):
+        if self.name == "history":
+            # Give every worker's visitor a page of history to read
+            for worker in range(concurrency):
+                for _ in range(10):
+                    await client.post(
+                        "/api/summarize",
+                        json={**self.provider, "text": document(200)},
+                        headers={"X-Visitor-ID": f"bench-{worker}", "X-Consistency": "strict"},
+                    )
+
+    def request(self, client: httpx.AsyncClient, worker: int):
+        visitor = f"bench-{worker}"
+        if self.name == "summarize":
+            return client.post(
+                "/api/summarize",
+                json={**self.provider, "text": document(self.args.words)},
+                headers={"X-Visitor-ID": visitor},
+            )
+        if self.name == "chat":
+            return client.post("/api/chat", json={**self.provider, "visitor_id": visitor, "message": document(30)})
+        if self.name == "upload":
+            if self.pdf is not None:
+                files = {"file": ("bench.pdf", self.pdf, "application/pdf")}
+            else:
+                files = {"file": ("bench.txt", io.BytesIO(document(self.args.words).encode()), "text/plain")}
+            return client.post("/api/upload", files=files)
+        return client.get("/api/history", params={"visitor_id": visitor})
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int) -> Dict[str, Any]:
+    await scenario.setup(client, concurrency)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker(number: int):
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await scenario.request(client, number)
+                status = str(response.status_code)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+        "errors": errors,
+        "statuses": statuses,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    results = {}
+
+    async def drive(client: httpx.AsyncClient):
+        for name in args.scenarios:
+            results[name] = await run_scenario(client, Scenario(name, args), args.requests, args.concurrency)
+            print_result(name, results[name])
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout, limits=limits) as client:
+            await drive(client)
+        return results
+
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+            await drive(client)
+    return results
+
+
+def print_result(name: str, result: Dict[str, Any]):
+    print(
+        f"{name:<10}{result['throughput_rps']:>10.1f} req/s"
+        f"{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f} ms"
+        f"{result['errors']:>8} err{result['peak_rss_mb']:>10.1f} MB"
+    )
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline_path: str):
+    """
+    Print the relative change of each metric against a previous run.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit')}):")
+    metrics: List[tuple] = [
+        ("throughput_rps", lambda new, old: new >= old),
+        ("p50_ms", lambda new, old: new <= old),
+        ("p95_ms", lambda new, old: new <= old),
+        ("p99_ms", lambda new, old: new <= old),
+        ("peak_rss_mb", lambda new, old: new <= old),
+    ]
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        cells = []
+        for metric, better in metrics:
+            new, old = result[metric], before.get(metric)
+            if not old:
+                continue
+            change = (new - old) / old * 100
+            cells.append(f"{metric} {change:+.1f}%{'' if better(new, old) else ' (worse)'}")
+        print(f"  {name:<10}" + ", ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API offline with the fake provider.")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight")
+    parser.add_argument("--words", type=int, default=800, help="Words per summarized/uploaded document")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Fake provider time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=400, help="Fake provider generation speed")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of fake provider calls that fail")
+    parser.add_argument("--upload-kind", choices=("txt", "pdf"), default="txt")
+    parser.add_argument("--pdf-pages", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=120, help="Client timeout per request in seconds")
+    parser.add_argument("--url", help="Drive a running server instead of the in-process app")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare with")
+    args = parser.parse_args()
+
+    if not args.url:
+        os.environ.setdefault("MONGODB_URI", "memory://")
+        os.environ.setdefault("ENABLE_FAKE_PROVIDER", "true")
+
+    print(f"{args.requests} requests per scenario, concurrency {args.concurrency}, "
+          f"fake provider latency {args.latency_ms:g} ms\n")
+    print(f"{'scenario':<10}{'throughput':>16}{'p50':>10}{'p95':>10}{'p99':>10}{'':>3}{'errors':>11}{'peak RSS':>13}")
+    results = asyncio.run(run(args))
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "target": args.url or "in-process",
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
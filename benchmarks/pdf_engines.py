@@ -0,0 +1,123 @@
+"""
+pdf_engines.py
+
+Benchmark of the PDF text extraction engines in app.utils.file_utils.
+
+For every PDF of the corpus it times:
+- each engine run serially in-process (one call over all pages, the old behaviour)
+- each engine through `extract_text_from_pdf` (page ranges across the worker pool)
+
+and checks that the pooled output matches the serial output of the same engine,
+page for page and in order.
+
+When no corpus directory is given, a synthetic corpus of text PDFs is generated
+with PyMuPDF in a temporary directory.
+
+Usage:
+    python -m benchmarks.pdf_engines [CORPUS_DIR] [--repeat N] [--pages N]
+
+Configuration (environment variables):
+    EXTRACT_WORKERS, PDF_MIN_PAGES_PER_TASK: See app/utils/file_utils.py.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from app.utils import file_utils
+from app.utils.file_utils import PDF_ENGINES, extract_text_from_pdf, shutdown_extract_pool
+
+LOREM = (
+    "Quarterly revenue grew in every region while operating costs stayed flat. "
+    "The board approved the new investment plan and asked for a review of supplier contracts. "
+)
+
+
+def make_corpus(directory: str, page_counts: List[int]) -> List[str]:
+    """
+    Write synthetic text PDFs with the given page counts and return their paths.
+    """
+    import fitz
+
+    paths = []
+    for count in page_counts:
+        doc = fitz.open()
+        for number in range(count):
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 545, 790), f"Page {number + 1}\n" + LOREM * 12, fontsize=10)
+        path = os.path.join(directory, f"synthetic-{count}.pdf")
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+def serial(path: str, engine: str) -> str:
+    pages = list(range(file_utils._count_pages(path, engine)))
+    return "\n".join(file_utils._read_pages(path, engine, pages))
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+async def run(paths: List[str], repeat: int):
+    loop = asyncio.get_running_loop()
+    # Start the workers before timing
+    await extract_text_from_pdf(paths[0])
+
+    header = f"{'file':<28}{'pages':>6}" + "".join(f"{e + ' serial':>16}{e + ' pool':>16}" for e in PDF_ENGINES) + "  match"
+    print(header)
+    print("-" * len(header))
+    for path in paths:
+        row: Dict[str, float] = {}
+        matches = []
+        for engine in PDF_ENGINES:
+            expected = serial(path, engine)
+            row[f"{engine} serial"] = timed(lambda: serial(path, engine), repeat)
+
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                pooled = await extract_text_from_pdf(path, engine=engine)
+                samples.append(time.perf_counter() - started)
+            row[f"{engine} pool"] = statistics.median(samples)
+            matches.append(pooled == expected)
+
+        page_count = await loop.run_in_executor(None, file_utils._count_pages, path, "pymupdf")
+        cells = "".join(f"{row[k] * 1000:>14.1f}ms" for k in row)
+        print(f"{os.path.basename(path)[:27]:<28}{page_count:>6}{cells}  {'yes' if all(matches) else 'NO'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PDF extraction engines.")
+    parser.add_argument("corpus", nargs="?", help="Directory of sample PDFs (default: synthetic corpus)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (median is reported)")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 400], help="Page counts of the synthetic corpus")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.corpus:
+            paths = sorted(os.path.join(args.corpus, f) for f in os.listdir(args.corpus) if f.lower().endswith(".pdf"))
+        else:
+            paths = make_corpus(tmp, args.pages)
+        if not paths:
+            raise SystemExit("No PDF files found in the corpus directory.")
+        print(f"{len(paths)} files, {file_utils.EXTRACT_WORKERS} workers, median of {args.repeat} runs\n")
+        try:
+            asyncio.run(run(paths, args.repeat))
+        finally:
+            shutdown_extract_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -123,7 +123,9 @@ summarizeBtn.addEventListener("click", async () => {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
-        "X-Visitor-ID": VISITOR_ID
+        "X-Visitor-ID": VISITOR_ID,
+        // The history page is opened next, so wait until the summary is stored
+        "X-Consistency": "strict"
       },
       body: JSON.stringify({ text, api_url, api_key, model, temperature, prompt, provider, api_version }),
     });
@@ -1,5 +1,3 @@
-
-
 const API_BASE = ""; // Change if backend hosted elsewhere
 
 const copy_visitor_id = localStorage.getItem("visitor_id");
@@ -8,14 +6,35 @@ const summaryOutput = document.getElementById("summary-output");
 const resultSection = document.getElementById("result-section");
 const historyList = document.getElementById("history-list");
 
+let nextCursor = null;
+const loadMoreButton = document.createElement("button");
+loadMoreButton.textContent = "Load more";
+loadMoreButton.style.display = "none";
+loadMoreButton.onclick = () => loadHistory(nextCursor);
+historyList.after(loadMoreButton);
+
+
+// Replace a preview with the full summary
+async function showFullSummary(id, summary) {
+  try {
+    const res = await fetch(`${API_BASE}/api/history/${id}?visitor_id=${copy_visitor_id}`);
+    if (!res.ok) throw new Error("Failed to load summary");
+    const item = await res.json();
+    summary.textContent = `Summary: \n ${item.summary_text}`;
+  } catch (err) {
+    console.error("History error:", err);
+  }
+}
 
-// Load summary history
-async function loadHistory() {
+// Load summary history (one page; pass the cursor to load the next one)
+async function loadHistory(cursor = null) {
   try {
-    const res = await fetch(`${API_BASE}/api/history?visitor_id=${copy_visitor_id}`);
+    let url = `${API_BASE}/api/history?visitor_id=${copy_visitor_id}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+    const res = await fetch(url);
     if (!res.ok) throw new Error("Failed to load history");
     const data = await res.json();
-    historyList.innerHTML = "";
+    if (!cursor) historyList.innerHTML = "";
 
     data.history.forEach(item => {
       const div = document.createElement("div");
@@ -29,15 +48,27 @@ async function loadHistory() {
       model.textContent = `AI Model Used: ${item.model}`;
 
       const summary = document.createElement("p");
-      summary.textContent = `Summary: \n ${item.summary_text}`;
+      summary.textContent = `Summary: \n ${item.summary_preview}`;
 
       div.appendChild(time);
       div.appendChild(model);
       div.appendChild(summary);
 
+      if (item.summary_length !== item.summary_preview.length || item.summary_preview.endsWith("…")) {
+        const more = document.createElement("button");
+        more.textContent = "Show full summary";
+        more.onclick = async () => {
+          await showFullSummary(item._id, summary);
+          more.remove();
+        };
+        div.appendChild(more);
+      }
+
       historyList.appendChild(div);
     });
 
+    nextCursor = data.next_cursor;
+    loadMoreButton.style.display = nextCursor ? "" : "none";
 
   } catch (err) {
     console.error("History error:", err);
@@ -45,4 +76,4 @@ async function loadHistory() {
 }
 
 // Load history on page load
-window.onload = loadHistory;
+window.onload = () => loadHistory();